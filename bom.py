@@ -0,0 +1,84 @@
+# bom.py
+import csv
+import logging
+import numpy as np
+from typing import Dict, Tuple
+from xml.etree import ElementTree
+from src.config.config import BRICKLINK_COLORS, BRICKLINK_PART_IDS
+from src.strategies.brick_set import BrickSet
+
+BOM_KEY_BITS = (16, 16, 16, 8, 8)  # Разряды кода детали: короткая сторона, длинная, высота, цвет, тип
+
+def bill_of_materials(cubes: BrickSet) -> Dict[Tuple[int, int, int, str, str], int]:
+    """
+    Список деталей {(w, h, d, цвет, тип): количество} одним np.unique по кодам кирпичей.
+
+    Повёрнутые кирпичи — одна деталь: размеры в плане приводятся к (короткая, длинная).
+    """
+    cubes = BrickSet.from_cubes(cubes)
+    if not cubes:
+        return {}
+    data = cubes.data
+    columns = (np.minimum(data["w"], data["h"]), np.maximum(data["w"], data["h"]), data["d"], data["color"], data["type"])
+    # Код детали — поля, упакованные в одно uint64 (по 16 бит на размер, по 8 на коды): unique по целым быстрее структур
+    keys = np.zeros(len(data), dtype=np.uint64)
+    for column, bits in zip(columns, BOM_KEY_BITS):
+        keys = (keys << np.uint64(bits)) | column.astype(np.uint64)
+    parts, counts = np.unique(keys, return_counts=True)
+    fields = []
+    for bits in reversed(BOM_KEY_BITS):
+        fields.append((parts & np.uint64((1 << bits) - 1)).astype(np.int64).tolist())
+        parts = parts >> np.uint64(bits)
+    t, c, d, h, w = fields
+    return {(w[i], h[i], d[i], cubes.colors[c[i]], cubes.types[t[i]]): int(counts[i]) for i in range(len(counts))}
+
+def bricklink_colors(colors) -> Dict[str, int]:
+    """Ближайший по RGB цвет BrickLink для каждого HEX-цвета."""
+    colors = sorted(set(colors))
+    if not colors:
+        return {}
+    ids = np.array(list(BRICKLINK_COLORS))
+    palette = np.array([[int(hex_color[i:i + 2], 16) for i in (1, 3, 5)] for _, hex_color in BRICKLINK_COLORS.values()])
+    rgb = np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] if c.startswith("#") and len(c) >= 7 else [128, 128, 128]
+                    for c in colors])
+    nearest = np.argmin(((rgb[:, None, :] - palette[None, :, :]) ** 2).sum(axis=2), axis=1)
+    return dict(zip(colors, ids[nearest].tolist()))
+
+def export_bom_csv(bom: Dict[Tuple[int, int, int, str, str], int], path: str) -> None:
+    color_ids = bricklink_colors(color for _, _, _, color, _ in bom)
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["width", "length", "height", "type", "color", "bricklink_part", "bricklink_color", "quantity"])
+        for (w, h, d, color, brick_type), count in bom.items():
+            color_id = color_ids[color]
+            writer.writerow([w, h, d, brick_type, color, BRICKLINK_PART_IDS.get((w, h, d, brick_type), ""),
+                             f"{color_id} {BRICKLINK_COLORS[color_id][0]}", count])
+    logging.info(f"Parts list exported to {path}: {len(bom)} parts, {sum(bom.values())} bricks")
+
+def export_bom_bricklink_xml(bom: Dict[Tuple[int, int, int, str, str], int], path: str) -> None:
+    """
+    Wanted list BrickLink (XML для загрузки). Детали без номера в BRICKLINK_PART_IDS
+    пропускаются с предупреждением — они есть в CSV.
+    """
+    color_ids = bricklink_colors(color for _, _, _, color, _ in bom)
+    items = {}
+    skipped = 0
+    for (w, h, d, color, brick_type), count in bom.items():
+        part_id = BRICKLINK_PART_IDS.get((w, h, d, brick_type))
+        if part_id is None:
+            skipped += count
+            continue
+        # Разные цвета модели могут попасть в один цвет BrickLink
+        key = (part_id, color_ids[color])
+        items[key] = items.get(key, 0) + count
+    inventory = ElementTree.Element("INVENTORY")
+    for (part_id, color_id), count in items.items():
+        item = ElementTree.SubElement(inventory, "ITEM")
+        ElementTree.SubElement(item, "ITEMTYPE").text = "P"
+        ElementTree.SubElement(item, "ITEMID").text = part_id
+        ElementTree.SubElement(item, "COLOR").text = str(color_id)
+        ElementTree.SubElement(item, "MINQTY").text = str(count)
+    ElementTree.ElementTree(inventory).write(path, encoding="utf-8", xml_declaration=True)
+    if skipped:
+        logging.warning(f"BrickLink export: {skipped} bricks without a BrickLink part number skipped")
+    logging.info(f"BrickLink wanted list exported to {path}: {len(items)} items")
@@ -1,28 +1,54 @@
 # brick_optimization.py
 import numpy as np
-from numba.typed import List as NumbaList
-from typing import List, Tuple
+from typing import List, Optional, Tuple
 import concurrent.futures
 import logging
 import gc
+from multiprocessing import shared_memory
 from scipy.sparse import coo_array  # Для разреженных структур
-from src.config.config import BRICK_SIZES, LEGO_COLORS, STUD_SIZE, get_brick_height
+from scipy.ndimage import label, find_objects, distance_transform_edt
+from src.config.config import BRICK_SIZES, LEGO_COLORS, STUD_SIZE
 from src.strategies.base import PlacementStrategy
+from src.strategies.brick_set import BrickSet
 from .strategies.greedy_placement import GreedyPlacementStrategy
 from .strategies.simulated_annealing_placement import SimulatedAnnealingPlacementStrategy
 from .strategies.branch_and_bound_placement import BranchAndBoundPlacementStrategy
+from .strategies.beam_search_placement import BeamSearchPlacementStrategy
+from src.strategies.catalog import BrickCatalog
+from src.strategies.utils import KernelCounters, rasterize_bricks
+from src.symmetry import bricks_inside, detect_mirror_symmetry, mirror_bricks
 
 MIN_BLOCK_SIZE = 5
 MAX_BLOCK_SIZE = 20
 DENSE_THRESHOLD = 0.5
 SPARSE_THRESHOLD = 0.1
+MIRROR_COVERAGE_TOLERANCE = 1e-3  # Допустимая потеря покрытия при зеркальной укладке относительно половины
+
+STRATEGIES = {
+    "greedy": GreedyPlacementStrategy,
+    "simulated_annealing": SimulatedAnnealingPlacementStrategy,
+    "branch_and_bound": BranchAndBoundPlacementStrategy,
+    "beam_search": BeamSearchPlacementStrategy
+}
+
+def _strategy_spec(strategy: PlacementStrategy) -> Tuple[type, dict]:
+    """Класс и параметры конструктора стратегии — то, что уходит в задачи пула."""
+    return type(strategy), strategy.params()
+
+def _worker_strategy(strategy_spec: Tuple[type, dict], seed: Optional[np.random.SeedSequence] = None) -> PlacementStrategy:
+    # Стратегия собирается на каждую задачу с настройками родителя; поток случайных чисел задаётся
+    # задачей, а не процессом, поэтому результат не зависит от распределения задач
+    strategy_cls, params = strategy_spec
+    return strategy_cls(**params, seed=seed)
 
 def get_block_size(voxel_shape: Tuple[int, int, int]) -> int:
     avg_dim = sum(voxel_shape) / 3
     return max(MIN_BLOCK_SIZE, min(MAX_BLOCK_SIZE, int(avg_dim / 10)))
 
-def analyze_voxel_density(voxel_array: np.ndarray, base_size: int) -> List[Tuple[int, int, int, int, int, int]]:
+def analyze_voxel_density(voxel_array: np.ndarray, base_size: int,
+                          z_block_size: Optional[int] = None) -> List[Tuple[int, int, int, int, int, int]]:
     nz, ny, nx = voxel_array.shape
+    z_block_size = z_block_size or base_size
     blocks = []
     z, y, x = 0, 0, 0
     while z < nz:
@@ -30,7 +56,7 @@ def analyze_voxel_density(voxel_array: np.ndarray, base_size: int) -> List[Tuple
         while y < ny:
             x = 0
             while x < nx:
-                z_size = min(base_size, nz - z)
+                z_size = min(z_block_size, nz - z)
                 y_size = min(base_size, ny - y)
                 x_size = min(base_size, nx - x)
                 blocks.append((z, y, x, z_size, y_size, x_size))
@@ -53,81 +79,433 @@ def fill_hollow_model(voxel_array: np.ndarray, minimal_support: bool = False, in
                         filled_array[z_below, y, x] = True
     return filled_array
 
-def _process_block(args: Tuple[np.ndarray, bool, List[Tuple[int, int, int, str]], int, int, int, int, int, int, str, bool, bool]) -> Tuple[List[Tuple], int, int, int]:
-    voxel_array, use_colors, allowed_sizes, z, y, x, z_size, y_size, x_size, strategy_name, fill_hollow, minimal_support = args
+def _process_block(args: Tuple[str, Tuple[int, int, int], bool, BrickCatalog, int, int, int, int, int, int,
+                               Tuple[type, dict], bool,
+                               Optional[np.ndarray], np.random.SeedSequence, Optional[float], bool]
+                   ) -> Tuple[BrickSet, int, int, int, Optional[KernelCounters]]:
+    (shm_name, shape, use_colors, allowed_sizes, z, y, x, z_size, y_size, x_size, strategy_spec, allow_top_layer,
+     color_labels, seed, deadline, count) = args
     block_id = f"z{z}_y{y}_x{x}"
-    sub_voxel = voxel_array[z:z + z_size, y:y + y_size, x:x + x_size]
+    # Подключаемся к общему воксельному буферу вместо передачи всей сетки в задачу
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        voxel_array = np.ndarray(shape, dtype=np.bool_, buffer=shm.buf)
+        sub_voxel = voxel_array[z:z + z_size, y:y + y_size, x:x + x_size].copy()
+    finally:
+        shm.close()
     
-    logging.info(f"Processing block {block_id} - shape: {sub_voxel.shape}, voxels: {np.sum(sub_voxel)}")
+    logging.debug(f"Processing block {block_id} - shape: {sub_voxel.shape}, voxels: {np.sum(sub_voxel)}")
     
     if not np.any(sub_voxel):
-        logging.info(f"Block {block_id} empty, skipping")
-        return [], z, y, x
-    
-    numba_allowed_sizes = NumbaList([(w, h, d, t) for w, h, d, t in allowed_sizes])
-    strategies = {
-        "greedy": GreedyPlacementStrategy,
-        "simulated_annealing": SimulatedAnnealingPlacementStrategy,
-        "branch_and_bound": BranchAndBoundPlacementStrategy
-    }
-    strategy = strategies.get(strategy_name, GreedyPlacementStrategy)()
-    
-    if fill_hollow:
-        logging.info(f"Filling block {block_id}")
-        sub_voxel = fill_hollow_model(sub_voxel, minimal_support=minimal_support, inplace=True)
+        logging.debug(f"Block {block_id} empty, skipping")
+        return BrickSet.empty(), z, y, x, None
     
-    logging.info(f"Placing bricks in block {block_id}")
-    local_cubes = strategy.place_bricks(sub_voxel, use_colors, allowed_sizes, not fill_hollow)
+    strategy = _worker_strategy(strategy_spec, seed)
+    # Счётчики задачи возвращаются родителю вместе с кирпичами
+    counters = KernelCounters(allowed_sizes.sizes) if count else None
+    local_cubes = strategy.place_bricks(sub_voxel, use_colors, allowed_sizes, allow_top_layer, color_labels=color_labels,
+                                        deadline=deadline, counters=counters)
     
-    logging.info(f"Block {block_id} processed: {len(local_cubes)} bricks")
-    return local_cubes, z, y, x
+    logging.debug(f"Block {block_id} processed: {len(local_cubes)} bricks")
+    return local_cubes, z, y, x, counters
+
+def _process_component(args: Tuple[np.ndarray, bool, BrickCatalog, Tuple[type, dict], bool, Optional[np.ndarray],
+                                   np.random.SeedSequence, Optional[float], bool]
+                       ) -> Tuple[BrickSet, Optional[KernelCounters]]:
+    component_voxels, use_colors, allowed_sizes, strategy_spec, allow_top_layer, color_labels, seed, deadline, count = args
+    strategy = _worker_strategy(strategy_spec, seed)
+    counters = KernelCounters(allowed_sizes.sizes) if count else None
+    return strategy.place_bricks(component_voxels, use_colors, allowed_sizes, allow_top_layer, color_labels=color_labels,
+                                 deadline=deadline, counters=counters), counters
+
+def extend_color_labels(color_labels: np.ndarray, voxel_array: np.ndarray) -> np.ndarray:
+    """Размечает воксели без метки (например, после заполнения полостей) меткой ближайшего размеченного."""
+    labels = np.asarray(color_labels, dtype=np.int32)
+    known = labels >= 0
+    if not np.any(known):
+        return np.where(voxel_array, 0, -1).astype(np.int32)
+    nearest = distance_transform_edt(~known, return_distances=False, return_indices=True)
+    return np.where(voxel_array, labels[tuple(nearest)], -1).astype(np.int32)
+
+def refill_uncovered(voxel_array: np.ndarray, kept_cubes: BrickSet, region: np.ndarray,
+                     allowed_sizes: BrickCatalog, use_colors: bool,
+                     allow_top_layer: bool = False, color_labels: Optional[np.ndarray] = None,
+                     rng: Optional[np.random.Generator] = None,
+                     counters: Optional[KernelCounters] = None) -> BrickSet:
+    """
+    Заново укладывает воксели области region, не покрытые kept_cubes.
+
+    Опора берётся из оставшихся кирпичей, поэтому новые кирпичи ложатся на них
+    и могут перекрывать границы, на которых была разрезана модель.
+    """
+    occupied = rasterize_bricks(kept_cubes, voxel_array.shape) >= 0
+    remaining = voxel_array & region & ~occupied
+    support_array = occupied.copy()
+    catalog = BrickCatalog.of(allowed_sizes)
+    rng = rng if rng is not None else np.random.default_rng()
+    layers = [catalog.place_layer_array(int(z), remaining, support_array, allow_top_layer, color_labels, counters)
+              for z in np.flatnonzero(remaining.any(axis=(1, 2)))]
+    bricks = np.concatenate(layers) if layers else np.zeros((0, 7), dtype=np.int64)
+    if use_colors:
+        colors, color_codes = LEGO_COLORS, rng.integers(len(LEGO_COLORS), size=len(bricks))
+    else:
+        colors, color_codes = ("#000000",), np.zeros(len(bricks), dtype=np.int64)
+    return BrickSet.from_arrays(bricks[:, :6], color_codes, bricks[:, 6], colors, catalog.types)
+
+def stitch_block_seams(voxel_array: np.ndarray, cubes: BrickSet, seams_x: List[int], seams_y: List[int],
+                       allowed_sizes: BrickCatalog, use_colors: bool,
+                       allow_top_layer: bool = False, color_labels: Optional[np.ndarray] = None,
+                       rng: Optional[np.random.Generator] = None,
+                       counters: Optional[KernelCounters] = None) -> BrickSet:
+    """Снимает кирпичи, прилегающие к швам между блоками, и перекладывает их поверх швов."""
+    seams_x, seams_y = np.asarray(seams_x, dtype=np.int64), np.asarray(seams_y, dtype=np.int64)
+    cubes = BrickSet.from_cubes(cubes)
+    if not cubes or (seams_x.size == 0 and seams_y.size == 0):
+        return cubes
+    brick_array = cubes.coords
+    x, y, w, h = brick_array[:, 0], brick_array[:, 1], brick_array[:, 3], brick_array[:, 4]
+    on_seam = (np.isin(x, seams_x) | np.isin(x + w, seams_x) |
+               np.isin(y, seams_y) | np.isin(y + h, seams_y))
+    kept, dropped = cubes[~on_seam], cubes[on_seam]
+    region = rasterize_bricks(dropped, voxel_array.shape) >= 0
+    restitched = refill_uncovered(voxel_array, kept, region, allowed_sizes, use_colors, allow_top_layer, color_labels, rng,
+                                  counters)
+    logging.info(f"Seam pass: {len(dropped)} bricks removed, {len(restitched)} bricks re-placed")
+    return BrickSet.concatenate([kept, restitched])
+
+def _merge_pairs(brick_array: np.ndarray, colors: np.ndarray, type_codes: np.ndarray, brick_ids: np.ndarray,
+                 catalog_keys: np.ndarray, axis: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Пары кирпичей (левый, правый), которые вместе образуют кирпич каталога.
+
+    axis=0 — сосед справа по x, axis=1 — сосед сзади по y. Сосед ищется по сетке
+    идентификаторов в ячейке сразу за кирпичом и должен совпадать по второй
+    координате, ширине, высоте, типу и цвету.
+    """
+    nz, ny, nx = brick_ids.shape
+    x, y, z, w, h, d = (brick_array[:, i] for i in range(6))
+    if axis == 0:
+        nx_, ny_ = x + w, y
+        inside = nx_ < nx
+    else:
+        nx_, ny_ = x, y + h
+        inside = ny_ < ny
+    left = np.flatnonzero(inside & (type_codes >= 0))
+    right = brick_ids[z[left], ny_[left], nx_[left]].astype(np.int64)
+    valid = right >= 0
+    left, right = left[valid], right[valid]
+    same = ((z[right] == z[left]) & (d[right] == d[left]) & (type_codes[right] == type_codes[left]) &
+            (colors[right] == colors[left]))
+    if axis == 0:
+        same &= (x[right] == x[left] + w[left]) & (y[right] == y[left]) & (h[right] == h[left])
+        merged_w, merged_h = w[left] + w[right], h[left]
+    else:
+        same &= (y[right] == y[left] + h[left]) & (x[right] == x[left]) & (w[right] == w[left])
+        merged_w, merged_h = w[left], h[left] + h[right]
+    keys = _catalog_key(merged_w, merged_h, d[left], type_codes[left])
+    same &= np.isin(keys, catalog_keys)
+    left, right = left[same], right[same]
+    # При наложении кирпичей у одного правого может оказаться два левых — берём первого
+    right, first = np.unique(right, return_index=True)
+    left = left[first]
+    # Цепочки a-b-c-d: ранжируем кирпичи по позиции в цепочке (удвоение указателей)
+    # и сливаем пары с чётным левым — это паросочетание, покрывающее половину цепочки за проход
+    prev = np.full(len(brick_array), -1, dtype=np.int64)
+    prev[right] = left
+    rank = (prev >= 0).astype(np.int64)
+    pointer = prev.copy()
+    while True:
+        active = np.flatnonzero(pointer >= 0)
+        if active.size == 0:
+            break
+        target = pointer[active]
+        rank[active] = rank[active] + rank[target]
+        pointer[active] = pointer[target]
+    even = rank[left] % 2 == 0
+    return left[even], right[even]
+
+def _catalog_key(w: np.ndarray, h: np.ndarray, d: np.ndarray, type_code: np.ndarray) -> np.ndarray:
+    return ((w.astype(np.int64) * 1024 + h) * 1024 + d) * 64 + type_code
+
+def merge_adjacent_bricks(cubes: BrickSet, shape: Tuple[int, int, int], allowed_sizes: BrickCatalog,
+                          color_labels: Optional[np.ndarray] = None, max_rounds: int = 64) -> BrickSet:
+    """
+    Сливает соседние кирпичи одного слоя, типа и цвета в более крупные кирпичи каталога.
+
+    Соседи находятся через сетку идентификаторов; проходы по x и по y
+    повторяются, пока что-то сливается. Занятые ячейки и опора не меняются.
+    Если заданы цветовые метки, цвет сравнивается по метке ячейки кирпича: до
+    окончательной раскраски цвета стратегий — случайные заглушки и слиянию мешают.
+    """
+    cubes = BrickSet.from_cubes(cubes)
+    if len(cubes) < 2:
+        return cubes
+    catalog = BrickCatalog.of(allowed_sizes)
+    catalog_keys = _catalog_key(catalog.dims[:, 0], catalog.dims[:, 1], catalog.dims[:, 2], catalog.type_codes)
+    brick_array = cubes.coords
+    color_codes = colors = cubes.color_codes
+    if color_labels is not None:
+        colors = color_labels[brick_array[:, 2], brick_array[:, 1], brick_array[:, 0]].astype(np.int64)
+    # Коды типов набора переводятся в коды каталога; типов вне каталога (-1) слияние не касается
+    type_map = np.array([catalog.types.index(t) if t in catalog.types else -1 for t in cubes.types], dtype=np.int64)
+    type_codes = type_map[cubes.type_codes]
+    types = cubes.type_codes
+    initial = len(cubes)
+
+    for _ in range(max_rounds):
+        merged_any = False
+        for axis in (0, 1):
+            brick_ids = rasterize_bricks(brick_array, shape)
+            left, right = _merge_pairs(brick_array, colors, type_codes, brick_ids, catalog_keys, axis)
+            if left.size == 0:
+                continue
+            merged_any = True
+            brick_array[left, 3 + axis] += brick_array[right, 3 + axis]
+            keep = np.ones(len(brick_array), dtype=bool)
+            keep[right] = False
+            brick_array, colors, types, type_codes = brick_array[keep], colors[keep], types[keep], type_codes[keep]
+            color_codes = color_codes[keep]
+        if not merged_any:
+            break
+
+    logging.info(f"Merge pass: {initial} -> {len(brick_array)} bricks")
+    return BrickSet.from_arrays(brick_array, color_codes, types, cubes.colors, cubes.types)
+
+def _coverage(cubes: BrickSet, voxel_array: np.ndarray) -> float:
+    """Доля вокселей модели, покрытых кирпичами."""
+    total = np.count_nonzero(voxel_array)
+    if total == 0:
+        return 1.0
+    return np.count_nonzero(voxel_array & (rasterize_bricks(cubes, voxel_array.shape) >= 0)) / total
 
 class BrickPlacer:
     def __init__(self, strategy: PlacementStrategy):
         self.strategy = strategy
         self.allowed_sizes = None
+        self.catalog = None
+        self.color_labels = None
+        self.voxel_array = None
+        self.deadline = None
+        self.counters = None
 
     def _create_strategy(self, strategy_name: str) -> PlacementStrategy:
-        strategies = {
-            "greedy": GreedyPlacementStrategy,
-            "simulated_annealing": SimulatedAnnealingPlacementStrategy,
-            "branch_and_bound": BranchAndBoundPlacementStrategy
-        }
-        return strategies.get(strategy_name, GreedyPlacementStrategy)()
+        return STRATEGIES.get(strategy_name, GreedyPlacementStrategy)()
+
+    def _place_blocks_parallel(self, voxel_array: np.ndarray, use_colors: bool, allow_top_layer: bool,
+                               progress_callback=None, max_workers: Optional[int] = None) -> BrickSet:
+        """Раскладывает колонны блоков по пулу процессов и сшивает швы между ними."""
+        nz, ny, nx = voxel_array.shape
+        # Блок не должен быть уже двух самых длинных кирпичей, иначе почти всё уйдёт в швы
+        block_size = max(get_block_size(voxel_array.shape), 2 * self.catalog.max_footprint)
+        # Блоки режутся только по x/y: опора по z остаётся внутри одной задачи
+        blocks = [block for block in analyze_voxel_density(voxel_array, block_size, z_block_size=nz)
+                  if np.any(voxel_array[block[0]:block[0] + block[3], block[1]:block[1] + block[4], block[2]:block[2] + block[5]])]
+        strategy_spec = _strategy_spec(self.strategy)
+        seeds = self.strategy.spawn_seeds(len(blocks))
+        logging.info(f"Parallel block placement: {len(blocks)} blocks of {block_size}, "
+                     f"strategy={strategy_spec[0].__name__}{strategy_spec[1]}")
+
+        shm = shared_memory.SharedMemory(create=True, size=max(1, voxel_array.nbytes))
+        results = [None] * len(blocks)
+        try:
+            shared_voxels = np.ndarray(voxel_array.shape, dtype=np.bool_, buffer=shm.buf)
+            shared_voxels[:] = voxel_array
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_process_block, (shm.name, voxel_array.shape, use_colors, self.catalog,
+                                                            *block, strategy_spec, allow_top_layer,
+                                                            self._label_slice(block), seeds[i], self.deadline,
+                                                            self.counters is not None)): i
+                           for i, block in enumerate(blocks)}
+                for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    results[futures[future]] = future.result()
+                    if progress_callback and progress_callback(0.9 * done / len(blocks)):
+                        for pending in futures:
+                            pending.cancel()
+                        break
+        finally:
+            shm.close()
+            shm.unlink()
+
+        results = list(filter(None, results))
+        self._add_counters(result[4] for result in results)
+        # Сдвигаем локальные координаты блоков в глобальные (в порядке блоков — результат детерминирован)
+        all_cubes = BrickSet.concatenate(BrickSet.from_cubes(local_cubes).shifted(x0, y0, z0)
+                                         for local_cubes, z0, y0, x0, _ in results)
+
+        seams_x = sorted({block[2] for block in blocks if block[2] > 0})
+        seams_y = sorted({block[1] for block in blocks if block[1] > 0})
+        all_cubes = stitch_block_seams(voxel_array, all_cubes, seams_x, seams_y, self.catalog,
+                                       use_colors, allow_top_layer, self.color_labels, self.strategy.rng, self.counters)
+        if progress_callback:
+            progress_callback(1.0)
+        return all_cubes
+
+    def _place_components_parallel(self, voxel_array: np.ndarray, use_colors: bool, allow_top_layer: bool,
+                                   progress_callback=None, max_workers: Optional[int] = None) -> BrickSet:
+        """Размещает кирпичи в каждой связной компоненте отдельно; компоненты не касаются, сшивка не нужна."""
+        nz = voxel_array.shape[0]
+        labeled_array, num_components = label(voxel_array)
+        strategy_spec = _strategy_spec(self.strategy)
+        logging.info(f"Parallel component placement: {num_components} components, "
+                     f"strategy={strategy_spec[0].__name__}{strategy_spec[1]}")
+
+        # По z берём всю высоту сетки: опора от пола и правило верхнего слоя остаются такими же, как в общей сетке
+        tasks, offsets = [], []
+        seeds = self.strategy.spawn_seeds(num_components)
+        for component_label, slices in enumerate(find_objects(labeled_array), 1):
+            if slices is None:
+                continue
+            component_slices = (slice(0, nz), slices[1], slices[2])
+            component_voxels = labeled_array[component_slices] == component_label
+            component_labels = None
+            if self.color_labels is not None:
+                component_labels = np.where(component_voxels, self.color_labels[component_slices], -1)
+            tasks.append((component_voxels, use_colors, self.catalog, strategy_spec, allow_top_layer, component_labels,
+                          seeds[component_label - 1], self.deadline, self.counters is not None))
+            offsets.append((slices[2].start, slices[1].start))
+
+        results = [None] * len(tasks)
+        if len(tasks) == 1:
+            results[0] = _process_component(tasks[0])
+        elif tasks:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+                futures = {executor.submit(_process_component, task): i for i, task in enumerate(tasks)}
+                for done, future in enumerate(concurrent.futures.as_completed(futures), 1):
+                    results[futures[future]] = future.result()
+                    if progress_callback and progress_callback(done / len(tasks)):
+                        for pending in futures:
+                            pending.cancel()
+                        break
+
+        self._add_counters(result[1] for result in results if result is not None)
+        all_cubes = BrickSet.concatenate(BrickSet.from_cubes(result[0]).shifted(x0, y0)
+                                         for result, (x0, y0) in zip(results, offsets) if result is not None)
+        if progress_callback:
+            progress_callback(1.0)
+        return all_cubes
+
+    def _place_mirrored(self, voxel_array: np.ndarray, use_colors: bool, progress_callback, voxel_size: float,
+                        allow_top_layer: bool, parallel_mode: Optional[str], max_workers: Optional[int],
+                        merge: bool) -> Optional[BrickSet]:
+        """
+        Укладывает половину зеркально-симметричной модели и отражает её.
+
+        Кирпичи у плоскости зеркала снимаются с обеих сторон, отражения, вышедшие
+        за модель (почти точная симметрия), отбрасываются, а всё непокрытое —
+        средняя колонка, шов и расхождения — докладывается поверх оставшихся кирпичей
+        по тем же правилам опоры и верхнего слоя, что и половина. Если покрытие
+        получилось хуже, чем у половины, возвращается None и модель укладывается целиком.
+        """
+        found = detect_mirror_symmetry(voxel_array, self.color_labels)
+        if found is None:
+            return None
+        axis, lo, hi = found
+        half_end = lo + (hi - lo) // 2
+        index = [slice(None)] * 3
+        index[axis] = slice(0, half_end)
+        index = tuple(index)
+        full_labels = self.color_labels
+        half = self.place_bricks(voxel_array[index], use_colors, self.allowed_sizes, fill_hollow=False,
+                                 progress_callback=progress_callback, voxel_size=voxel_size,
+                                 allow_top_layer=allow_top_layer, parallel_mode=parallel_mode, max_workers=max_workers,
+                                 color_labels=None if full_labels is None else full_labels[index],
+                                 merge=merge, deadline=self.deadline, counters=self.counters)
+        self.color_labels = full_labels
+        self.voxel_array = voxel_array
+        half_coverage = _coverage(half, voxel_array[index])
+
+        position, size = ("x", "w") if axis == 2 else ("y", "h")
+        on_seam = half.data[position].astype(np.int64) + half.data[size] >= half_end
+        half = half[~on_seam]
+        mirrored = mirror_bricks(half, axis, lo, hi)
+        mirrored = mirrored[bricks_inside(mirrored, voxel_array, full_labels)]
+        kept = BrickSet.concatenate([half, mirrored])
+        restitched = refill_uncovered(voxel_array, kept, voxel_array, self.catalog, use_colors, allow_top_layer,
+                                      full_labels, self.strategy.rng, self.counters)
+        result = BrickSet.concatenate([kept, restitched])
+        coverage = _coverage(result, voxel_array)
+        logging.info(f"Mirror placement: {len(half)} bricks placed, {len(mirrored)} mirrored, "
+                     f"{len(restitched)} re-placed on the seam, coverage {coverage:.1%} (half {half_coverage:.1%})")
+        if coverage < half_coverage - MIRROR_COVERAGE_TOLERANCE:
+            logging.warning("Mirror placement lost coverage, falling back to full placement")
+            return None
+        if merge:
+            result = merge_adjacent_bricks(result, voxel_array.shape, self.catalog, self.color_labels)
+        return result
+
+    def _add_counters(self, worker_counters):
+        """Складывает счётчики ядер, вернувшиеся из задач, в счётчики запуска."""
+        for counters in worker_counters:
+            if counters is not None and self.counters is not None:
+                self.counters.add(counters)
+
+    def _label_slice(self, block: Tuple[int, int, int, int, int, int]) -> Optional[np.ndarray]:
+        if self.color_labels is None:
+            return None
+        z, y, x, z_size, y_size, x_size = block
+        return self.color_labels[z:z + z_size, y:y + y_size, x:x + x_size].copy()
 
     def place_bricks(self, voxel_array: np.ndarray, use_colors: bool = True, allowed_sizes=None, 
                         fill_hollow: bool = True, minimal_support: bool = False, progress_callback=None, 
-                        voxel_size: float = STUD_SIZE) -> List[Tuple]:
+                        voxel_size: float = STUD_SIZE, allow_top_layer: bool = False,
+                        parallel_mode: Optional[str] = None, max_workers: Optional[int] = None,
+                        color_labels: Optional[np.ndarray] = None, merge: bool = True,
+                        deadline: Optional[float] = None, symmetry: bool = False,
+                        counters: Optional[KernelCounters] = None) -> BrickSet:
+            """
+            color_labels — сетка цветовых меток того же размера (-1 — пусто); границы меток
+            считаются жёсткими краями, и ни один кирпич не пересекает две цветовые области.
+            merge — после любой стратегии слить соседние кирпичи в более крупные из каталога.
+            deadline — момент time.time(), после которого стратегии возвращают лучшее найденное решение.
+            symmetry — при зеркальной симметрии по x или y укладывается половина модели и отражается.
+            counters — KernelCounters запуска: в них складываются проверки и укладки всех стратегий и воркеров.
+            """
+            self.deadline = deadline
+            self.counters = counters
             self.allowed_sizes = [(w, h, d, t) for w, h, d, t in (allowed_sizes or BRICK_SIZES)]
+            # Каталог (повороты, приоритет, массивы для Numba) строится один раз на запуск
+            self.catalog = BrickCatalog.of(self.allowed_sizes)
             voxel_array = voxel_array.copy()
-            nz, ny, nx = voxel_array.shape
 
             if fill_hollow:
                 voxel_array = fill_hollow_model(voxel_array, minimal_support=False, inplace=True)
                 logging.info("Model filled in-place: full fill")
+            self.voxel_array = voxel_array  # Сетка, которую покрывает укладка (после заполнения полостей)
+            self.color_labels = None
+            if color_labels is not None:
+                self.color_labels = extend_color_labels(color_labels, voxel_array)
+
+            if symmetry:
+                mirrored = self._place_mirrored(voxel_array, use_colors, progress_callback, voxel_size, allow_top_layer,
+                                                parallel_mode, max_workers, merge)
+                if mirrored is not None:
+                    logging.info(f"Placement completed: {len(mirrored)} bricks")
+                    return mirrored
 
-            all_cubes = []
-            occupied = np.zeros((nz, ny, nx), dtype=bool)
-
-            # Проходим по слоям снизу вверх
-            for z in range(nz):
-                for y in range(ny):
-                    for x in range(nx):
-                        if voxel_array[z, y, x] and not occupied[z, y, x]:
-                            for w, h, d, brick_type in sorted(self.allowed_sizes, key=lambda x: x[0] * x[1], reverse=True):
-                                brick_height_mm = get_brick_height(brick_type)  # 9.6 или 3.2 мм
-                                d_voxels = max(1, int(brick_height_mm / voxel_size))  # Количество вокселей по высоте
-                                if (x + w <= nx and y + h <= ny and z + d_voxels <= nz and
-                                    all(voxel_array[z + dz, y + dy, x + dx] and not occupied[z + dz, y + dy, x + dx]
-                                        for dz in range(d_voxels) for dy in range(h) for dx in range(w))):
-                                    color = LEGO_COLORS[(x + y + z) % len(LEGO_COLORS)] if use_colors else "#FFFFFF"
-                                    all_cubes.append((x, y, z, w, h, d, color, brick_type))
-                                    for dz in range(d_voxels):
-                                        for dy in range(h):
-                                            for dx in range(w):
-                                                occupied[z + dz, y + dy, x + dx] = True
-                                    break
+            if parallel_mode == "blocks":
+                all_cubes = self._place_blocks_parallel(voxel_array, use_colors, allow_top_layer,
+                                                        progress_callback, max_workers)
+                if merge:
+                    all_cubes = merge_adjacent_bricks(all_cubes, voxel_array.shape, self.catalog, self.color_labels)
+                logging.info(f"Placement completed: {len(all_cubes)} bricks")
+                return all_cubes
+            elif parallel_mode == "components":
+                all_cubes = self._place_components_parallel(voxel_array, use_colors, allow_top_layer,
+                                                            progress_callback, max_workers)
+                if merge:
+                    all_cubes = merge_adjacent_bricks(all_cubes, voxel_array.shape, self.catalog, self.color_labels)
+                logging.info(f"Placement completed: {len(all_cubes)} bricks")
+                return all_cubes
+            elif parallel_mode is not None:
+                raise ValueError(f"Unknown parallel placement mode: {parallel_mode}")
 
+            # Последовательный режим — та же стратегия, что и в воркерах блоков и компонент
+            all_cubes = self.strategy.place_bricks(voxel_array, use_colors, self.catalog, allow_top_layer,
+                                                   progress_callback=progress_callback, color_labels=self.color_labels,
+                                                   deadline=self.deadline, counters=self.counters)
+            all_cubes = BrickSet.from_cubes(all_cubes)
+            if merge:
+                all_cubes = merge_adjacent_bricks(all_cubes, voxel_array.shape, self.catalog, self.color_labels)
             logging.info(f"Placement completed: {len(all_cubes)} bricks")
             return all_cubes
 
@@ -0,0 +1,218 @@
+# coloring.py
+import logging
+import numpy as np
+import trimesh
+from typing import Optional, Sequence, Tuple
+from scipy.ndimage import binary_erosion, distance_transform_edt
+from scipy.spatial import cKDTree
+from src.config.config import LEGO_COLORS
+from src.strategies.brick_set import BrickSet
+from src.strategies.utils import brick_cells
+
+NEAREST_FACE_CANDIDATES = 8  # Начальное число граней-кандидатов на точку при поиске ближайшей точки поверхности
+LARGE_FACES = 16  # Сколько самых крупных граней проверяется напрямую, а не через KD-дерево
+
+# Опорная белая точка D65 для перевода XYZ -> Lab
+_WHITE_D65 = np.array([0.95047, 1.0, 1.08883])
+_RGB_TO_XYZ = np.array([[0.4124564, 0.3575761, 0.1804375],
+                        [0.2126729, 0.7151522, 0.0721750],
+                        [0.0193339, 0.1191920, 0.9503041]])
+
+def hex_to_rgb(colors: Sequence[str]) -> np.ndarray:
+    """Переводит список '#RRGGBB' в массив (n, 3) со значениями 0..1."""
+    return np.array([[int(c[i:i + 2], 16) for i in (1, 3, 5)] for c in colors], dtype=np.float64) / 255.0
+
+def rgb_to_lab(rgb: np.ndarray) -> np.ndarray:
+    """Векторный перевод sRGB (0..1, последняя ось — каналы) в CIE Lab."""
+    rgb = np.asarray(rgb, dtype=np.float64)
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ _RGB_TO_XYZ.T / _WHITE_D65
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[..., 1] - 16, 500 * (f[..., 0] - f[..., 1]), 200 * (f[..., 1] - f[..., 2])], axis=-1)
+
+def quantize_to_palette(rgb: np.ndarray, palette: Sequence[str] = LEGO_COLORS) -> np.ndarray:
+    """
+    Индексы ближайших цветов палитры в пространстве Lab для массива цветов (n, 3).
+
+    Цвета сводятся к 8 битам на канал, и расстояния считаются только для уникальных
+    цветов: вместо (n, палитра, 3) — (уникальные, палитра, 3).
+    """
+    rgb8 = np.clip(np.round(np.asarray(rgb, dtype=np.float64) * 255), 0, 255).astype(np.int64)
+    keys = (rgb8[:, 0] << 16) | (rgb8[:, 1] << 8) | rgb8[:, 2]
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    unique_rgb = np.stack([unique_keys >> 16, (unique_keys >> 8) & 255, unique_keys & 255], axis=1) / 255.0
+    lab = rgb_to_lab(unique_rgb)
+    palette_lab = rgb_to_lab(hex_to_rgb(palette))
+    distances = np.sum((lab[:, None, :] - palette_lab[None, :, :]) ** 2, axis=2)
+    return np.argmin(distances, axis=1)[inverse.reshape(-1)]
+
+def mesh_has_colors(mesh: trimesh.Trimesh) -> bool:
+    return getattr(mesh.visual, "kind", None) in ("texture", "vertex", "face")
+
+def _texture_image(visual):
+    """Изображение текстуры материала (простого или PBR) или None."""
+    material = getattr(visual, "material", None)
+    image = getattr(material, "image", None)
+    if image is None:
+        image = getattr(material, "baseColorTexture", None)
+    return image
+
+def closest_surface_points(mesh: trimesh.Trimesh, points: np.ndarray,
+                           k: int = NEAREST_FACE_CANDIDATES) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Ближайшие точки поверхности (n, 3) и номера их граней (n,).
+
+    KD-дерево строится по центрам граней; для k ближайших центров считается точная
+    ближайшая точка каждой грани. Грань вне кандидатов не ближе, чем расстояние до
+    k-го центра минус наибольший радиус грани, поэтому для точек, где это не доказано,
+    k удваивается. Несколько граней, намного крупнее медианной, в дерево не входят и
+    проверяются для всех точек напрямую, чтобы не ослаблять эту границу. Результат точный.
+    """
+    triangles = mesh.triangles
+    centers = triangles.mean(axis=1)
+    radii = np.max(np.linalg.norm(triangles - centers[:, None, :], axis=2), axis=1)
+    by_size = np.argsort(radii)[::-1]
+    large = by_size[:LARGE_FACES]
+    large = large[radii[large] > 2 * np.median(radii)]
+    small = np.setdiff1d(np.arange(len(triangles)), large)
+    closest = np.empty((len(points), 3), dtype=np.float64)
+    faces = np.empty(len(points), dtype=np.int64)
+    best_distances = np.full(len(points), np.inf)
+
+    def take(on_faces, candidates, rows):
+        """Оставляет для точек rows ближайшую из граней-кандидатов, если она ближе найденной."""
+        distances = np.linalg.norm(on_faces - points[rows][:, None, :], axis=2)
+        best = np.argmin(distances, axis=1)
+        index = np.arange(len(rows))
+        better = distances[index, best] < best_distances[rows]
+        rows, best, index = rows[better], best[better], index[better]
+        closest[rows], faces[rows] = on_faces[index, best], candidates[index, best]
+        best_distances[rows] = distances[index, best]
+
+    everyone = np.arange(len(points))
+    if large.size:
+        on_faces = trimesh.triangles.closest_point(np.tile(triangles[large], (len(points), 1, 1)),
+                                                   np.repeat(points, len(large), axis=0))
+        take(on_faces.reshape(len(points), len(large), 3), np.tile(large, (len(points), 1)), everyone)
+    if small.size == 0:
+        return closest, faces
+    tree = cKDTree(centers[small])
+    radius = float(radii[small].max())
+    pending = everyone
+    k = min(k, len(small))
+    while pending.size:
+        center_distances, candidates = tree.query(points[pending], k=k)
+        center_distances = center_distances.reshape(len(pending), k)
+        candidates = small[candidates.reshape(len(pending), k)]
+        on_faces = trimesh.triangles.closest_point(triangles[candidates.ravel()], np.repeat(points[pending], k, axis=0))
+        take(on_faces.reshape(len(pending), k, 3), candidates, pending)
+        if k == len(small):
+            break
+        pending = pending[best_distances[pending] > center_distances[:, -1] - radius]
+        k = min(2 * k, len(small))
+    return closest, faces
+
+def sample_surface_colors(mesh: trimesh.Trimesh, points: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Цвет поверхности модели в ближайших к points точках (n, 3) в диапазоне 0..1 или None.
+
+    Ближайшая точка поверхности ищется closest_surface_points; текстура
+    сэмплируется по UV, интерполированным барицентрически в этой точке, цвета вершин
+    интерполируются так же, цвета граней берутся с найденной грани.
+    """
+    visual = mesh.visual
+    kind = getattr(visual, "kind", None)
+    if not mesh_has_colors(mesh):
+        return None
+    if len(mesh.faces) == 0:
+        logging.warning("Mesh has no faces, colors are not sampled")
+        return None
+    closest, triangle_id = closest_surface_points(mesh, np.asarray(points, dtype=np.float64))
+    if kind == "face":
+        return np.asarray(visual.face_colors)[triangle_id, :3].astype(np.float64) / 255.0
+    barycentric = trimesh.triangles.points_to_barycentric(mesh.triangles[triangle_id], closest)
+    corners = mesh.faces[triangle_id]
+    image = _texture_image(visual) if kind == "texture" else None
+    if image is not None and getattr(visual, "uv", None) is not None:
+        uv = np.einsum("nk,nkc->nc", barycentric, np.asarray(visual.uv, dtype=np.float64)[corners])
+        return trimesh.visual.color.uv_to_color(uv, image)[:, :3].astype(np.float64) / 255.0
+    if kind == "texture":
+        visual = visual.to_color()  # Текстура без изображения: основной цвет материала на вершинах
+    vertex_colors = np.asarray(visual.vertex_colors)[:, :3].astype(np.float64) / 255.0
+    return np.einsum("nk,nkc->nc", barycentric, vertex_colors[corners])
+
+def sample_cell_colors(cells_zyx: np.ndarray, transform: np.ndarray, mesh: trimesh.Trimesh) -> Optional[np.ndarray]:
+    """Цвет ближайшей точки поверхности для каждой ячейки (n, 3); transform — матрица VoxelGrid для индексов (x, y, z)."""
+    indices = cells_zyx[:, ::-1].astype(np.float64)
+    points = indices @ transform[:3, :3].T + transform[:3, 3]
+    return sample_surface_colors(mesh, points)
+
+def color_bricks(cubes: BrickSet, shape: Tuple[int, int, int], mesh: trimesh.Trimesh,
+                 transform: np.ndarray, palette: Sequence[str] = LEGO_COLORS) -> BrickSet:
+    """
+    Красит кирпичи по цвету исходной модели.
+
+    Для каждого кирпича усредняется цвет ближайшей точки поверхности по его поверхностным
+    ячейкам (внутренние кирпичи берут все свои ячейки), затем цвет квантуется
+    в палитру в пространстве Lab. Всё считается пакетно, без цикла по кирпичам.
+    Если у модели нет цветов, кирпичи возвращаются без изменений.
+    """
+    cubes = BrickSet.from_cubes(cubes)
+    if not mesh_has_colors(mesh) or not cubes:
+        return cubes
+    brick_array = cubes.coords
+    brick_idx, cz, cy, cx = brick_cells(brick_array)
+    inside = (cz < shape[0]) & (cy < shape[1]) & (cx < shape[2])
+    brick_idx, cz, cy, cx = brick_idx[inside], cz[inside], cy[inside], cx[inside]
+
+    occupied = np.zeros(shape, dtype=bool)
+    occupied[cz, cy, cx] = True
+    surface = occupied & ~binary_erosion(occupied, border_value=0)
+    on_surface = surface[cz, cy, cx]
+    has_surface = np.bincount(brick_idx[on_surface], minlength=len(cubes)) > 0
+    sampled = on_surface | ~has_surface[brick_idx]
+
+    cell_colors = sample_cell_colors(np.stack([cz[sampled], cy[sampled], cx[sampled]], axis=1), transform, mesh)
+    if cell_colors is None:
+        return cubes
+    counts = np.maximum(np.bincount(brick_idx[sampled], minlength=len(cubes)), 1)
+    mean_colors = np.stack([np.bincount(brick_idx[sampled], weights=cell_colors[:, c], minlength=len(cubes))
+                            for c in range(3)], axis=1) / counts[:, None]
+    labels = quantize_to_palette(mean_colors, palette)
+    logging.info(f"Bricks colored from mesh: {len(cubes)} bricks, {len(np.unique(labels))} palette colors")
+    return cubes.recolored(labels, palette)
+
+def voxel_color_labels(voxel_array: np.ndarray, mesh: trimesh.Trimesh, transform: np.ndarray,
+                       palette: Sequence[str] = LEGO_COLORS) -> Optional[np.ndarray]:
+    """
+    Сетка цветовых меток (индексы палитры, -1 — пусто); None, если у модели нет цветов.
+
+    Цвет поверхности сэмплируется только в поверхностных ячейках, внутренние
+    получают метку ближайшей поверхностной.
+    """
+    if not mesh_has_colors(mesh):
+        return None
+    labels = np.full(voxel_array.shape, -1, dtype=np.int32)
+    surface = voxel_array & ~binary_erosion(voxel_array, border_value=0)
+    cells = np.argwhere(surface)
+    if len(cells) == 0:
+        return labels
+    cell_colors = sample_cell_colors(cells, transform, mesh)
+    if cell_colors is None:
+        return None
+    labels[tuple(cells.T)] = quantize_to_palette(cell_colors, palette)
+    nearest = distance_transform_edt(~surface, return_distances=False, return_indices=True)
+    labels = np.where(voxel_array, labels[tuple(nearest)], -1).astype(np.int32)
+    logging.info(f"Voxel color labels: {len(cells)} voxels, {len(np.unique(labels[labels >= 0]))} palette colors")
+    return labels
+
+def color_bricks_from_labels(cubes: BrickSet, color_labels: np.ndarray,
+                             palette: Sequence[str] = LEGO_COLORS) -> BrickSet:
+    """Красит кирпичи по метке их опорной ячейки (кирпичи не пересекают границы меток)."""
+    cubes = BrickSet.from_cubes(cubes)
+    if not cubes:
+        return cubes
+    labels = color_labels[cubes.data["z"], cubes.data["y"], cubes.data["x"]]
+    # Кирпичи без метки сохраняют свой цвет: его код сдвигается за палитру в общей таблице
+    codes = np.where(labels >= 0, labels, len(palette) + cubes.color_codes.astype(np.int64))
+    return cubes.recolored(codes, list(palette) + list(cubes.colors))
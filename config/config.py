@@ -64,6 +64,28 @@ BRICK_SIZES = [
 def get_brick_height(brick_type):
     return BRICK_HEIGHTS.get(brick_type, 9.6)
 
+# Экспорт списка деталей в BrickLink: (короткая сторона, длинная сторона, высота, тип) -> номер детали
+BRICKLINK_PART_IDS: Dict[Tuple[int, int, int, str], str] = {
+    (1, 1, 1, "brick"): "3005", (1, 2, 1, "brick"): "3004", (1, 3, 1, "brick"): "3622",
+    (1, 4, 1, "brick"): "3010", (1, 6, 1, "brick"): "3009", (2, 2, 1, "brick"): "3003",
+    (2, 3, 1, "brick"): "3002", (2, 4, 1, "brick"): "3001", (2, 6, 1, "brick"): "2456",
+    (1, 1, 1, "plate"): "3024", (1, 2, 1, "plate"): "3023", (1, 3, 1, "plate"): "3623",
+    (1, 4, 1, "plate"): "3710", (1, 6, 1, "plate"): "3666", (2, 2, 1, "plate"): "3022",
+    (2, 3, 1, "plate"): "3021", (2, 4, 1, "plate"): "3020", (2, 6, 1, "plate"): "3795",
+    (3, 3, 1, "plate"): "11212", (4, 4, 1, "plate"): "3031",
+    (1, 1, 1, "tile"): "3070b", (1, 2, 1, "tile"): "3069b", (1, 4, 1, "tile"): "2431",
+    (2, 2, 1, "tile"): "3068b", (2, 4, 1, "tile"): "87079",
+}
+# Цвета BrickLink: номер -> (название, HEX); цвет кирпича сопоставляется ближайшему по RGB
+BRICKLINK_COLORS: Dict[int, Tuple[str, str]] = {
+    1: ("White", "#FFFFFF"), 2: ("Tan", "#DEC69C"), 3: ("Yellow", "#F7D117"), 4: ("Orange", "#FF7E14"),
+    5: ("Red", "#B30006"), 6: ("Green", "#00923D"), 7: ("Blue", "#0057A6"), 11: ("Black", "#212121"),
+    23: ("Pink", "#F7BCDA"), 24: ("Purple", "#A5499C"), 39: ("Dark Turquoise", "#008A80"),
+    42: ("Medium Blue", "#61AFFF"), 59: ("Dark Red", "#6A0E15"), 63: ("Dark Blue", "#243757"),
+    80: ("Dark Green", "#2E5543"), 85: ("Dark Bluish Gray", "#595D60"), 86: ("Light Bluish Gray", "#AFB5C7"),
+    88: ("Reddish Brown", "#89351D"), 120: ("Light Lime", "#EBEE8F"), 69: ("Dark Tan", "#B89869"),
+}
+
 # Настройки GUI
 WINDOW_TITLE: str = "Lego Builder Pro"
 WINDOW_GEOMETRY: Tuple[int, int, int, int] = (100, 100, 1600, 900)
@@ -77,7 +99,13 @@ MAX_DEPTH_DEFAULT: int = 6
 SCALE_FACTOR_RANGE: Tuple[float, float] = (0.1, 10.0)
 SCALE_FACTOR_DEFAULT: float = 1.0
 SCALE_FACTOR_STEP: float = 0.1
-CLUSTERING_METHODS: List[str] = ["greedy", "dbscan", "simulated_annealing", "branch_and_bound"]
+CLUSTERING_METHODS: List[str] = ["greedy", "dbscan", "simulated_annealing", "branch_and_bound", "beam_search"]
+BEAM_WIDTH_RANGE: Tuple[int, int] = (1, 32)
+BEAM_WIDTH_DEFAULT: int = 4
+SA_CHAINS_RANGE: Tuple[int, int] = (1, 16)
+SA_CHAINS_DEFAULT: int = 1
+TIME_LIMIT_RANGE: Tuple[int, int] = (0, 600)  # Секунды на укладку; 0 — без ограничения
+TIME_LIMIT_DEFAULT: int = 0
 SUPPORTED_EXTENSIONS: Tuple[str, ...] = (".stl", ".obj")
 DEFAULT_RADIUS: float = 5.0  # Радиус для измерения кривизны
 MIN_RADIUS = 1.0      # Минимальный радиус для мелких деталей
@@ -0,0 +1,85 @@
+# editing.py
+import logging
+import time
+import numpy as np
+from typing import Optional, Tuple
+from scipy.ndimage import binary_dilation
+from src.brick_optimization import extend_color_labels, refill_uncovered
+from src.stability import stud_links
+from src.strategies.brick_set import BrickSet
+from src.strategies.utils import rasterize_bricks
+
+EDIT_RADIUS = 1  # Радиус окрестности правки (в вокселях), в которой кирпичи снимаются и укладываются заново
+
+def _grow_grid(grid: np.ndarray, cells: np.ndarray, fill_value) -> np.ndarray:
+    """Расширяет сетку (z, y, x) со стороны старших индексов, чтобы в неё попали ячейки cells."""
+    need = cells.max(axis=0) + 1 if len(cells) else np.zeros(3, dtype=np.int64)
+    pad = np.maximum(need - np.array(grid.shape), 0)
+    if not np.any(pad):
+        return grid
+    return np.pad(grid, [(0, int(p)) for p in pad], constant_values=fill_value)
+
+def supported_closure(brick_ids: np.ndarray, invalid: np.ndarray) -> np.ndarray:
+    """Добавляет к снятым кирпичам всё, что опирается на них сверху, транзитивно по связям через шипы."""
+    src, dst, _ = stud_links(brick_ids)
+    invalid = invalid.copy()
+    count = -1
+    while count != np.count_nonzero(invalid):
+        count = np.count_nonzero(invalid)
+        invalid[dst[invalid[src]]] = True
+    return invalid
+
+def apply_voxel_edit(voxel_array: np.ndarray, cubes: BrickSet, cells: np.ndarray, fill: bool, allowed_sizes,
+                     allow_top_layer: bool = False, color_labels: Optional[np.ndarray] = None,
+                     rng: Optional[np.random.Generator] = None, radius: int = EDIT_RADIUS
+                     ) -> Tuple[np.ndarray, Optional[np.ndarray], BrickSet, BrickSet, BrickSet]:
+    """
+    Добавляет (fill=True) или удаляет воксели cells (k, 3: z, y, x) и перекладывает только затронутую область.
+
+    Снимаются кирпичи в окрестности radius вокруг правки и всё, что на них опирается;
+    остальная сборка сохраняется и служит опорой. Новые кирпичи получают цвет ближайшего
+    прежнего кирпича, при заданных метках — не пересекают их границы.
+    Возвращает (сетку, метки, новую сборку, снятые кирпичи, уложенные кирпичи).
+    """
+    start = time.time()
+    cubes = BrickSet.from_cubes(cubes)
+    cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+    cells = cells[np.all(cells >= 0, axis=1)]
+    voxel_array = _grow_grid(np.array(voxel_array, dtype=np.bool_), cells if fill else cells[:0], False)
+    if color_labels is not None:
+        color_labels = _grow_grid(np.asarray(color_labels, dtype=np.int32), cells if fill else cells[:0], -1)
+    cells = cells[np.all(cells < np.array(voxel_array.shape), axis=1)]
+    changed = np.zeros_like(voxel_array)
+    changed[cells[:, 0], cells[:, 1], cells[:, 2]] = voxel_array[cells[:, 0], cells[:, 1], cells[:, 2]] != fill
+    if not np.any(changed):
+        return voxel_array, color_labels, cubes, cubes[:0], cubes[:0]
+    voxel_array[changed] = fill
+    # Верхний слой сетки закрыт правилом верхнего слоя: держим над моделью пустой слой,
+    # иначе после правки верх модели остаётся непокрытым
+    if np.any(voxel_array[-1]):
+        voxel_array = np.pad(voxel_array, [(0, 1), (0, 0), (0, 0)], constant_values=False)
+        changed = np.pad(changed, [(0, 1), (0, 0), (0, 0)], constant_values=False)
+        if color_labels is not None:
+            color_labels = np.pad(color_labels, [(0, 1), (0, 0), (0, 0)], constant_values=-1)
+
+    # Снимаются кирпичи окрестности правки и всё, что они держат сверху
+    brick_ids = rasterize_bricks(cubes, voxel_array.shape)
+    region = binary_dilation(changed, np.ones((3, 3, 3), dtype=bool), iterations=radius)
+    touched = brick_ids[region & (brick_ids >= 0)]
+    invalid = supported_closure(brick_ids, np.bincount(touched, minlength=len(cubes)) > 0)
+    kept, removed = cubes[~invalid], cubes[invalid]
+
+    # Цвет ячейки — код прежнего кирпича, для новых вокселей — код ближайшего
+    codes = np.append(cubes.color_codes.astype(np.int32), -1)[brick_ids]
+    codes = extend_color_labels(codes, voxel_array)
+    if color_labels is not None:
+        color_labels = extend_color_labels(color_labels, voxel_array)
+
+    refill = (rasterize_bricks(removed, voxel_array.shape) >= 0) | (changed & voxel_array)
+    added = refill_uncovered(voxel_array, kept, refill, allowed_sizes, False, allow_top_layer, color_labels, rng)
+    if len(added):
+        colors = cubes.colors or ("#000000",)
+        added = added.recolored(codes[added.data["z"], added.data["y"], added.data["x"]].clip(0), colors)
+    logging.info(f"Voxel edit: {int(changed.sum())} cells {'added' if fill else 'removed'}, "
+                 f"{len(removed)} bricks removed, {len(added)} placed in {1000 * (time.time() - start):.1f} ms")
+    return voxel_array, color_labels, BrickSet.concatenate([kept, added]), removed, added
@@ -4,6 +4,7 @@ from typing import List, Tuple
 import trimesh
 import numpy as np
 from src.config.config import STUD_SIZE, get_brick_height
+from src.strategies.brick_set import BrickSet
 
 def scale_cube(cube: Tuple[float, float, float, int, int, int, str, str]) -> Tuple[float, float, float]:
     """
@@ -107,21 +108,19 @@ def create_lego_brick(w: int, h: int, d: int, brick_type: str, stud_size: float)
     brick.apply_translation((w * stud_size / 2, h * stud_size / 2, d * brick_height / 2))
     return brick
 
-def export_unique_bricks_stl(cubes: List[Tuple[float, float, float, int, int, int, str, str]], output_dir: str) -> None:
+def export_unique_bricks_stl(cubes: BrickSet, output_dir: str) -> None:
     if not cubes:
         logging.warning("No cubes to export as unique bricks")
         return
 
     logging.info(f"Exporting unique LEGO bricks to STL files in: {output_dir}")
     try:
-        unique_bricks = {}
-        for cube in cubes:
-            _, _, _, w, h, d, _, brick_type = cube
-            key = (w, h, d, brick_type)
-            if key not in unique_bricks:
-                unique_bricks[key] = cube
+        cubes = BrickSet.from_cubes(cubes)
+        # Уникальные формы — одним np.unique по полям структурированного массива
+        shapes = np.unique(cubes.data[["w", "h", "d", "type"]])
         
-        for (w, h, d, brick_type), cube in unique_bricks.items():
+        for w, h, d, type_code in shapes.tolist():
+            brick_type = cubes.types[type_code]
             brick = create_lego_brick(w, h, d, brick_type, STUD_SIZE)
             brick_path = os.path.join(output_dir, f"Brick_{w}x{h}x{d}_{brick_type}.stl")  # Полный путь
             brick.export(brick_path)
@@ -11,7 +11,8 @@ from src.config.config import (
     LOGO_SIZE, BUTTON_GROUP_SIZE, MODEL_WINDOW_MIN_WIDTH, SETTINGS_PANEL_MIN_WIDTH,
     SETTINGS_PANEL_MIN_HEIGHT, ACTION_BUTTON_SIZE, SMALL_BUTTON_SIZE, ICON_SIZE, 
     OUTPUT_PATH_BUTTON_SIZE, TOGGLE_BUTTON_SIZE,
-    PROGRESS_HEIGHT, DEFAULT_OUTPUT_PATH, BRICK_SIZES
+    PROGRESS_HEIGHT, DEFAULT_OUTPUT_PATH, BRICK_SIZES, BEAM_WIDTH_RANGE, BEAM_WIDTH_DEFAULT,
+    SA_CHAINS_RANGE, SA_CHAINS_DEFAULT, TIME_LIMIT_RANGE, TIME_LIMIT_DEFAULT
 )
 from src.gui.view_cube import ViewCube
 from pyvistaqt import QtInteractor
@@ -249,9 +250,9 @@ class SettingsPanel(QTabWidget):
         instruction_label = QLabel("Instruction Style")
         instruction_label.setToolTip("Управляет способом группировки шагов сборки")
         parent.instruction_style = QComboBox()
-        parent.instruction_style.addItems(["Fast Grouping", "Detailed Grouping"])
+        parent.instruction_style.addItems(["Fast Grouping", "Detailed Grouping", "Proximity Grouping"])
         parent.instruction_style.setCurrentIndex(0)
-        parent.instruction_style.setToolTip("Быстрая группировка: меньше шагов (метод соединений), Детальная группировка: точные шаги (метод DBSCAN)")
+        parent.instruction_style.setToolTip("Быстрая группировка: меньше шагов (метод соединений), Детальная группировка: точные шаги (метод DBSCAN), Группировка по близости: близкие части модели в одном шаге (расширение)")
         settings_layout.addWidget(instruction_label)
         settings_layout.addWidget(parent.instruction_style)
 
@@ -259,12 +260,54 @@ class SettingsPanel(QTabWidget):
         placement_label = QLabel("Placement Method")
         placement_label.setToolTip("Выбирает алгоритм размещения LEGO-кирпичей")
         parent.placement_method = QComboBox()
-        parent.placement_method.addItems(["Greedy (Fast)", "Simulated Annealing", "Branch and Bound"])
+        parent.placement_method.addItems(["Greedy (Fast)", "Simulated Annealing", "Branch and Bound", "Beam Search"])
         parent.placement_method.setCurrentIndex(0)
-        parent.placement_method.setToolTip("Жадный: быстрый и простой, Симулированный отжиг: сбалансированная оптимизация, Ветвление и границы: точный, но медленный")
+        parent.placement_method.setToolTip("Жадный: быстрый и простой, Симулированный отжиг: сбалансированная оптимизация, Ветвление и границы: точный, но медленный, Лучевой поиск: качество растёт с шириной луча")
         settings_layout.addWidget(placement_label)
         settings_layout.addWidget(parent.placement_method)
 
+        # Beam Width
+        beam_width_label = QLabel("Beam Width")
+        beam_width_label.setToolTip("Ширина луча для лучевого поиска: больше — лучше укладка, но дольше")
+        parent.beam_width = QSlider(Qt.Horizontal)
+        parent.beam_width.setRange(*BEAM_WIDTH_RANGE)
+        parent.beam_width.setValue(BEAM_WIDTH_DEFAULT)
+        parent.beam_width_value = QLabel(str(BEAM_WIDTH_DEFAULT))
+        parent.beam_width.valueChanged.connect(lambda v: parent.beam_width_value.setText(str(v)))
+        beam_width_layout = QHBoxLayout()
+        beam_width_layout.addWidget(beam_width_label)
+        beam_width_layout.addWidget(parent.beam_width)
+        beam_width_layout.addWidget(parent.beam_width_value)
+        settings_layout.addLayout(beam_width_layout)
+
+        # Annealing Chains
+        sa_chains_label = QLabel("Annealing Chains")
+        sa_chains_label.setToolTip("Число параллельных цепочек отжига (каждая в своём процессе, с обменом температурами)")
+        parent.sa_chains = QSlider(Qt.Horizontal)
+        parent.sa_chains.setRange(*SA_CHAINS_RANGE)
+        parent.sa_chains.setValue(SA_CHAINS_DEFAULT)
+        parent.sa_chains_value = QLabel(str(SA_CHAINS_DEFAULT))
+        parent.sa_chains.valueChanged.connect(lambda v: parent.sa_chains_value.setText(str(v)))
+        sa_chains_layout = QHBoxLayout()
+        sa_chains_layout.addWidget(sa_chains_label)
+        sa_chains_layout.addWidget(parent.sa_chains)
+        sa_chains_layout.addWidget(parent.sa_chains_value)
+        settings_layout.addLayout(sa_chains_layout)
+
+        # Time Limit
+        time_limit_label = QLabel("Time Limit (s)")
+        time_limit_label.setToolTip("Ограничение времени укладки: по истечении возвращается лучшее найденное решение (0 — без ограничения)")
+        parent.time_limit = QSlider(Qt.Horizontal)
+        parent.time_limit.setRange(*TIME_LIMIT_RANGE)
+        parent.time_limit.setValue(TIME_LIMIT_DEFAULT)
+        parent.time_limit_value = QLabel("Off" if TIME_LIMIT_DEFAULT == 0 else str(TIME_LIMIT_DEFAULT))
+        parent.time_limit.valueChanged.connect(lambda v: parent.time_limit_value.setText("Off" if v == 0 else str(v)))
+        time_limit_layout = QHBoxLayout()
+        time_limit_layout.addWidget(time_limit_label)
+        time_limit_layout.addWidget(parent.time_limit)
+        time_limit_layout.addWidget(parent.time_limit_value)
+        settings_layout.addLayout(time_limit_layout)
+
         # Toggles (Use Colors, Render Steps, Generate Instructions)
         toggles_widget = QWidget()
         toggles_layout = QHBoxLayout(toggles_widget)
@@ -310,6 +353,16 @@ class SettingsPanel(QTabWidget):
         parent.parallel_processing.setToolTip("Использовать несколько ядер для ускорения генерации инструкций")
         settings_layout.addWidget(parent.parallel_processing)
 
+        # Parallel Placement
+        parallel_placement_label = QLabel("Parallel Placement")
+        parallel_placement_label.setToolTip("Распределяет размещение кирпичей по нескольким процессам")
+        parent.parallel_placement = QComboBox()
+        parent.parallel_placement.addItems(["Off", "Blocks", "Components"])
+        parent.parallel_placement.setCurrentIndex(0)
+        parent.parallel_placement.setToolTip("Выкл.: один процесс, Блоки: модель режется на колонны блоков, швы между ними сшиваются, Компоненты: каждая несвязная часть модели размещается отдельно")
+        settings_layout.addWidget(parallel_placement_label)
+        settings_layout.addWidget(parent.parallel_placement)
+
         # Stats
         stats_layout = QFormLayout()
         stats_layout.setSpacing(10)
@@ -417,6 +470,19 @@ class SettingsPanel(QTabWidget):
         parent.allow_top_layer.setToolTip("Разрешить размещение кирпичей сверху с боковой поддержкой")
         settings_layout.addWidget(parent.allow_top_layer)
 
+        parent.mirror_symmetry = QCheckBox("Mirror Symmetry")
+        parent.mirror_symmetry.setToolTip("Для симметричных моделей укладывать половину и отражать её")
+        settings_layout.addWidget(parent.mirror_symmetry)
+
+        parent.heightfield_mode = QCheckBox("Heightfield Mode")
+        parent.heightfield_mode.setToolTip("Для рельефов (2.5D) укладывать колонками по карте высот вместо выбранной стратегии")
+        settings_layout.addWidget(parent.heightfield_mode)
+
+        parent.voxel_edit = QCheckBox("Voxel Edit Mode")
+        parent.voxel_edit.setToolTip("Щелчок по грани добавляет воксель, Shift+щелчок удаляет; перекладывается только окрестность")
+        parent.voxel_edit.toggled.connect(parent.toggle_voxel_edit)
+        settings_layout.addWidget(parent.voxel_edit)
+
         settings_layout.addStretch(1)
         settings_scroll.setWidget(settings_widget)
         self.addTab(settings_scroll, "Settings")
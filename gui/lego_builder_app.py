@@ -13,10 +13,12 @@ from src.config.config import (
     DEFAULT_OUTPUT_PATH, STUD_SIZE, TEMP_IMAGE_DIR, WINDOW_TITLE, WINDOW_WIDTH, WINDOW_HEIGHT, BASE_WIDTH, CAMERA_ANIMATION_STEPS, CAMERA_ANIMATION_INTERVAL,
     SNACKBAR_DISPLAY_DURATION, ROUNDING_RADIUS, CUBE_OPACITY, FLOOR_COLOR, FLOOR_EDGE_COLOR,
     FLOOR_OPACITY, LIGHT_DISTANCE_FACTOR, LIGHT_INTENSITY_TOP, LIGHT_INTENSITY_SIDES, LIGHT_INTENSITY_AMBIENT,
-    BRICK_SIZES, PROGRESS_UPDATE_INTERVAL,SNACKBAR_ANIMATION_DURATION,THUMBNAIL_WIDTH,THUMBNAIL_ICON_SIZE
+    BRICK_SIZES, PROGRESS_UPDATE_INTERVAL,SNACKBAR_ANIMATION_DURATION,THUMBNAIL_WIDTH,THUMBNAIL_ICON_SIZE,
+    BEAM_WIDTH_DEFAULT, SA_CHAINS_DEFAULT, TIME_LIMIT_DEFAULT
 )
 from src.gui.visualization import FLOOR_Z_POSITION, SceneRenderer, update_preview
 from src.gui.model_interaction import set_view
+from src.gui.voxel_editor import VoxelEditor
 from src.processing import load_model, process_model
 from src.gui.gui_components import Header, ModelWindow, SettingsPanel, ActionButtons, ProgressLogs
 from src.gui.gui_logger import QTextEditLogger
@@ -80,6 +82,8 @@ class LegoBuilderApp(QMainWindow):
         self.model_loaded = False
         self.pdf_path = None
         self.cubes = []
+        self.allowed_sizes = BRICK_SIZES
+        self.voxel_editor = None
         self.model_path = None
         self.is_processing = False
         self.instructions = []
@@ -459,14 +463,21 @@ class LegoBuilderApp(QMainWindow):
             allowed_sizes = selected_sizes
         else:
             allowed_sizes = BRICK_SIZES
+        self.allowed_sizes = allowed_sizes
 
         placement_method_map = {
             "Greedy (Fast)": "greedy",
             "Simulated Annealing": "simulated_annealing",
-            "Branch and Bound": "branch_and_bound"
+            "Branch and Bound": "branch_and_bound",
+            "Beam Search": "beam_search"
         }
         placement_method = placement_method_map[self.placement_method.currentText()]
-        clustering_method = "connected" if self.instruction_style.currentText() == "Fast Grouping" else "dbscan"
+        instruction_style_map = {
+            "Fast Grouping": "connected",
+            "Detailed Grouping": "dbscan",
+            "Proximity Grouping": "dilated"
+        }
+        clustering_method = instruction_style_map[self.instruction_style.currentText()]
 
         # Обработка Fill Mode
         fill_mode = self.fill_mode.currentText()
@@ -476,6 +487,12 @@ class LegoBuilderApp(QMainWindow):
         # Новые параметры
         allow_top_layer = self.allow_top_layer.isChecked()
         parallel_processing = self.parallel_processing.isChecked()
+        parallel_placement_map = {
+            "Off": None,
+            "Blocks": "blocks",
+            "Components": "components"
+        }
+        parallel_placement = parallel_placement_map[self.parallel_placement.currentText()]
         render_steps = self.render_steps.isChecked()
         generate_instructions = self.generate_instructions.isChecked()
         step_image_size = self.step_image_size.value()
@@ -484,7 +501,8 @@ class LegoBuilderApp(QMainWindow):
                     f"allowed_sizes={allowed_sizes}, placement_method={placement_method}, "
                     f"clustering_method={clustering_method}, fill_hollow={fill_hollow}, "
                     f"minimal_support={minimal_support}, allow_top_layer={allow_top_layer}, "
-                    f"parallel_processing={parallel_processing}, render_steps={render_steps}, "
+                    f"parallel_processing={parallel_processing}, parallel_placement={parallel_placement}, "
+                    f"render_steps={render_steps}, "
                     f"generate_instructions={generate_instructions}")
         logging.info("Starting model generation")
         self.progress_history.clear()
@@ -500,7 +518,11 @@ class LegoBuilderApp(QMainWindow):
             fill_hollow=fill_hollow, minimal_support=minimal_support,
             allow_top_layer=allow_top_layer, parallel_processing=parallel_processing,
             render_steps=render_steps, do_generate_instructions=generate_instructions,
-            step_image_size=step_image_size
+            step_image_size=step_image_size, parallel_placement=parallel_placement,
+            beam_width=self.beam_width.value(), sa_chains=self.sa_chains.value(),
+            time_limit=self.time_limit.value() or None,
+            symmetry=self.mirror_symmetry.isChecked(),
+            heightfield=self.heightfield_mode.isChecked()
         )
         self.is_generating = True
         self.worker_signals.progress.connect(self.update_progress)
@@ -585,6 +607,8 @@ class LegoBuilderApp(QMainWindow):
         if not self.worker_signals._stopped:
             self.cubes = cubes
             self.instructions = instructions
+            if self.voxel_editor is not None:
+                self.voxel_editor.reset()
             elapsed = time.time() - self.start_time
             complexity, total_score = self.calculate_complexity(cubes, instructions, elapsed)
             self.pdf_path = pdf_path
@@ -764,12 +788,18 @@ class LegoBuilderApp(QMainWindow):
         self.render_steps.setChecked(self.settings.value("render_steps", True, type=bool))
         self.generate_instructions.setChecked(self.settings.value("generate_instructions", True, type=bool))
         self.parallel_processing.setChecked(self.settings.value("parallel_processing", False, type=bool))
+        self.parallel_placement.setCurrentText(self.settings.value("parallel_placement", "Off"))
+        self.beam_width.setValue(self.settings.value("beam_width", BEAM_WIDTH_DEFAULT, type=int))
+        self.sa_chains.setValue(self.settings.value("sa_chains", SA_CHAINS_DEFAULT, type=int))
+        self.time_limit.setValue(self.settings.value("time_limit", TIME_LIMIT_DEFAULT, type=int))
         self.output_path.setText(self.settings.value("output_path", DEFAULT_OUTPUT_PATH))
         self.export_voxelized.setChecked(self.settings.value("export_voxelized", True, type=bool))
         self.export_unique_bricks.setChecked(self.settings.value("export_unique_bricks", True, type=bool))
         self.step_image_size.setValue(self.settings.value("step_image_size", 300, type=int))
         self.log_level.setCurrentText(self.settings.value("log_level", "INFO"))
         self.allow_top_layer.setChecked(self.settings.value("allow_top_layer", False, type=bool))
+        self.mirror_symmetry.setChecked(self.settings.value("mirror_symmetry", False, type=bool))
+        self.heightfield_mode.setChecked(self.settings.value("heightfield_mode", False, type=bool))
         # Вкладка Cubs
         selected_bricks = self.settings.value("brick_sizes", [f"{w}x{h}x{d} ({t})" for w, h, d, t in BRICK_SIZES], type=list)
         for item in [self.brick_sizes.item(i) for i in range(self.brick_sizes.count())]:
@@ -790,12 +820,18 @@ class LegoBuilderApp(QMainWindow):
         self.settings.setValue("render_steps", self.render_steps.isChecked())
         self.settings.setValue("generate_instructions", self.generate_instructions.isChecked())
         self.settings.setValue("parallel_processing", self.parallel_processing.isChecked())
+        self.settings.setValue("parallel_placement", self.parallel_placement.currentText())
+        self.settings.setValue("beam_width", self.beam_width.value())
+        self.settings.setValue("sa_chains", self.sa_chains.value())
+        self.settings.setValue("time_limit", self.time_limit.value())
         self.settings.setValue("output_path", self.output_path.text())
         self.settings.setValue("export_voxelized", self.export_voxelized.isChecked())
         self.settings.setValue("export_unique_bricks", self.export_unique_bricks.isChecked())
         self.settings.setValue("step_image_size", self.step_image_size.value())
         self.settings.setValue("log_level", self.log_level.currentText())
         self.settings.setValue("allow_top_layer", self.allow_top_layer.isChecked())
+        self.settings.setValue("mirror_symmetry", self.mirror_symmetry.isChecked())
+        self.settings.setValue("heightfield_mode", self.heightfield_mode.isChecked())
         # Вкладка Cubs
         selected_bricks = [item.text() for item in self.brick_sizes.selectedItems()]
         self.settings.setValue("brick_sizes", selected_bricks if selected_bricks else [f"{w}x{h}x{d} ({t})" for w, h, d, t in BRICK_SIZES])
@@ -813,6 +849,16 @@ class LegoBuilderApp(QMainWindow):
             update_preview(self)
             self.plotter.reset_camera()
 
+    def toggle_voxel_edit(self, enabled):
+        if self.voxel_editor is None:
+            self.voxel_editor = VoxelEditor(self)
+        if enabled:
+            self.voxel_editor.enable()
+            if not self.cubes:
+                self.show_snackbar("Generate a model to edit its voxels")
+        else:
+            self.voxel_editor.disable()
+
     def view_voxel(self):
         if not self.cubes:
             self.show_snackbar("No voxel assembly generated!")
@@ -1,5 +1,5 @@
 import logging
-from typing import List, Tuple, Optional
+from typing import Tuple, Optional
 import pyvista as pv
 import numpy as np
 from pyvistaqt import QtInteractor
@@ -9,10 +9,20 @@ from src.config.config import (
     FLOOR_OPACITY, FLOOR_COLOR, FLOOR_EDGE_COLOR, CUBE_EDGE_COLOR, CUBE_OPACITY,
     ORIGINAL_MESH_COLOR, ORIGINAL_MESH_OPACITY, get_brick_height
 )
+from src.coloring import hex_to_rgb
+from src.strategies.brick_set import BrickSet
 
 # Константы
 FLOOR_Z_POSITION = -10
 SCENE_SIZE_MARGIN = 1.5
+# Углы единичного куба и его грани (по 4 вершины) для сборки всех кирпичей в один меш
+BOX_CORNERS = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                        [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]], dtype=np.float64)
+BOX_FACES = np.array([[0, 3, 2, 1], [4, 5, 6, 7], [0, 1, 5, 4],
+                      [1, 2, 6, 5], [2, 3, 7, 6], [3, 0, 4, 7]], dtype=np.int64)
+# Внешние нормали граней BOX_FACES в осях (x, y, z): ячейка меша // 6 — кирпич, % 6 — грань
+BOX_FACE_NORMALS = np.array([[0, 0, -1], [0, 0, 1], [0, -1, 0],
+                             [1, 0, 0], [0, 1, 0], [-1, 0, 0]], dtype=np.int64)
 
 class SceneRenderer:
     """Класс для рендеринга 3D-сцены."""
@@ -20,19 +30,18 @@ class SceneRenderer:
         self.plotter = plotter
         self.plotter.clear()
 
-    def _calculate_bounds(self, cubes: List[Tuple], scale: float, mesh=None) -> Tuple[float, float, float]:
+    def _calculate_bounds(self, cubes: BrickSet, scale: float, mesh=None) -> Tuple[float, float, float]:
         """Вычисляет размеры сцены и центр."""
         max_size = 100.0  # Минимальный размер
         center_x, center_y = 0.0, 0.0
 
         if cubes:
-            max_x = max(abs(cube[0]) + cube[3] for cube in cubes) * STUD_SIZE * scale
-            max_y = max(abs(cube[1]) + cube[4] for cube in cubes) * STUD_SIZE * scale
-            max_size = max(max_x, max_y) * SCENE_SIZE_MARGIN
-            center_x = (min(cube[0] * STUD_SIZE * scale for cube in cubes) +
-                        max((cube[0] + cube[3]) * STUD_SIZE * scale for cube in cubes)) / 2
-            center_y = (min(cube[1] * STUD_SIZE * scale for cube in cubes) +
-                        max((cube[1] + cube[4]) * STUD_SIZE * scale for cube in cubes)) / 2
+            x, y, _, w, h, _ = cubes.coords.T
+            max_x = np.max(np.abs(x) + w) * STUD_SIZE * scale
+            max_y = np.max(np.abs(y) + h) * STUD_SIZE * scale
+            max_size = float(max(max_x, max_y) * SCENE_SIZE_MARGIN)
+            center_x = float(x.min() + (x + w).max()) * STUD_SIZE * scale / 2
+            center_y = float(y.min() + (y + h).max()) * STUD_SIZE * scale / 2
         elif mesh:
             bounds = mesh.bounds
             if bounds.shape == (2, 3):
@@ -50,18 +59,22 @@ class SceneRenderer:
         self.plotter.add_mesh(floor, color=FLOOR_COLOR, show_edges=True, edge_color=FLOOR_EDGE_COLOR,
                               opacity=FLOOR_OPACITY, lighting=False)
 
-    def _add_bricks(self, cubes: List[Tuple], scale: float, center_x: float, center_y: float, highlight_index: Optional[int] = None):
-        for i, (x, y, z, w, h, d, color, brick_type) in enumerate(cubes):
-            brick_height = get_brick_height(brick_type)  # 9.6 мм или 3.2 мм
-            x_mm = x * STUD_SIZE * scale - center_x
-            y_mm = y * STUD_SIZE * scale - center_y
-            z_mm = z * STUD_SIZE * scale  # z в вокселях по 3.2 мм
-            w_mm = w * STUD_SIZE * scale
-            h_mm = h * STUD_SIZE * scale
-            d_mm = brick_height * scale  # Реальная высота кирпича
-            box = pv.Box(bounds=[x_mm, x_mm + w_mm, y_mm, y_mm + h_mm, z_mm, z_mm + d_mm])
-            self.plotter.add_mesh(box, color=color, show_edges=True, edge_color=CUBE_EDGE_COLOR,
-                                opacity=1.0, lighting=True)
+    def _add_bricks(self, cubes: BrickSet, scale: float, center_x: float, center_y: float, highlight_index: Optional[int] = None):
+        """Все кирпичи добавляются одним мешем с цветом на грань вместо отдельного актёра на кирпич."""
+        x, y, z, w, h, _ = cubes.coords.T
+        brick_heights = np.array([get_brick_height(t) for t in cubes.types])[cubes.type_codes]  # 9.6 мм или 3.2 мм
+        origin = np.stack([x * STUD_SIZE * scale - center_x,
+                           y * STUD_SIZE * scale - center_y,
+                           z * STUD_SIZE * scale], axis=1)  # z в вокселях по 3.2 мм
+        size = np.stack([w * STUD_SIZE * scale, h * STUD_SIZE * scale, brick_heights * scale], axis=1)  # Реальная высота кирпича
+        points = (origin[:, None, :] + BOX_CORNERS[None, :, :] * size[:, None, :]).reshape(-1, 3)
+        quads = (np.arange(len(cubes))[:, None, None] * len(BOX_CORNERS) + BOX_FACES[None, :, :]).reshape(-1, 4)
+        faces = np.hstack([np.full((len(quads), 1), 4, dtype=np.int64), quads]).ravel()
+        bricks_mesh = pv.PolyData(points, faces)
+        palette = (hex_to_rgb(cubes.colors) * 255).round().astype(np.uint8)
+        bricks_mesh.cell_data["colors"] = np.repeat(palette[cubes.color_codes], len(BOX_FACES), axis=0)
+        self.plotter.add_mesh(bricks_mesh, scalars="colors", rgb=True, show_edges=True, edge_color=CUBE_EDGE_COLOR,
+                              opacity=1.0, lighting=True)
 
     def _add_original_mesh(self, mesh, scale: float, center_x: float, center_y: float):
         """Добавляет оригинальный меш."""
@@ -89,11 +102,12 @@ class SceneRenderer:
         self.plotter.add_light(pv.Light(color="white", intensity=LIGHT_INTENSITY_AMBIENT,
                                         positional=False, show_actor=False))
 
-    def render(self, cubes: List[Tuple], scale: float = 1.0, mesh=None, show_original: bool = False, 
+    def render(self, cubes: BrickSet, scale: float = 1.0, mesh=None, show_original: bool = False, 
                 highlight_index: Optional[int] = None, voxel_size: float = STUD_SIZE):
             self.plotter.clear()
             global STUD_SIZE
             STUD_SIZE = voxel_size  # Обновляем глобальную константу
+            cubes = BrickSet.from_cubes(cubes)
             size, center_x, center_y = self._calculate_bounds(cubes, scale, mesh)
             self._add_floor(size)
             if cubes and not show_original:
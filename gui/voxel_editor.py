@@ -0,0 +1,105 @@
+import logging
+import numpy as np
+import pyvista as pv
+from typing import Optional, Tuple
+from vtkmodules.vtkRenderingCore import vtkCellPicker
+from src.editing import apply_voxel_edit
+from src.instruction_generation import update_instructions
+from src.strategies.brick_set import BrickSet
+from src.strategies.utils import rasterize_bricks
+from src.gui.visualization import BOX_CORNERS, BOX_FACE_NORMALS, update_preview
+
+CLICK_TOLERANCE = 3  # Сдвиг мыши (px), после которого нажатие считается вращением камеры, а не правкой
+
+class VoxelEditor:
+    """
+    Режим правки вокселей: щелчок по грани кирпича добавляет ячейку за этой гранью,
+    Shift+щелчок удаляет ячейку под курсором. После правки перекладывается только
+    окрестность изменённой ячейки, инструкции обновляются без полного пересчёта.
+    """
+    def __init__(self, app):
+        self.app = app
+        self.picker = vtkCellPicker()
+        self.picker.SetTolerance(0.0005)
+        self.voxel_array = None
+        self.press_position = None
+        self.observers = []
+
+    def enable(self):
+        if self.observers:
+            return
+        iren = self.app.plotter.iren
+        self.observers = [iren.add_observer("LeftButtonPressEvent", self._on_press),
+                          iren.add_observer("LeftButtonReleaseEvent", self._on_release)]
+        logging.info("Voxel edit mode enabled: click adds a voxel, Shift+click removes one")
+
+    def disable(self):
+        for observer in self.observers:
+            self.app.plotter.iren.remove_observer(observer)
+        self.observers = []
+        logging.info("Voxel edit mode disabled")
+
+    def reset(self):
+        """Сбрасывает сетку правки после новой генерации."""
+        self.voxel_array = None
+
+    def _grid(self) -> np.ndarray:
+        """Сетка правки — ячейки, покрытые кирпичами: редактируется то, что видно в сцене."""
+        if self.voxel_array is None:
+            coords = BrickSet.from_cubes(self.app.cubes).coords
+            ends = coords[:, :3] + coords[:, 3:]  # x + w, y + h, z + d
+            shape = tuple(int(v) for v in ends.max(axis=0)[::-1])
+            self.voxel_array = rasterize_bricks(self.app.cubes, shape) >= 0
+        return self.voxel_array
+
+    def _on_press(self, *args):
+        self.press_position = self.app.plotter.iren.get_event_position()
+
+    def _on_release(self, *args):
+        position = self.app.plotter.iren.get_event_position()
+        if self.press_position is None or self.app.show_original or not len(self.app.cubes):
+            return
+        moved = max(abs(position[0] - self.press_position[0]), abs(position[1] - self.press_position[1]))
+        self.press_position = None
+        if moved > CLICK_TOLERANCE:
+            return
+        remove = bool(self.app.plotter.iren.interactor.GetShiftKey())
+        cell = self._pick_cell(position, remove)
+        if cell is not None:
+            self.edit(cell, fill=not remove)
+
+    def _pick_cell(self, position: Tuple[int, int], remove: bool) -> Optional[Tuple[int, int, int]]:
+        """Ячейка (z, y, x) под курсором (remove) или соседняя с выбранной гранью."""
+        if not self.picker.Pick(position[0], position[1], 0, self.app.plotter.renderer):
+            return None
+        cell_id = self.picker.GetCellId()
+        dataset = self.picker.GetDataSet()
+        if cell_id < 0 or dataset is None or dataset.GetNumberOfCells() != 6 * len(self.app.cubes):
+            return None  # Щелчок по полу или по исходной модели
+        brick, face = divmod(cell_id, len(BOX_FACE_NORMALS))
+        x, y, z, w, h, d = self.app.cubes[int(brick)][:6]
+        corners = pv.wrap(dataset).points[brick * len(BOX_CORNERS):(brick + 1) * len(BOX_CORNERS)]
+        lo, hi = corners.min(axis=0), corners.max(axis=0)
+        fraction = (np.array(self.picker.GetPickPosition()) - lo) / np.maximum(hi - lo, 1e-9)
+        size = np.array([w, h, d])
+        offset = np.clip(np.floor(fraction * size).astype(np.int64), 0, size - 1)
+        target = np.array([x, y, z]) + offset
+        if not remove:
+            target += BOX_FACE_NORMALS[face]
+        return int(target[2]), int(target[1]), int(target[0])
+
+    def edit(self, cell: Tuple[int, int, int], fill: bool):
+        app = self.app
+        voxel_array, _, cubes, removed, added = apply_voxel_edit(
+            self._grid(), app.cubes, np.array([cell]), fill, app.allowed_sizes, app.allow_top_layer.isChecked())
+        self.voxel_array = voxel_array
+        if not len(removed) and not len(added):
+            return
+        app.cubes = cubes
+        if len(app.instructions):
+            app.instructions = update_instructions(app.instructions, removed, added)
+        app.bricks_value.setText(str(len(cubes)))
+        app.thumbnail_list.clear()
+        camera_position = app.plotter.camera_position
+        update_preview(app)
+        app.plotter.camera_position = camera_position
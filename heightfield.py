@@ -0,0 +1,210 @@
+# heightfield.py
+import logging
+import numpy as np
+import trimesh
+from numba import njit
+from typing import Optional, Sequence, Tuple
+from src.config.config import LEGO_COLORS
+from src.coloring import mesh_has_colors, quantize_to_palette, sample_cell_colors
+from src.strategies.brick_set import BrickSet
+from src.strategies.catalog import BrickCatalog
+
+# Сдвиг центров пикселей, чтобы центр не попадал точно на общее ребро двух треугольников
+_PIXEL_JITTER = (1.3e-4, 0.7e-4)
+
+@njit(cache=True)
+def _rasterize_surface(triangles: np.ndarray, origin: np.ndarray, pitch: float,
+                       ny: int, nx: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Z-буфер по вертикальным лучам через центры пикселей.
+
+    Возвращает верхнюю и нижнюю высоту поверхности и число пересечений луча с сеткой.
+    """
+    top = np.full((ny, nx), -np.inf)
+    bottom = np.full((ny, nx), np.inf)
+    crossings = np.zeros((ny, nx), dtype=np.int32)
+    for t in range(triangles.shape[0]):
+        ax, ay, az = triangles[t, 0, 0], triangles[t, 0, 1], triangles[t, 0, 2]
+        bx, by, bz = triangles[t, 1, 0], triangles[t, 1, 1], triangles[t, 1, 2]
+        cx, cy, cz = triangles[t, 2, 0], triangles[t, 2, 1], triangles[t, 2, 2]
+        area = (bx - ax) * (cy - ay) - (cx - ax) * (by - ay)
+        if abs(area) < 1e-12:
+            continue  # Вертикальные грани лучи не пересекают
+        i0 = max(int(np.floor((min(ax, bx, cx) - origin[0]) / pitch - 0.5)), 0)
+        i1 = min(int(np.ceil((max(ax, bx, cx) - origin[0]) / pitch - 0.5)), nx - 1)
+        j0 = max(int(np.floor((min(ay, by, cy) - origin[1]) / pitch - 0.5)), 0)
+        j1 = min(int(np.ceil((max(ay, by, cy) - origin[1]) / pitch - 0.5)), ny - 1)
+        for j in range(j0, j1 + 1):
+            py = origin[1] + (j + 0.5 + _PIXEL_JITTER[1]) * pitch
+            for i in range(i0, i1 + 1):
+                px = origin[0] + (i + 0.5 + _PIXEL_JITTER[0]) * pitch
+                u = ((bx - px) * (cy - py) - (cx - px) * (by - py)) / area
+                v = ((cx - px) * (ay - py) - (ax - px) * (cy - py)) / area
+                w = 1.0 - u - v
+                if u < 0 or v < 0 or w < 0:
+                    continue
+                z = u * az + v * bz + w * cz
+                top[j, i] = max(top[j, i], z)
+                bottom[j, i] = min(bottom[j, i], z)
+                crossings[j, i] += 1
+    return top, bottom, crossings
+
+def mesh_heightfield(mesh: trimesh.Trimesh, pitch: float) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """
+    Колоночная вокселизация рельефа: карта высот (ny, nx) в вокселях и матрица transform.
+
+    Модель считается рельефом, если каждый вертикальный луч пересекает её не больше
+    двух раз, а нижняя поверхность лежит на полу. Иначе возвращается None и
+    модель идёт через обычную 3D-вокселизацию. Время зависит от площади основания.
+    """
+    lo, hi = mesh.bounds
+    nx, ny = (int(np.ceil((hi[i] - lo[i]) / pitch)) for i in (0, 1))
+    if nx == 0 or ny == 0:
+        return None
+    top, bottom, crossings = _rasterize_surface(np.ascontiguousarray(mesh.triangles, dtype=np.float64),
+                                                np.asarray(lo, dtype=np.float64), float(pitch), ny, nx)
+    hit = crossings > 0
+    if not np.any(hit) or np.any(crossings[hit] != 2) or np.any(bottom[hit] - lo[2] > pitch / 2):
+        return None
+    heights = np.zeros((ny, nx), dtype=np.int64)
+    heights[hit] = np.floor((top[hit] - lo[2]) / pitch + 0.5)
+    # Индексы (x, y, z) -> центр вокселя, как у VoxelGrid.transform
+    transform = np.diag([pitch, pitch, pitch, 1.0])
+    transform[:3, 3] = lo + pitch / 2
+    logging.info(f"Heightfield detected: footprint {nx}x{ny}, max height {int(heights.max())} voxels")
+    return heights, transform
+
+def height_image(voxel_array: np.ndarray) -> Optional[np.ndarray]:
+    """Карта высот (ny, nx), если каждая колонка сетки (z, y, x) — сплошной столбик от пола, иначе None."""
+    counts = voxel_array.sum(axis=0)
+    # Высота колонки — номер верхнего занятого слоя + 1; у сплошного столбика она равна числу вокселей
+    top = voxel_array.shape[0] - np.argmax(voxel_array[::-1], axis=0)
+    top[counts == 0] = 0
+    if not np.array_equal(counts, top):
+        return None
+    return counts.astype(np.int64)
+
+def heightfield_voxels(heights: np.ndarray) -> np.ndarray:
+    """Воксельная сетка (z, y, x) по карте высот для экспорта, инструкций и анализа устойчивости."""
+    nz = max(int(heights.max()), 1) if heights.size else 1
+    return np.arange(nz)[:, None, None] < heights[None, :, :]
+
+def surface_color_labels(heights: np.ndarray, mesh: trimesh.Trimesh, transform: np.ndarray,
+                         palette: Sequence[str] = LEGO_COLORS) -> Optional[np.ndarray]:
+    """Метки цвета колонок (индексы палитры, -1 — пусто) по верхней ячейке; None, если у модели нет цветов."""
+    if not mesh_has_colors(mesh):
+        return None
+    labels = np.full(heights.shape, -1, dtype=np.int32)
+    y, x = np.nonzero(heights)
+    if y.size:
+        cell_colors = sample_cell_colors(np.stack([heights[y, x] - 1, y, x], axis=1), transform, mesh)
+        if cell_colors is None:
+            return None
+        labels[y, x] = quantize_to_palette(cell_colors, palette)
+    return labels
+
+@njit(cache=True)
+def _place_columns(heights: np.ndarray, labels: np.ndarray, dims: np.ndarray) -> np.ndarray:
+    """
+    Укладка по колонкам: за проход основание покрывается жадно по каталогу, и
+    каждый кирпич наращивается стопкой до минимальной высоты своих колонок.
+
+    Кирпич кладётся только на колонки с одинаковым уровнем заполнения и одной
+    цветовой меткой, поэтому он всегда опирается на стопки под ним. Проходы
+    повторяются, пока остаются незаполненные колонки.
+
+    Возвращает стопки (n, 8): x, y, z, w, h, d, число кирпичей, номер записи каталога.
+    """
+    ny, nx = heights.shape
+    base = np.zeros((ny, nx), dtype=np.int64)
+    covered = np.zeros((ny, nx), dtype=np.bool_)
+    stacks = np.empty((16, 8), dtype=np.int64)
+    n = 0
+    has_labels = labels.size > 0
+    progress = True
+    while progress:
+        progress = False
+        covered[:, :] = False
+        for y in range(ny):
+            for x in range(nx):
+                if covered[y, x] or heights[y, x] <= base[y, x]:
+                    continue
+                level = base[y, x]
+                for k in range(dims.shape[0]):
+                    w, h = dims[k, 0], dims[k, 1]
+                    if x + w > nx or y + h > ny:
+                        continue
+                    residual = heights[y, x] - level
+                    fits = True
+                    for ty in range(y, y + h):
+                        for tx in range(x, x + w):
+                            if (covered[ty, tx] or base[ty, tx] != level or heights[ty, tx] <= level or
+                                    (has_labels and labels[ty, tx] != labels[y, x])):
+                                fits = False
+                                break
+                            residual = min(residual, heights[ty, tx] - level)
+                        if not fits:
+                            break
+                    if not fits or residual < dims[k, 2]:
+                        continue
+                    # Стопка из записей с тем же основанием, от высоких к низким
+                    z = level
+                    for j in range(k, dims.shape[0]):
+                        if dims[j, 0] != w or dims[j, 1] != h or residual < dims[j, 2]:
+                            continue
+                        count = residual // dims[j, 2]
+                        if n == stacks.shape[0]:
+                            grown = np.empty((2 * n, 8), dtype=np.int64)
+                            grown[:n] = stacks
+                            stacks = grown
+                        stacks[n, 0] = x
+                        stacks[n, 1] = y
+                        stacks[n, 2] = z
+                        stacks[n, 3] = w
+                        stacks[n, 4] = h
+                        stacks[n, 5] = dims[j, 2]
+                        stacks[n, 6] = count
+                        stacks[n, 7] = j
+                        n += 1
+                        z += count * dims[j, 2]
+                        residual -= count * dims[j, 2]
+                    base[y:y + h, x:x + w] = z
+                    covered[y:y + h, x:x + w] = True
+                    progress = True
+                    break
+    return stacks[:n]
+
+def place_heightfield(heights: np.ndarray, allowed_sizes, use_colors: bool = True,
+                      rng: Optional[np.random.Generator] = None, label_image: Optional[np.ndarray] = None,
+                      palette: Sequence[str] = LEGO_COLORS) -> BrickSet:
+    """
+    Укладка рельефа только по карте высот: время зависит от площади основания, а не от объёма.
+
+    label_image — метки цвета колонок; кирпичи не пересекают их границы и
+    получают цвет своей метки, остальные — случайный цвет (или чёрный без цветов).
+    """
+    catalog = BrickCatalog.of(allowed_sizes)
+    heights = np.ascontiguousarray(heights, dtype=np.int64)
+    labels = np.zeros((0, 0), dtype=np.int32) if label_image is None else np.ascontiguousarray(label_image, dtype=np.int32)
+    stacks = _place_columns(heights, labels, catalog.dims)
+
+    # Стопки разворачиваются в кирпичи одним repeat
+    counts = stacks[:, 6]
+    owner = np.repeat(np.arange(len(stacks)), counts)
+    level = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    coords = stacks[owner][:, :6].copy()
+    coords[:, 2] += level * coords[:, 5]
+    type_codes = catalog.type_codes[stacks[owner, 7]]
+
+    rng = rng if rng is not None else np.random.default_rng()
+    if label_image is not None:
+        color_codes = labels[coords[:, 1], coords[:, 0]]
+        colors = palette
+    elif use_colors:
+        colors, color_codes = LEGO_COLORS, rng.integers(len(LEGO_COLORS), size=len(coords))
+    else:
+        colors, color_codes = ("#000000",), np.zeros(len(coords), dtype=np.int64)
+    placed_volume = int(np.sum(coords[:, 3] * coords[:, 4] * coords[:, 5]))
+    logging.info(f"Heightfield placement: {len(stacks)} stacks, {len(coords)} bricks, "
+                 f"{placed_volume}/{int(heights.sum())} voxels covered")
+    return BrickSet.from_arrays(coords, color_codes, type_codes, colors, catalog.types)
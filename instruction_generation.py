@@ -1,9 +1,10 @@
-from sklearn.cluster import DBSCAN
 import numpy as np
-from scipy.ndimage import label
+from scipy.ndimage import binary_dilation, convolve, find_objects, label, maximum_filter
 import logging
 from numba import njit
-from multiprocessing import Pool
+import concurrent.futures
+from multiprocessing import Manager, shared_memory
+from queue import Empty
 import os
 import io
 import shutil
@@ -12,10 +13,13 @@ import pyvista as pv
 from reportlab.lib.utils import ImageReader
 from reportlab.pdfgen import canvas
 from reportlab.lib.colors import HexColor
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 from src.config.config import (
     STUD_SIZE, PDF_PAGE_SIZE, TEMP_IMAGE_DIR, RENDER_LIGHT_POSITION, get_brick_height
 )
+from src.bom import bill_of_materials
+from src.sequencing import dependency_levels, sequence_bricks, support_dependencies
+from src.strategies.brick_set import BrickSet
 
 # --- Константы для PDF ---
 PDF_PAGE_SIZE = (842, 595)  # Альбомная ориентация (A4 горизонтально)
@@ -31,8 +35,13 @@ PDF_FULL_MODEL_X = 650  # Полная модель справа снизу
 PDF_FULL_MODEL_Y = 50
 PDF_FULL_MODEL_SIZE = 150
 MAX_BRICKS_PER_STEP = 50
+STEP_VIEW_MARGIN = 2  # Запас вокруг кирпичей шага при кадрировании картинки, в шипах
 
 # --- Генерация инструкций ---
+PROGRESS_POLL_INTERVAL = 0.1  # Период опроса очереди прогресса параллельной генерации, с
+DBSCAN_EPS = 1.5  # Радиус окрестности плотностной группировки, в вокселях
+DBSCAN_MIN_SAMPLES = 5  # Минимум вокселей в окрестности (включая сам воксель), чтобы воксель был ядром
+CLUSTER_DILATION_RADIUS = 1  # Группировка 'dilated': части модели ближе 2 * r вокселей сливаются в один шаг
 
 @njit
 def _generate_instructions_for_component_numba(occupied, cubes, shape):
@@ -52,7 +61,8 @@ def _generate_instructions_for_component_numba(occupied, cubes, shape):
             if overlap:
                 break
         if not overlap:
-            instructions[instruction_count] = [x, y, z, w, h, d, 0]
+            # Последняя колонка — индекс исходного кирпича: цвет и тип берутся по нему, без словаря по координатам
+            instructions[instruction_count] = [x, y, z, w, h, d, i]
             instruction_count += 1
             for dz in range(z, min(z + d, shape[0])):
                 for dy in range(y, min(y + h, shape[1])):
@@ -60,7 +70,41 @@ def _generate_instructions_for_component_numba(occupied, cubes, shape):
                         occupied[dz, dy, dx] = True
     return instructions[:instruction_count]
 
-def find_connected_components(voxel_array: np.ndarray, clustering_method: str = 'connected') -> tuple:
+def _ball(radius: float) -> np.ndarray:
+    """Смещения сетки в шаре радиуса radius (включая центр) как маска-окрестность."""
+    r = int(np.floor(radius))
+    offsets = np.mgrid[-r:r + 1, -r:r + 1, -r:r + 1]
+    return (offsets ** 2).sum(axis=0) <= radius ** 2
+
+def grid_density_clusters(voxel_array: np.ndarray, eps: float = DBSCAN_EPS,
+                          min_samples: int = DBSCAN_MIN_SAMPLES) -> Tuple[np.ndarray, int]:
+    """
+    DBSCAN прямо на сетке за O(вокселей) без sklearn.
+
+    Соседи вокселя — смещения в шаре eps, поэтому плотность считается одной свёрткой.
+    Ядра связываются в кластеры разметкой компонент с той же окрестностью, граничные
+    воксели получают метку соседнего ядра, шум — 0. Окрестность должна помещаться
+    в куб 3x3x3 (eps < 2), как у структуры scipy.ndimage.label.
+    """
+    if not 1 <= eps < 2:
+        raise ValueError(f"Grid density clustering supports 1 <= eps < 2, got {eps}")
+    ball = _ball(eps)
+    counts = convolve(voxel_array.astype(np.int32), ball.astype(np.int32), mode="constant")
+    core = voxel_array & (counts >= min_samples)
+    labeled_array, num_features = label(core, structure=ball)
+    border = voxel_array & ~core
+    labeled_array[border] = maximum_filter(labeled_array, footprint=ball, mode="constant")[border]
+    return labeled_array, num_features
+
+def dilated_components(voxel_array: np.ndarray, radius: int = CLUSTER_DILATION_RADIUS) -> Tuple[np.ndarray, int]:
+    """Связные компоненты после расширения на radius: близкие части модели попадают в одну группу."""
+    grown = binary_dilation(voxel_array, structure=_ball(radius)) if radius > 0 else voxel_array
+    labeled_array, num_features = label(grown)
+    labeled_array[~voxel_array] = 0
+    return labeled_array, num_features
+
+def find_connected_components(voxel_array: np.ndarray, clustering_method: str = 'connected',
+                              dilation_radius: int = CLUSTER_DILATION_RADIUS) -> tuple:
     if voxel_array.size == 0 or not np.any(voxel_array):
         logging.warning("Voxel array is empty")
         return np.zeros_like(voxel_array, dtype=int), 0
@@ -68,95 +112,178 @@ def find_connected_components(voxel_array: np.ndarray, clustering_method: str =
     if clustering_method == 'connected':
         labeled_array, num_features = label(voxel_array)
     elif clustering_method == 'dbscan':
+        labeled_array, num_features = grid_density_clusters(voxel_array)
+    elif clustering_method == 'dilated':
+        labeled_array, num_features = dilated_components(voxel_array, dilation_radius)
+    elif clustering_method == 'sklearn_dbscan':
+        # Эталон для сравнения: sklearn импортируется только здесь
+        from sklearn.cluster import DBSCAN
         coords = np.argwhere(voxel_array)
-        if len(coords) == 0:
-            logging.warning("No voxels for DBSCAN clustering")
-            return np.zeros_like(voxel_array, dtype=int), 0
-        clustering = DBSCAN(eps=1.5, min_samples=5).fit(coords)
-        labels = clustering.labels_
-        num_features = len(set(labels)) - (1 if -1 in labels else 0)
+        labels = DBSCAN(eps=DBSCAN_EPS, min_samples=DBSCAN_MIN_SAMPLES).fit(coords).labels_
+        num_features = int(labels.max()) + 1
         labeled_array = np.zeros_like(voxel_array, dtype=int)
-        for i, lbl in enumerate(labels):
-            if lbl != -1:
-                labeled_array[tuple(coords[i])] = lbl + 1
+        clustered = labels >= 0
+        labeled_array[tuple(coords[clustered].T)] = labels[clustered] + 1
     else:
         raise ValueError(f"Unsupported clustering method: {clustering_method}")
     
     logging.info(f"Found {num_features} components")
     return labeled_array, num_features
 
-def generate_instructions_for_component(component_voxels: np.ndarray, cubes: list, progress_callback=None) -> list:
+def component_build_order(cube_array: np.ndarray, start: Tuple[int, int, int] = (0, 0, 0),
+                          limit: Tuple[int, int, int] = None) -> np.ndarray:
+    """
+    Порядок сборки кирпичей одной компоненты (массив (n, 6)): индексы в cube_array.
+
+    Сетка занятости выделяется только на рамку кирпичей компоненты: от start (z, y, x) —
+    начала её среза find_objects, в котором лежат все опорные ячейки, — до концов
+    кирпичей с обрезкой по limit (форме всей сетки). Кирпичи идут в топологическом
+    порядке графа опор: сначала уровень зависимости, затем z.
+    """
+    local = cube_array.astype(np.int64)
+    local[:, :3] -= np.asarray(start[::-1], dtype=np.int64)
+    src, dst = support_dependencies(local)
+    order = np.lexsort((local[:, 2], dependency_levels(len(local), src, dst)))
+    local = local[order]
+    stop = (local[:, :3] + local[:, 3:]).max(axis=0)[::-1]
+    if limit is not None:
+        stop = np.minimum(stop, np.asarray(limit) - np.asarray(start))
+    occupied = np.zeros(tuple(int(v) for v in stop), dtype=np.bool_)
+    instructions_array = _generate_instructions_for_component_numba(occupied, local.astype(np.int32), occupied.shape)
+    return order[instructions_array[:, 6]]
+
+def generate_instructions_for_component(cubes: BrickSet, start: Tuple[int, int, int] = (0, 0, 0),
+                                        limit: Tuple[int, int, int] = None, progress_callback=None) -> BrickSet:
+    cubes = BrickSet.from_cubes(cubes)
     if not cubes:
-        return []
-    
-    cube_array = np.array([[cube[0], cube[1], cube[2], cube[3], cube[4], cube[5]] 
-                          for cube in sorted(cubes, key=lambda cube: cube[2])], dtype=np.int32)
-    occupied = np.zeros_like(component_voxels, dtype=np.bool_)
-    
-    instructions_array = _generate_instructions_for_component_numba(occupied, cube_array, component_voxels.shape)
-    
-    instructions = []
-    cube_dict = {(c[0], c[1], c[2]): (c[6], c[7]) for c in cubes}
-    total_cubes = len(instructions_array)
-    for i, instr in enumerate(instructions_array):
-        x, y, z, w, h, d, _ = instr
-        color, brick_type = cube_dict.get((x, y, z), ("gray", "brick"))
-        instructions.append((x, y, z, w, h, d, color, brick_type))
-        if progress_callback and total_cubes > 0:
-            progress_callback((i + 1) / total_cubes)
-    
+        return cubes
+    instructions = cubes[component_build_order(cubes.coords, start, limit)]
+    if progress_callback:
+        progress_callback(1.0)
     return instructions
 
-def process_component(args):
-    label, labeled_array, cubes_by_label, progress_callback = args
-    component_voxels = labeled_array == label
-    component_cubes = cubes_by_label.get(label, [])
-    
-    def component_progress(progress):
-        if callable(progress_callback):
-            progress_callback((label - 1 + progress) / len(cubes_by_label))
-    return generate_instructions_for_component(component_voxels, component_cubes, component_progress)
-
-def generate_instructions(voxel_array: np.ndarray, cubes: list, clustering_method: str = 'connected', 
-                         parallel: bool = False, progress_callback=None) -> list:
-    labeled_array, num_features = find_connected_components(voxel_array, clustering_method)
+def _process_component_chunk(args: Tuple[str, int, List[Tuple[int, int, Tuple[int, int, int]]], Tuple[int, int, int], object]
+                             ) -> List[np.ndarray]:
+    """Воркер: порядок сборки пачки компонент по общему массиву кирпичей; индексы — глобальные."""
+    shm_name, total, chunk, limit, progress_queue = args
+    # Подключаемся к общему массиву кирпичей: в задачу передаются только диапазоны компонент
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        cube_array = np.ndarray((total, 6), dtype=np.int64, buffer=shm.buf)
+        orders = [lo + component_build_order(cube_array[lo:hi], start, limit) for lo, hi, start in chunk]
+    finally:
+        shm.close()
+    progress_queue.put(len(chunk))
+    return orders
+
+def _component_orders_parallel(cube_array: np.ndarray, components: List[Tuple[int, int, Tuple[int, int, int]]],
+                               limit: Tuple[int, int, int], progress_callback=None,
+                               max_workers: int = None) -> List[np.ndarray]:
+    """
+    Порядок сборки компонент на пуле процессов.
+
+    Кирпичи, сгруппированные по компонентам, лежат в общей памяти; воркер получает
+    пачку диапазонов (начало, конец, начало рамки) и возвращает индексы. Прогресс
+    приходит через очередь по мере готовности пачек.
+    """
+    workers = max_workers or os.cpu_count() or 1
+    parts = np.array_split(np.arange(len(components)), min(len(components), 4 * workers))
+    chunks = [[components[i] for i in part] for part in parts]
+    shm = shared_memory.SharedMemory(create=True, size=max(1, cube_array.nbytes))
+    try:
+        np.ndarray(cube_array.shape, dtype=np.int64, buffer=shm.buf)[:] = cube_array
+        with Manager() as manager, concurrent.futures.ProcessPoolExecutor(max_workers=max_workers) as executor:
+            progress_queue = manager.Queue()
+            futures = [executor.submit(_process_component_chunk, (shm.name, len(cube_array), chunk, limit, progress_queue))
+                       for chunk in chunks]
+            done = 0
+            while done < len(components):
+                try:
+                    done += progress_queue.get(timeout=PROGRESS_POLL_INTERVAL)
+                except Empty:
+                    if any(future.done() and future.exception() is not None for future in futures):
+                        break  # Ошибка воркера поднимется из future.result() ниже
+                    continue
+                if callable(progress_callback):
+                    progress_callback(done / len(components))
+            return [order for future in futures for order in future.result()]
+    finally:
+        shm.close()
+        shm.unlink()
+
+def generate_instructions(voxel_array: np.ndarray, cubes: BrickSet, clustering_method: str = 'connected', 
+                         parallel: bool = False, progress_callback=None,
+                         dilation_radius: int = CLUSTER_DILATION_RADIUS) -> BrickSet:
+    labeled_array, num_features = find_connected_components(voxel_array, clustering_method, dilation_radius)
     if num_features == 0:
         logging.info("No components to generate instructions")
-        return []
+        return BrickSet.empty()
 
     logging.info(f"Generating instructions: method={clustering_method}, components={num_features}")
-    cubes_by_label = {label: [] for label in range(1, num_features + 1)}
-    for cube in cubes:
-        x, y, z = cube[0], cube[1], cube[2]
-        if 0 <= z < labeled_array.shape[0] and 0 <= y < labeled_array.shape[1] and 0 <= x < labeled_array.shape[2]:
-            label = labeled_array[z, y, x]
-            if label > 0:
-                cubes_by_label[label].append(cube)
-        else:
-            logging.warning(f"Cube {cube[:3]} outside voxel array")
+    cubes = BrickSet.from_cubes(cubes)
+    x, y, z = (cubes.data[axis].astype(np.int64) for axis in ("x", "y", "z"))
+    inside = ((z >= 0) & (z < labeled_array.shape[0]) & (y >= 0) & (y < labeled_array.shape[1]) &
+              (x >= 0) & (x < labeled_array.shape[2]))
+    if not np.all(inside):
+        logging.warning(f"{int(np.sum(~inside))} cubes outside voxel array")
+    brick_labels = np.zeros(len(cubes), dtype=np.int64)
+    brick_labels[inside] = labeled_array[z[inside], y[inside], x[inside]]
+    # Группировка одной сортировкой: кирпичи компоненты — непрерывный срез
+    order = np.argsort(brick_labels, kind="stable")
+    grouped = cubes[order]
+    bounds = np.searchsorted(brick_labels[order], np.arange(num_features + 2))
+    # Рамки компонент за один проход вместо полной маски labeled_array == label на каждую
+    components = [(int(bounds[label]), int(bounds[label + 1]), tuple(s.start for s in box))
+                  for label, box in enumerate(find_objects(labeled_array, num_features), start=1)
+                  if box is not None and bounds[label + 1] > bounds[label]]
 
     instructions = []
-    if parallel and num_features > 4:
-        with Pool() as pool:
-            def total_progress(progress):
-                if callable(progress_callback):
-                    progress_callback(progress)
-            results = pool.map(process_component, [(label, labeled_array, cubes_by_label, total_progress) 
-                                                  for label in range(1, num_features + 1)])
-        instructions = [cube for sublist in results for cube in sublist]
+    if parallel and len(components) > 4:
+        orders = _component_orders_parallel(grouped.coords, components, labeled_array.shape, progress_callback)
+        instructions = [grouped[component_order] for component_order in orders]
     else:
-        total_components = num_features
-        for i, label in enumerate(range(1, num_features + 1)):
-            component_voxels = labeled_array == label
-            component_cubes = cubes_by_label.get(label, [])
+        total_components = len(components)
+        for i, (lo, hi, start) in enumerate(components):
             def component_progress(progress):
                 if callable(progress_callback) and total_components > 0:
                     progress_callback((i + progress) / total_components)
-            instructions.extend(generate_instructions_for_component(component_voxels, component_cubes, component_progress))
+            instructions.append(generate_instructions_for_component(grouped[lo:hi], start, labeled_array.shape,
+                                                                    component_progress))
+    instructions = BrickSet.concatenate(instructions)
     logging.debug(f"Instruction details: cubes={len(cubes)}, clustering={clustering_method}")
     logging.info(f"Instructions generated: {len(instructions)} steps")
     return instructions
 
+def _origin_keys(cubes: BrickSet) -> np.ndarray:
+    """Ключ кирпича по опорной ячейке: кирпичи не пересекаются, поэтому ячейка однозначно задаёт кирпич."""
+    x, y, z = (cubes.data[axis].astype(np.int64) + 2 ** 15 for axis in ("x", "y", "z"))
+    return (z << 32) | (y << 16) | x
+
+def update_instructions(instructions: BrickSet, removed: BrickSet, added: BrickSet) -> BrickSet:
+    """
+    Обновляет порядок сборки после локальной правки без пересчёта компонент.
+
+    Снятые кирпичи удаляются из последовательности; новый кирпич вставляется сразу
+    после последнего оставшегося кирпича ниже него. Всё, что опирается на новые
+    кирпичи, тоже переложено заново, поэтому порядок «снизу вверх» сохраняется.
+    """
+    instructions = BrickSet.from_cubes(instructions)
+    kept = instructions[~np.isin(_origin_keys(instructions), _origin_keys(BrickSet.from_cubes(removed)))]
+    added = BrickSet.from_cubes(added)
+    added = added[np.argsort(added.data["z"], kind="stable")]
+    merged = BrickSet.concatenate([kept, added])
+    kept_data, added_data = merged.data[:len(kept)], merged.data[len(kept):]
+    # Для каждого z — последний индекс в последовательности среди кирпичей с меньшим z
+    positions = np.zeros(len(added_data), dtype=np.int64)
+    if len(kept_data):
+        order = np.argsort(kept_data["z"], kind="stable")
+        last_below = np.maximum.accumulate(order)
+        below = np.searchsorted(kept_data["z"][order], added_data["z"], side="left")
+        positions = np.where(below > 0, last_below[np.maximum(below - 1, 0)] + 1, 0)
+    data = np.insert(kept_data, positions, added_data)
+    logging.info(f"Instructions updated: {len(instructions) - len(kept)} steps removed, {len(added)} inserted")
+    return BrickSet(data, merged.colors, merged.types)
+
 # --- Генерация PDF ---
 
 def create_plotter(window_size: tuple, off_screen: bool = True) -> pv.Plotter:
@@ -170,6 +297,7 @@ def render_step(cubes: list, current_step_index: int, output_path: str) -> None:
     try:
         plotter = create_plotter(window_size=(800, 500))
         total_cubes = len(cubes)
+        step_bounds = []
         for i, cube in enumerate(cubes):  # Рендерим все кубики до конца шага
             x, y, z, w, h, d, color, brick_type = cube
             brick_height = get_brick_height(brick_type)
@@ -188,9 +316,18 @@ def render_step(cubes: list, current_step_index: int, output_path: str) -> None:
                 r, g, b = [int(c * 255) for c in color[:3]] if isinstance(color, (tuple, list)) else (128, 128, 128)
                 adjusted_color = f"#{r:02x}{g:02x}{b:02x}" if is_new else f"#{r:02x}{g:02x}{b:02x}80"
             plotter.add_mesh(box, color=adjusted_color, opacity=opacity, show_edges=True)
+            if is_new:
+                step_bounds.append(bounds)
         
         plotter.camera.zoom(1.5)
-        plotter.reset_camera()
+        if step_bounds:
+            # Кадр по рамке кирпичей шага: шаги компактны, картинка крупнее и рендерится быстрее
+            step_bounds = np.array(step_bounds, dtype=float)
+            margin = STEP_VIEW_MARGIN * STUD_SIZE
+            lo, hi = step_bounds[:, 0::2].min(axis=0) - margin, step_bounds[:, 1::2].max(axis=0) + margin
+            plotter.reset_camera(bounds=[lo[0], hi[0], lo[1], hi[1], lo[2], hi[2]])
+        else:
+            plotter.reset_camera()
         plotter.screenshot(output_path)
         plotter.close()
         if os.path.exists(output_path):
@@ -223,18 +360,11 @@ def render_full_model(cubes: list, output_buffer: io.BytesIO) -> None:
     except Exception as e:
         logging.error(f"Ошибка рендеринга полной модели: {e}")
 
-def get_layer_steps(cubes: list, max_bricks_per_step: int = MAX_BRICKS_PER_STEP) -> List[List[Tuple]]:
-    layers = {}
-    for cube in cubes:
-        z = cube[2]
-        layers.setdefault(z, []).append(cube)
-    
-    steps = []
-    for z in sorted(layers.keys()):
-        layer_cubes = layers[z]
-        for i in range(0, len(layer_cubes), max_bricks_per_step):
-            steps.append(layer_cubes[i:i + max_bricks_per_step])
-    return steps
+def get_layer_steps(cubes: BrickSet, max_bricks_per_step: int = MAX_BRICKS_PER_STEP) -> List[BrickSet]:
+    """Шаги сборки по уровням графа опор; шаги — срезы одного упорядоченного набора."""
+    ordered, ends = sequence_bricks(cubes, max_bricks_per_step)
+    starts = np.append(0, ends[:-1])
+    return [ordered[start:end] for start, end in zip(starts.tolist(), ends.tolist())]
 
 def generate_brick_icon(w: int, h: int, d: int, color: str, brick_type: str, output_path: str) -> None:
     plotter = create_plotter(window_size=(50, 50))
@@ -248,8 +378,7 @@ def generate_brick_icon(w: int, h: int, d: int, color: str, brick_type: str, out
     plotter.screenshot(output_path)
     plotter.close()
 
-def add_parts_list_page(pdf: canvas.Canvas, cubes: List[Tuple[float, float, float, int, int, int, str, str]], 
-                       color_names: dict) -> None:
+def add_parts_list_page(pdf: canvas.Canvas, bom: Dict[Tuple[int, int, int, str, str], int], color_names: dict) -> None:
     pdf.setFillColor(HexColor("#FFFFFF"))  # Белый фон
     pdf.rect(0, 0, PDF_PAGE_SIZE[0], PDF_PAGE_SIZE[1], fill=1)
     
@@ -258,13 +387,6 @@ def add_parts_list_page(pdf: canvas.Canvas, cubes: List[Tuple[float, float, floa
     pdf.setFont("Helvetica-Bold", PDF_HEADER_FONT_SIZE + 4)
     pdf.drawCentredString(PDF_PAGE_SIZE[0] / 2, PDF_HEADER_Y, "Parts List")
 
-    # Подсчет уникальных кубиков
-    brick_counts = {}
-    for cube in cubes:
-        x, y, z, w, h, d, color, brick_type = cube
-        key = (w, h, d, color, brick_type)
-        brick_counts[key] = brick_counts.get(key, 0) + 1
-
     # Рамка для списка
     list_x, list_y, list_width, list_height = 50, 50, 700, 450
     pdf.setFillColor(HexColor("#FFFFFF"))
@@ -272,7 +394,7 @@ def add_parts_list_page(pdf: canvas.Canvas, cubes: List[Tuple[float, float, floa
     pdf.roundRect(list_x, list_y, list_width, list_height, 10, stroke=1, fill=1)  # Закругленные углы
 
     # Динамическое масштабирование для одной страницы
-    num_items = len(brick_counts)
+    num_items = len(bom)
     max_cols = 4  # До 4 столбцов
     item_height = min(40, list_height // ((num_items // max_cols) + 1))
     item_width = list_width // max_cols
@@ -284,7 +406,7 @@ def add_parts_list_page(pdf: canvas.Canvas, cubes: List[Tuple[float, float, floa
     pdf.setFont("Helvetica", max(8, min(PDF_DESC_FONT_SIZE, item_height - 10)))  # Минимум 8pt
     pdf.setFillColorRGB(0, 0, 0)  # Черный текст
 
-    for (w, h, d, color, brick_type), count in brick_counts.items():
+    for (w, h, d, color, brick_type), count in bom.items():
         brick_icon_path = os.path.join(TEMP_IMAGE_DIR, f"brick_{w}_{h}_{d}_{color}_{brick_type}.png")
         generate_brick_icon(w, h, d, color, brick_type, brick_icon_path)
         
@@ -307,13 +429,17 @@ def add_parts_list_page(pdf: canvas.Canvas, cubes: List[Tuple[float, float, floa
 steps = []  # Глобальная переменная для доступа в render_step
 
 def generate_pdf_instructions(cubes: List[Tuple[float, float, float, int, int, int, str, str]], 
-                             output_file: str, progress_callback=None) -> None:
+                             output_file: str, progress_callback=None, invariant: bool = False,
+                             bom: Optional[Dict[Tuple[int, int, int, str, str], int]] = None) -> None:
     if not cubes:
         logging.warning("No cubes for PDF generation")
         return
 
     global steps
     steps = get_layer_steps(cubes)
+    # Шаги — подряд идущие срезы порядка сборки: склейка восстанавливает порядок, концы шагов — накопленные длины
+    ordered = BrickSet.concatenate(steps)
+    ends = np.cumsum([len(step) for step in steps])
     total_steps = len(steps)
     logging.info(f"Generating PDF: {len(cubes)} cubes, {len(steps)} steps, path={output_file}")
 
@@ -335,12 +461,12 @@ def generate_pdf_instructions(cubes: List[Tuple[float, float, float, int, int, i
     render_full_model(cubes, full_model_buffer)
 
     try:
-        pdf = canvas.Canvas(output_file, pagesize=PDF_PAGE_SIZE)
-        add_parts_list_page(pdf, cubes, color_names)
+        # invariant — без даты создания и случайного идентификатора: одинаковый вход даёт побайтно одинаковый PDF
+        pdf = canvas.Canvas(output_file, pagesize=PDF_PAGE_SIZE, invariant=int(invariant))
+        add_parts_list_page(pdf, bom if bom is not None else bill_of_materials(cubes), color_names)
 
         for step_index, current_layer in enumerate(steps):
-            step_cubes = [cube for sublist in steps[:step_index + 1] for cube in sublist]
-            z_level = current_layer[0][2]
+            step_cubes = ordered[:ends[step_index]]  # Состояние модели после шага — префикс порядка сборки
 
             # Фон
             pdf.setFillColor(HexColor("#FFFFFF"))  # Белый фон
@@ -369,11 +495,7 @@ def generate_pdf_instructions(cubes: List[Tuple[float, float, float, int, int, i
                 logging.error(f"Step {step_index + 1} image not found at {temp_step_path}")
 
             # Список кубиков слева снизу в рамочке
-            brick_counts = {}
-            for cube in current_layer:
-                x, y, z, w, h, d, color, brick_type = cube
-                key = (w, h, d, color, brick_type)
-                brick_counts[key] = brick_counts.get(key, 0) + 1
+            brick_counts = bill_of_materials(current_layer)
 
             # Рамка для списка
             list_x, list_y, list_width, list_height = 20, PDF_DESC_Y, 350, 450
@@ -1,22 +1,39 @@
 import os
+import time
 import logging
 import numpy as np
 import trimesh
 from src.voxelization import adaptive_voxelization, voxel_grid_to_numpy
-from src.brick_optimization import BrickPlacer, GreedyPlacementStrategy, SimulatedAnnealingPlacementStrategy, BranchAndBoundPlacementStrategy
+from src.brick_optimization import BrickPlacer, merge_adjacent_bricks, GreedyPlacementStrategy, SimulatedAnnealingPlacementStrategy, BranchAndBoundPlacementStrategy, BeamSearchPlacementStrategy
+from src.strategies.catalog import BrickCatalog
+from src.strategies.utils import KernelCounters
 from src.instruction_generation import generate_instructions, generate_pdf_instructions
+from src.bom import bill_of_materials, export_bom_bricklink_xml, export_bom_csv
 from src.export import export_unique_bricks_stl, export_voxelized_stl
-from src.config.config import SUPPORTED_EXTENSIONS
+from src.stability import analyze_stability, export_stability_report
+from src.validation import export_validation_report, validate_placement
+from src.coloring import color_bricks, color_bricks_from_labels, voxel_color_labels
+from src.heightfield import (height_image, heightfield_voxels, mesh_heightfield, place_heightfield,
+                             surface_color_labels)
+from src.config.config import BRICK_SIZES, SUPPORTED_EXTENSIONS
 
 def process_model(model_path, scale_factor, max_depth, voxel_size, curvature_based, 
                  use_colors, method, allowed_sizes, output_dir, signals, 
                  clustering_method="connected", fill_hollow=True, minimal_support=False,
                  allow_top_layer=False, parallel_processing=False, render_steps=True,
-                 do_generate_instructions=True, step_image_size=300):
+                 do_generate_instructions=True, step_image_size=300, parallel_placement=None,
+                 beam_width=4, sa_chains=1, color_regions=True, seed=None, time_limit=None,
+                 heightfield=False, symmetry=False, profile_kernels=False):
     if signals._stopped:
         logging.debug("Process stopped before start")
         return
+    # Счётчики ядер укладки создаются на запуск и передаются укладке явно
+    counters = KernelCounters(BrickCatalog.of(allowed_sizes or BRICK_SIZES).sizes) if profile_kernels else None
     try:
+        # Один сид на запуск; стратегия получает свой поток и раздаёт дочерние воркерам
+        run_seed = np.random.SeedSequence(seed)
+        placement_seed, = run_seed.spawn(1)
+        logging.info(f"Run seed: {run_seed.entropy}")
         signals.status.emit("Loading model")
         logging.info(f"Loading model from {model_path}")
         mesh = load_model(model_path)
@@ -42,16 +59,33 @@ def process_model(model_path, scale_factor, max_depth, voxel_size, curvature_bas
             logging.debug("Stopped after filling cavities")
             return
 
-        signals.status.emit("Voxelizing with adaptive LEGO size")
-        logging.info("Voxelizing model")
-        voxel_grid = adaptive_voxelization(
-            mesh, max_depth=max_depth, voxel_size=voxel_size, curvature_based=curvature_based
-        )
-        voxel_array = voxel_grid_to_numpy(voxel_grid)
-        voxel_array = np.transpose(voxel_array, (2, 1, 0))  # z, y, x
-        real_size = (voxel_array.shape[0] * voxel_grid.pitch, 
-                     voxel_array.shape[1] * voxel_grid.pitch, 
-                     voxel_array.shape[2] * voxel_grid.pitch)
+        # Режим рельефа включается явно: модели 2.5D вокселизуются и укладываются по карте высот,
+        # без 3D-сетки и послойной укладки (стратегия, параллельные режимы и симметрия не используются)
+        field = mesh_heightfield(mesh, voxel_size) if heightfield else None
+        if field is not None:
+            signals.status.emit("Voxelizing heightfield by columns")
+            heights, transform = field
+            voxel_array = heightfield_voxels(heights)
+            pitch = voxel_size
+        else:
+            signals.status.emit("Voxelizing with adaptive LEGO size")
+            logging.info("Voxelizing model")
+            voxel_grid = adaptive_voxelization(
+                mesh, max_depth=max_depth, voxel_size=voxel_size, curvature_based=curvature_based
+            )
+            voxel_array = voxel_grid_to_numpy(voxel_grid)
+            voxel_array = np.transpose(voxel_array, (2, 1, 0))  # z, y, x
+            transform, pitch = voxel_grid.transform, voxel_grid.pitch
+            heights = None
+            if heightfield:
+                # Проверяется исходная сетка: после заполнения полостей любая колонка сплошная до пола
+                heights = height_image(voxel_array)
+                if heights is not None:
+                    voxel_array = heightfield_voxels(heights)
+                    logging.info("Voxel grid is a heightfield, using column placement")
+        real_size = (voxel_array.shape[0] * pitch, 
+                     voxel_array.shape[1] * pitch, 
+                     voxel_array.shape[2] * pitch)
         logging.info(f"Voxel grid real size (mm): {real_size}")
         signals.progress.emit(30)
         if signals._stopped:
@@ -59,32 +93,65 @@ def process_model(model_path, scale_factor, max_depth, voxel_size, curvature_bas
             return
 
         signals.status.emit(f"Placing bricks (method={method})")
-        logging.info(f"Placing bricks: method={method}")
+        logging.info(f"Placing bricks: method={method}, parallel={parallel_placement}")
         if method == "greedy":
-            strategy = GreedyPlacementStrategy()
+            strategy = GreedyPlacementStrategy(seed=placement_seed)
         elif method == "simulated_annealing":
-            strategy = SimulatedAnnealingPlacementStrategy()
+            strategy = SimulatedAnnealingPlacementStrategy(num_chains=sa_chains, seed=placement_seed)
         elif method == "branch_and_bound":
-            strategy = BranchAndBoundPlacementStrategy()
+            strategy = BranchAndBoundPlacementStrategy(seed=placement_seed)
+        elif method == "beam_search":
+            strategy = BeamSearchPlacementStrategy(beam_width=beam_width, seed=placement_seed)
         else:
             raise ValueError(f"Unknown placement method: {method}")
 
         placer = BrickPlacer(strategy)
+        # Ограничение по времени отсчитывается от начала укладки
+        deadline = time.time() + time_limit if time_limit else None
+        # Цветовые метки вокселей: кирпичи укладываются внутри одноцветных областей
+        color_labels = None
+        if use_colors and color_regions and heights is None:
+            color_labels = voxel_color_labels(voxel_array, mesh, transform)
         def brick_progress(progress):
             if signals._stopped:
                 logging.debug("Brick placement stopped")
                 return True
             signals.progress.emit(int(30 + 30 * progress))
             return False
-        cubes = placer.place_bricks(
+        if heights is not None:
+            # Метки по верхней ячейке колонки: кирпич рельефа получает цвет своей области сразу при укладке
+            label_image = surface_color_labels(heights, mesh, transform) if use_colors and color_regions else None
+            cubes = place_heightfield(heights, allowed_sizes or BRICK_SIZES, use_colors, strategy.rng, label_image)
+            colored = label_image is not None
+        else:
+            cubes = placer.place_bricks(
                 voxel_array, 
                 use_colors=use_colors, 
                 allowed_sizes=allowed_sizes, 
                 fill_hollow=fill_hollow, 
                 minimal_support=minimal_support, 
-                progress_callback=brick_progress
+                progress_callback=brick_progress,
+                allow_top_layer=allow_top_layer,
+                parallel_mode=parallel_placement,
+                color_labels=color_labels,
+                deadline=deadline,
+                symmetry=symmetry,
+                merge=False,
+                counters=counters
             )
+            colored = False
+        if color_labels is not None:
+            cubes = color_bricks_from_labels(cubes, placer.color_labels)
+        elif use_colors and not colored:
+            # Цвета модели (вершины или текстура) заменяют случайные; без цветов в модели всё остаётся как есть
+            cubes = color_bricks(cubes, voxel_array.shape, mesh, transform)
+        if heights is None:
+            # Слияние — после раскраски: до неё цвета стратегий случайные и соседи почти не совпадают
+            cubes = merge_adjacent_bricks(cubes, voxel_array.shape, allowed_sizes or BRICK_SIZES)
         logging.info(f"Brick placement completed: method={method}, cubes={len(cubes)}, colors used={use_colors}")
+        # Проверка против сетки, которую покрывала укладка (после заполнения полостей)
+        validation = validate_placement(cubes, placer.voxel_array if placer.voxel_array is not None else voxel_array,
+                                        allow_top_layer)
         signals.progress.emit(60)
         if signals._stopped:
             logging.debug("Stopped after brick placement")
@@ -93,13 +160,18 @@ def process_model(model_path, scale_factor, max_depth, voxel_size, curvature_bas
         if do_generate_instructions:
                 signals.status.emit(f"Generating instructions (method={clustering_method})")
                 logging.info("Generating instructions")
-                instructions = generate_instructions(voxel_array, cubes, clustering_method, parallel_processing)
+                instructions = generate_instructions(voxel_array, cubes, clustering_method, parallel_processing,
+                                                     progress_callback=lambda progress: signals.progress.emit(int(60 + 25 * progress)))
                 signals.progress.emit(85)
         else:
                 instructions = []
                 signals.progress.emit(85)
 
         os.makedirs(output_dir, exist_ok=True)
+        # Список деталей — до медленных STL и PDF, чтобы заказ не ждал рендеринга
+        bom = bill_of_materials(cubes)
+        export_bom_csv(bom, os.path.join(output_dir, "parts_list.csv"))
+        export_bom_bricklink_xml(bom, os.path.join(output_dir, "bricklink_wanted_list.xml"))
         signals.status.emit("Exporting STL")
         stl_path = os.path.join(output_dir, "model.stl")
         export_voxelized_stl(voxel_array, stl_path)
@@ -110,6 +182,9 @@ def process_model(model_path, scale_factor, max_depth, voxel_size, curvature_bas
             return
 
         export_unique_bricks_stl(cubes, output_dir)
+        export_stability_report(analyze_stability(cubes, voxel_array.shape),
+                                os.path.join(output_dir, "stability_report.json"))
+        export_validation_report(validation, os.path.join(output_dir, "validation_report.json"))
         signals.progress.emit(92)
         if signals._stopped:
             logging.debug("Stopped after unique bricks export")
@@ -125,7 +200,8 @@ def process_model(model_path, scale_factor, max_depth, voxel_size, curvature_bas
                         return True
                     signals.progress.emit(int(92 + 5 * progress))
                     return False
-                generate_pdf_instructions(cubes, pdf_path, progress_callback=pdf_progress)
+                generate_pdf_instructions(cubes, pdf_path, progress_callback=pdf_progress, invariant=seed is not None,
+                                          bom=bom)
                 logging.info(f"PDF exported: {pdf_path}")
                 signals.progress.emit(95)
         else:
@@ -137,6 +213,8 @@ def process_model(model_path, scale_factor, max_depth, voxel_size, curvature_bas
 
         signals.status.emit("Finalizing PDF")
         signals.progress.emit(100)
+        if counters is not None:
+            counters.log()
         signals.finished.emit(cubes, instructions, pdf_path)
 
     except Exception as e:
@@ -3,5 +3,5 @@ from PyQt5.QtCore import QObject, pyqtSignal
 class WorkerSignals(QObject):
     progress = pyqtSignal(int)
     status = pyqtSignal(str)
-    finished = pyqtSignal(list, list, str)  # Добавлен путь к PDF
+    finished = pyqtSignal(object, object, str)  # BrickSet кирпичей, BrickSet инструкций, путь к PDF
     error = pyqtSignal(str)
\ No newline at end of file
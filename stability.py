@@ -0,0 +1,168 @@
+# stability.py
+import json
+import logging
+import numpy as np
+from numba import njit
+from typing import Dict, List, Tuple
+from src.strategies.utils import cubes_to_array, rasterize_bricks
+
+@njit(cache=True)
+def _find(parent: np.ndarray, node: int) -> int:
+    while parent[node] != node:
+        parent[node] = parent[parent[node]]
+        node = parent[node]
+    return node
+
+@njit(cache=True)
+def union_find_components(n: int, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+    """Корень компоненты для каждой вершины (union-find со сжатием путей)."""
+    parent = np.arange(n)
+    for i in range(src.size):
+        a, b = _find(parent, src[i]), _find(parent, dst[i])
+        if a != b:
+            if a < b:
+                parent[b] = a
+            else:
+                parent[a] = b
+    for node in range(n):
+        parent[node] = _find(parent, node)
+    return parent
+
+@njit(cache=True)
+def articulation_points(n: int, indptr: np.ndarray, indices: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Итеративный алгоритм Тарьяна по графу в формате CSR.
+
+    Возвращает маску точек сочленения и рёбра-мосты (родитель, потомок).
+    """
+    disc = np.full(n, -1, dtype=np.int64)
+    low = np.zeros(n, dtype=np.int64)
+    parent = np.full(n, -1, dtype=np.int64)
+    cursor = indptr[:-1].copy()
+    stack = np.empty(n, dtype=np.int64)
+    is_articulation = np.zeros(n, dtype=np.bool_)
+    bridge_src = np.empty(n, dtype=np.int64)
+    bridge_dst = np.empty(n, dtype=np.int64)
+    bridges = 0
+    time = 0
+    for root in range(n):
+        if disc[root] >= 0:
+            continue
+        disc[root] = low[root] = time
+        time += 1
+        top = 0
+        stack[0] = root
+        root_children = 0
+        while top >= 0:
+            u = stack[top]
+            if cursor[u] < indptr[u + 1]:
+                v = indices[cursor[u]]
+                cursor[u] += 1
+                if disc[v] < 0:
+                    parent[v] = u
+                    disc[v] = low[v] = time
+                    time += 1
+                    top += 1
+                    stack[top] = v
+                    if u == root:
+                        root_children += 1
+                elif v != parent[u]:
+                    low[u] = min(low[u], disc[v])
+            else:
+                top -= 1
+                p = parent[u]
+                if p >= 0:
+                    low[p] = min(low[p], low[u])
+                    if p != root and low[u] >= disc[p]:
+                        is_articulation[p] = True
+                    if low[u] > disc[p]:
+                        bridge_src[bridges] = p
+                        bridge_dst[bridges] = u
+                        bridges += 1
+        if root_children > 1:
+            is_articulation[root] = True
+    return is_articulation, bridge_src[:bridges], bridge_dst[:bridges]
+
+def stud_links(brick_ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Связи между кирпичами через шипы: пары (нижний, верхний) кирпич и число общих шипов.
+
+    Соседние по z ячейки с разными идентификаторами дают один шип; пары
+    сворачиваются одним np.unique по закодированному ключу.
+    """
+    n = int(brick_ids.max()) + 1 if brick_ids.size else 0
+    lower, upper = brick_ids[:-1], brick_ids[1:]
+    mask = (lower >= 0) & (upper >= 0) & (lower != upper)
+    keys = lower[mask].astype(np.int64) * max(n, 1) + upper[mask]
+    keys, counts = np.unique(keys, return_counts=True)
+    return keys // max(n, 1), keys % max(n, 1), counts
+
+def _csr(n: int, src: np.ndarray, dst: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Неориентированный граф в формате CSR."""
+    heads = np.concatenate([src, dst])
+    tails = np.concatenate([dst, src])
+    order = np.argsort(heads, kind="stable")
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(heads, minlength=n), out=indptr[1:])
+    return indptr, tails[order].astype(np.int64)
+
+def is_connected(cubes: List[Tuple], shape: Tuple[int, int, int]) -> bool:
+    """Быстрая проверка для стратегий: все кирпичи связаны шипами в одну конструкцию."""
+    if len(cubes) == 0:
+        return True
+    src, dst, _ = stud_links(rasterize_bricks(cubes, shape))
+    roots = union_find_components(len(cubes), src, dst)
+    return bool(np.all(roots == roots[0]))
+
+def analyze_stability(cubes: List[Tuple], shape: Tuple[int, int, int]) -> Dict:
+    """
+    Граф устойчивости модели: кирпичи — вершины, связи через шипы между слоями — рёбра.
+
+    Отчёт содержит компоненты связности, кирпичи без связи с землёй (z == 0),
+    точки сочленения (снятие кирпича отделяет часть модели от земли), мосты
+    и связи всего через один шип. Земля — отдельная вершина, соединённая со
+    всеми кирпичами нижнего слоя.
+    """
+    n = len(cubes)
+    if n == 0:
+        return {"bricks": 0, "links": 0, "components": 0, "floating_bricks": [],
+                "articulation_bricks": [], "bridges": [], "single_stud_links": []}
+    brick_ids = rasterize_bricks(cubes, shape)
+    src, dst, counts = stud_links(brick_ids)
+
+    roots = union_find_components(n, src, dst)
+    _, component = np.unique(roots, return_inverse=True)
+    on_ground = cubes_to_array(cubes)[:, 2] == 0
+    grounded_components = np.unique(component[on_ground])
+    floating = np.flatnonzero(~np.isin(component, grounded_components))
+
+    ground = n
+    grounded = np.flatnonzero(on_ground)
+    graph_src = np.concatenate([src, np.full(grounded.size, ground, dtype=np.int64)])
+    graph_dst = np.concatenate([dst, grounded])
+    indptr, indices = _csr(n + 1, graph_src, graph_dst)
+    is_articulation, bridge_src, bridge_dst = articulation_points(n + 1, indptr, indices)
+    articulation = np.flatnonzero(is_articulation[:n])
+    # Мосты к вершине земли — это кирпичи на земле, держащиеся только за неё; в отчёт идут только связи кирпичей
+    brick_bridge = (bridge_src != ground) & (bridge_dst != ground)
+    bridges = np.sort(np.stack([bridge_src[brick_bridge], bridge_dst[brick_bridge]], axis=1), axis=1)
+    single = counts == 1
+
+    report = {
+        "bricks": n,
+        "links": int(src.size),
+        "components": int(component.max()) + 1,
+        "floating_bricks": floating.tolist(),
+        "articulation_bricks": articulation.tolist(),
+        "bridges": bridges.tolist(),
+        "single_stud_links": np.stack([src[single], dst[single]], axis=1).tolist(),
+    }
+    logging.info(f"Stability: {n} bricks, {report['links']} links, {report['components']} components, "
+                 f"{len(report['floating_bricks'])} floating, {len(report['articulation_bricks'])} articulation, "
+                 f"{len(report['single_stud_links'])} single-stud links")
+    return report
+
+def export_stability_report(report: Dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Stability report exported to {path}")
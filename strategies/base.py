@@ -1,6 +1,64 @@
 from abc import ABC, abstractmethod
+import time
+import numpy as np
+from typing import Optional, Sequence
+from src.config.config import LEGO_COLORS
+from src.strategies.brick_set import BrickSet
+
+def deadline_reached(deadline: Optional[float]) -> bool:
+    """deadline — абсолютное время time.time(), общее для всех процессов; None — без ограничения."""
+    return deadline is not None and time.time() >= deadline
 
 class PlacementStrategy(ABC):
+    def __init__(self, seed=None):
+        self.reseed(seed)
+
+    def reseed(self, seed=None):
+        """
+        Задаёт поток случайных чисел стратегии.
+
+        seed — число, np.random.SeedSequence или None (случайная энтропия). Дочерние
+        потоки для воркеров берутся через spawn_seeds, поэтому результат не зависит
+        от того, какой процесс выполнил задачу.
+        """
+        self.seed_sequence = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.rng = np.random.default_rng(self.seed_sequence)
+
+    def spawn_seeds(self, count: int):
+        return self.seed_sequence.spawn(count)
+
+    def params(self) -> dict:
+        """Параметры конструктора (без seed): по ним воркер собирает стратегию с той же настройкой."""
+        return {}
+
+    def finalize_bricks(self, bricks, use_colors: bool, brick_type: Optional[str] = None,
+                        types: Optional[Sequence[str]] = None) -> BrickSet:
+        """
+        Собирает результат стратегии в BrickSet и раздаёт случайные цвета.
+
+        bricks — список (x, y, z, w, h, d, t) или массив (n, 7) с кодами типов в таблицу types.
+        """
+        if isinstance(bricks, np.ndarray):
+            coords, type_codes = bricks[:, :6], bricks[:, 6]
+        else:
+            coords = np.array([brick[:6] for brick in bricks], dtype=np.int64).reshape(-1, 6)
+            types, type_codes = np.unique([str(brick[6]) for brick in bricks], return_inverse=True)
+            types = types.tolist()
+        if brick_type is not None:
+            types, type_codes = (brick_type,), np.zeros(len(coords), dtype=np.int64)
+        if use_colors:
+            colors, color_codes = LEGO_COLORS, self.rng.integers(len(LEGO_COLORS), size=len(coords))
+        else:
+            colors, color_codes = ("#000000",), np.zeros(len(coords), dtype=np.int64)
+        return BrickSet.from_arrays(coords, color_codes, type_codes, colors, types)
+
     @abstractmethod
-    def place_bricks(self, voxel_array, use_colors, allowed_sizes, allow_top_layer=False, progress_callback=None, brick_type=None):
-        pass
\ No newline at end of file
+    def place_bricks(self, voxel_array, use_colors, allowed_sizes, allow_top_layer=False, progress_callback=None, brick_type=None,
+                     color_labels=None, deadline=None, counters=None):
+        """
+        color_labels — необязательная сетка цветовых меток (-1 — пусто); кирпич не пересекает границы меток.
+        deadline — момент time.time(), к которому стратегия возвращает лучшее найденное решение;
+        жадная укладка всегда достраивается, поэтому результат не хуже жадного.
+        counters — необязательные KernelCounters запуска: в них учитываются все проверки кирпичей.
+        """
+        pass
@@ -1,130 +1,213 @@
 # src/strategies/branch_and_bound_placement.py
 import numpy as np
 import logging
-from typing import List, Tuple
-from heapq import heappush, heappop
+from typing import List, Optional, Tuple
+from heapq import heappush, heappop, heapify, nsmallest
+from itertools import count
 from numba import njit
-from src.config.config import BRICK_PROPERTIES, LEGO_COLORS
-from src.strategies.base import PlacementStrategy
-from src.strategies.utils import can_place_brick, find_next_voxel, place_brick
+from src.config.config import BRICK_PROPERTIES
+from src.strategies.base import PlacementStrategy, deadline_reached
+from src.strategies.brick_set import BrickSet
+from src.strategies.catalog import BrickCatalog
+from src.strategies.utils import as_label_grid, can_place_brick, counter_array, place_brick
 
 logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
 
+MAX_ITERATIONS = 10000
+MAX_OPEN_STATES = 50000  # Предел размера открытого множества (ограничение памяти)
+SKIP_COST = 1.0  # Стоимость вокселя, который не удалось покрыть ни одним кирпичом
+
 @njit
-def compute_heuristic(remaining_voxels: int, cubes: List[Tuple[int, int, int, int, int, int, str]], 
-                      voxel_shape: Tuple[int, int, int]) -> float:
-    """Numba-версия эвристики для ускорения."""
+def compute_heuristic(remaining_voxels: int, max_brick_volume: int) -> float:
+    """Нижняя оценка числа кирпичей, нужных для оставшихся вокселей."""
     if remaining_voxels == 0:
-        return 0
-    
-    max_brick_volume = 24  # Максимальный объем из BRICK_PROPERTIES (2x4x3, например)
-    volume_cost = remaining_voxels / max_brick_volume
-
-    # Оценка числа кирпичей (упрощена для Numba, без связности)
-    brick_count_penalty = len(cubes) * 0.1
-    
-    return volume_cost + brick_count_penalty
+        return 0.0
+    return remaining_voxels / max_brick_volume
+
+@njit(cache=True)
+def find_next_voxel_from(voxel_array: np.ndarray, start: int) -> int:
+    """Первый занятый воксель в порядке z, y, x начиная с плоского индекса start (-1, если нет)."""
+    flat = voxel_array.ravel()
+    for i in range(start, flat.size):
+        if flat[i]:
+            return i
+    return -1
+
+@njit(cache=True)
+def zobrist_region(zobrist: np.ndarray, x: int, y: int, z: int, w: int, h: int, d: int) -> np.uint64:
+    key = np.uint64(0)
+    for dz in range(z, z + d):
+        for dy in range(y, y + h):
+            for dx in range(x, x + w):
+                key ^= zobrist[dz, dy, dx]
+    return key
+
+@njit(cache=True)
+def undo_brick(x: int, y: int, z: int, w: int, h: int, d: int, voxel_array: np.ndarray, support_array: np.ndarray):
+    voxel_array[z:z+d, y:y+h, x:x+w] = True
+    support_array[z:z+d, y:y+h, x:x+w] = False
+
+class _SearchNode:
+    """Состояние поиска: ссылка на родителя и дельта (кирпич или пропущенный воксель)."""
+    __slots__ = ("parent", "brick", "depth", "g", "remaining", "key", "cursor")
+
+    def __init__(self, parent, brick, depth, g, remaining, key, cursor):
+        self.parent = parent
+        self.brick = brick  # (x, y, z, w, h, d, t); t is None — воксель пропущен
+        self.depth = depth
+        self.g = g
+        self.remaining = remaining
+        self.key = key
+        self.cursor = cursor
 
 class BranchAndBoundPlacementStrategy(PlacementStrategy):
-    def place_bricks(self, voxel_array, use_colors, allowed_sizes, allow_top_layer=False, 
-                     progress_callback=None, brick_type=None):
-        voxel_copy = voxel_array  # In-place, копия не создается
-        support_array = np.zeros_like(voxel_array, dtype=bool)
-        total_voxels = np.sum(voxel_array)
+    def __init__(self, max_iterations: int = MAX_ITERATIONS, max_open_states: int = MAX_OPEN_STATES, seed=None):
+        super().__init__(seed)
+        self.max_iterations = max_iterations
+        self.max_open_states = max_open_states
+
+    def params(self) -> dict:
+        return {"max_iterations": self.max_iterations, "max_open_states": self.max_open_states}
+
+    def place_bricks(self, voxel_array, use_colors, allowed_sizes, allow_top_layer=False,
+                     progress_callback=None, brick_type=None, color_labels=None, deadline=None, counters=None):
+        voxel_copy = np.ascontiguousarray(voxel_array, dtype=np.bool_).copy()
+        support_array = np.zeros_like(voxel_copy, dtype=bool)
+        total_voxels = int(np.sum(voxel_copy))
+        if total_voxels == 0:
+            return BrickSet.empty()
+        allowed_sizes = BrickCatalog.of(allowed_sizes)
+        max_brick_volume = allowed_sizes.max_volume
+        self._labels = as_label_grid(color_labels)
+        self._counters = counter_array(counters)
+
+        # Жадное решение — верхняя граница для отсечения и гарантированный результат
+        best_cubes, best_cost = self._greedy_incumbent(voxel_copy, allowed_sizes, allow_top_layer)
+
+        # Ключ состояния — XOR случайных чисел снятых ячеек (отдельные таблицы для кирпичей и пропусков)
+        zobrist = self.rng.integers(1, np.iinfo(np.int64).max, size=voxel_copy.shape + (2,), dtype=np.int64).view(np.uint64)
+        zobrist_brick, zobrist_skip = np.ascontiguousarray(zobrist[..., 0]), zobrist[..., 1]
+
+        root = _SearchNode(None, None, 0, 0.0, total_voxels, np.uint64(0), 0)
+        self._current = root
+        tie = count()
+        open_set = [(compute_heuristic(total_voxels, max_brick_volume), next(tie), root)]
+        g_score = {root.key: 0.0}
+        best_node = None
         processed_voxels = 0
-        allowed_sizes = sorted(allowed_sizes, key=lambda s: s[0] * s[1] * s[2], reverse=True)
-        best_cubes = []
-        visited_voxels = set()
-
-        # Жадная инициализация
-        initial_cubes = []
-        for z in range(voxel_copy.shape[0]):
-            while np.any(voxel_copy[z]):
-                x, y, z_found, found = find_next_voxel_in_layer(voxel_copy, z)
-                if not found:
-                    break
-                voxel_key = (x, y, z)
-                if voxel_key in visited_voxels:
-                    voxel_copy[z, y, x] = 0
-                    continue
-                visited_voxels.add(voxel_key)
-                placed = False
-                for w, h, d, t in allowed_sizes:
-                    if can_place_brick(x, y, z, w, h, d, voxel_copy, support_array, allow_top_layer):
-                        place_brick(x, y, z, w, h, d, voxel_copy, support_array)
-                        initial_cubes.append((x, y, z, w, h, d, t))
-                        processed_voxels += w * h * d
-                        placed = True
-                        break
-                if not placed:
-                    voxel_copy[z, y, x] = 0
-
-        initial_state = (voxel_copy, support_array, initial_cubes)
-        state_key = self._state_key(initial_state)
-        h = compute_heuristic(np.sum(voxel_copy), initial_cubes, voxel_copy.shape)
-        open_set = [(0, 0, initial_state)]
-        g_score = {state_key: 0}
-        f_score = {state_key: h}
-        best_cubes = initial_cubes
-
-        max_iterations = 10000
+        generated = 1
+
         iteration = 0
-        while open_set and iteration < max_iterations:
+        while open_set and iteration < self.max_iterations:
             iteration += 1
             if progress_callback and progress_callback(processed_voxels / total_voxels):
-                return self._finalize_cubes(best_cubes, use_colors, brick_type)
-            f, g, (current_voxel, current_support, cubes) = heappop(open_set)
-            remaining_voxels = np.sum(current_voxel)
-
-            if remaining_voxels == 0:
-                return self._finalize_cubes(cubes, use_colors, brick_type)
-
-            x, y, z, found = find_next_voxel(current_voxel)
-            if not found:
-                if len(cubes) > len(best_cubes):
-                    best_cubes = cubes
-                continue
-
-            max_depth = max(1, int(remaining_voxels / (total_voxels * 0.1)))
-            if g > max_depth:
+                break
+            if deadline_reached(deadline):
+                logging.info("B&B: deadline reached, returning best solution so far")
+                break
+            f, _, node = heappop(open_set)
+            if f >= best_cost:
+                continue  # Граница: это поддерево не лучше известного решения
+            self._move_to(node, voxel_copy, support_array)
+
+            index = find_next_voxel_from(voxel_copy, node.cursor)
+            if index < 0:
+                best_cost, best_node = node.g, node
                 continue
+            z, y, x = np.unravel_index(index, voxel_copy.shape)
+            z, y, x = int(z), int(y), int(x)
 
+            children = []
             for w, h, d, t in allowed_sizes:
-                if can_place_brick(x, y, z, w, h, d, current_voxel, current_support, allow_top_layer):
-                    # In-place модификация для экономии памяти
-                    new_voxel = current_voxel.copy()  # Копируем только здесь
-                    new_support = current_support.copy()
-                    place_brick(x, y, z, w, h, d, new_voxel, new_support)
-                    new_cubes = cubes + [(x, y, z, w, h, d, t)]
-                    new_state = (new_voxel, new_support, new_cubes)
-
-                    new_g = g + 1
-                    new_h = compute_heuristic(np.sum(new_voxel), new_cubes, new_voxel.shape)
-                    new_f = new_g + new_h
-
-                    state_key = self._state_key(new_state)
-                    if state_key not in g_score or new_g < g_score[state_key]:
-                        g_score[state_key] = new_g
-                        f_score[state_key] = new_f
-                        heappush(open_set, (new_f, new_g, new_state))
-                        processed_voxels = total_voxels - remaining_voxels
-                        if len(new_cubes) > len(best_cubes):
-                            best_cubes = new_cubes
-
-        return self._finalize_cubes(best_cubes, use_colors, brick_type)
-
-    def _state_key(self, state):
-        _, _, cubes = state
-        return tuple((x, y, z, w, h, d, t) for x, y, z, w, h, d, t in cubes)
-
-    def _finalize_cubes(self, cubes, use_colors, brick_type):
-        return [(x, y, z, w, h, d, np.random.choice(LEGO_COLORS) if use_colors else "#000000", brick_type or t)
-                for x, y, z, w, h, d, t in cubes]
-
-def find_next_voxel_in_layer(voxel_array: np.ndarray, z: int) -> Tuple[int, int, int, bool]:
-    height, width = voxel_array.shape[1], voxel_array.shape[2]
-    for y in range(height):
-        for x in range(width):
-            if voxel_array[z, y, x]:
-                return x, y, z, True
-    return -1, -1, z, False
\ No newline at end of file
+                if self._fits(x, y, z, w, h, d, voxel_copy, support_array, allow_top_layer):
+                    key = node.key ^ zobrist_region(zobrist_brick, x, y, z, w, h, d)
+                    children.append(((x, y, z, w, h, d, t), node.g + 1, node.remaining - w * h * d, key))
+            if not children:
+                children.append(((x, y, z, 1, 1, 1, None), node.g + SKIP_COST, node.remaining - 1,
+                                 node.key ^ zobrist_skip[z, y, x]))
+
+            for brick, g, remaining, key in children:
+                if g_score.get(key, np.inf) <= g:
+                    continue
+                g_score[key] = g
+                generated += 1
+                child = _SearchNode(node, brick, node.depth + 1, g, remaining, key, index + 1)
+                heappush(open_set, (g + compute_heuristic(remaining, max_brick_volume), next(tie), child))
+                processed_voxels = max(processed_voxels, total_voxels - remaining)
+
+            if len(open_set) > self.max_open_states or len(g_score) > self.max_open_states:
+                # Оставляем лучшую половину фронта, чтобы память оставалась ограниченной; оценки g
+                # хранятся только для оставшихся состояний (закрытые могут раскрыться повторно)
+                open_set = nsmallest(self.max_open_states // 2, open_set)
+                heapify(open_set)
+                g_score = {node.key: node.g for _, _, node in open_set}
+
+        logging.info(f"B&B: {iteration} expansions, {generated} states, best cost {best_cost:.1f}")
+        if best_node is not None:
+            best_cubes = [node.brick for node in self._path(best_node) if node.brick[6] is not None]
+        return self.finalize_bricks(best_cubes, use_colors, brick_type)
+
+    def _greedy_incumbent(self, voxel_array: np.ndarray, allowed_sizes, allow_top_layer: bool) -> Tuple[List[Tuple], float]:
+        voxel_copy = voxel_array.copy()
+        support_array = np.zeros_like(voxel_copy, dtype=bool)
+        cubes = []
+        skipped = 0
+        index = find_next_voxel_from(voxel_copy, 0)
+        while index >= 0:
+            z, y, x = (int(v) for v in np.unravel_index(index, voxel_copy.shape))
+            for w, h, d, t in allowed_sizes:
+                if self._fits(x, y, z, w, h, d, voxel_copy, support_array, allow_top_layer):
+                    place_brick(x, y, z, w, h, d, voxel_copy, support_array)
+                    cubes.append((x, y, z, w, h, d, t))
+                    break
+            else:
+                voxel_copy[z, y, x] = False
+                skipped += 1
+            index = find_next_voxel_from(voxel_copy, index + 1)
+        return cubes, len(cubes) + skipped * SKIP_COST
+
+    def _fits(self, x: int, y: int, z: int, w: int, h: int, d: int, voxel_array: np.ndarray,
+              support_array: np.ndarray, allow_top_layer: bool) -> bool:
+        return can_place_brick(x, y, z, w, h, d, voxel_array, support_array, allow_top_layer,
+                               self._labels, self._counters)
+
+    def _path(self, node: _SearchNode) -> List[_SearchNode]:
+        path = []
+        while node.parent is not None:
+            path.append(node)
+            node = node.parent
+        return path[::-1]
+
+    def _apply(self, brick, voxel_array: np.ndarray, support_array: np.ndarray):
+        x, y, z, w, h, d, t = brick
+        if t is None:
+            voxel_array[z, y, x] = False
+        else:
+            place_brick(x, y, z, w, h, d, voxel_array, support_array)
+
+    def _undo(self, brick, voxel_array: np.ndarray, support_array: np.ndarray):
+        x, y, z, w, h, d, t = brick
+        if t is None:
+            voxel_array[z, y, x] = True
+        else:
+            undo_brick(x, y, z, w, h, d, voxel_array, support_array)
+
+    def _move_to(self, target: _SearchNode, voxel_array: np.ndarray, support_array: np.ndarray):
+        """Переводит рабочие массивы из текущего состояния в target через общего предка."""
+        current = self._current
+        redo = []
+        while current.depth > target.depth:
+            self._undo(current.brick, voxel_array, support_array)
+            current = current.parent
+        node = target
+        while node.depth > current.depth:
+            redo.append(node)
+            node = node.parent
+        while node is not current:
+            self._undo(current.brick, voxel_array, support_array)
+            current = current.parent
+            redo.append(node)
+            node = node.parent
+        for node in reversed(redo):
+            self._apply(node.brick, voxel_array, support_array)
+        self._current = target
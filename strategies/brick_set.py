@@ -0,0 +1,120 @@
+# src/strategies/brick_set.py
+import numpy as np
+from typing import Iterable, Iterator, Sequence, Tuple
+
+# 11 байт на кирпич вместо кортежа из восьми Python-объектов
+BRICK_DTYPE = np.dtype([
+    ("x", np.int16), ("y", np.int16), ("z", np.int16),
+    ("w", np.uint8), ("h", np.uint8), ("d", np.uint8),
+    ("color", np.uint8), ("type", np.uint8),
+])
+MAX_CODES = 256  # Размер таблиц цветов и типов ограничен кодом uint8
+
+class BrickSet:
+    """
+    Набор кирпичей на структурированном массиве NumPy.
+
+    Цвета и типы хранятся кодами в таблицы colors и types. Набор ведёт себя как
+    последовательность кортежей (x, y, z, w, h, d, color, brick_type), поэтому
+    старый код работает без изменений; срезы возвращают BrickSet над тем же
+    массивом без копирования, маски и индексы — над выборкой из него.
+    """
+    def __init__(self, data: np.ndarray, colors: Sequence[str], types: Sequence[str]):
+        if data.dtype != BRICK_DTYPE:
+            raise ValueError(f"BrickSet expects dtype {BRICK_DTYPE}, got {data.dtype}")
+        if len(colors) > MAX_CODES or len(types) > MAX_CODES:
+            raise ValueError(f"BrickSet supports at most {MAX_CODES} colors and types")
+        self.data = data
+        self.colors = tuple(colors)
+        self.types = tuple(types)
+
+    @classmethod
+    def empty(cls) -> "BrickSet":
+        return cls(np.zeros(0, dtype=BRICK_DTYPE), (), ())
+
+    @classmethod
+    def from_arrays(cls, coords: np.ndarray, color_codes: np.ndarray, type_codes: np.ndarray,
+                    colors: Sequence[str], types: Sequence[str]) -> "BrickSet":
+        """Собирает набор из массива (n, 6) x, y, z, w, h, d и кодов цвета и типа."""
+        coords = np.asarray(coords)
+        data = np.empty(len(coords), dtype=BRICK_DTYPE)
+        for i, name in enumerate(("x", "y", "z", "w", "h", "d")):
+            data[name] = coords[:, i] if len(coords) else 0
+        data["color"] = color_codes
+        data["type"] = type_codes
+        return cls(data, colors, types)
+
+    @classmethod
+    def from_cubes(cls, cubes) -> "BrickSet":
+        """Переводит список кортежей (x, y, z, w, h, d, color, brick_type) в набор; BrickSet возвращается как есть."""
+        if isinstance(cubes, BrickSet):
+            return cubes
+        if len(cubes) == 0:
+            return cls.empty()
+        colors, color_codes = np.unique([str(cube[6]) for cube in cubes], return_inverse=True)
+        types, type_codes = np.unique([str(cube[7]) for cube in cubes], return_inverse=True)
+        coords = np.array([cube[:6] for cube in cubes], dtype=np.int64)
+        return cls.from_arrays(coords, color_codes, type_codes, colors.tolist(), types.tolist())
+
+    @classmethod
+    def concatenate(cls, sets: Iterable) -> "BrickSet":
+        """Объединяет наборы, сводя их таблицы цветов и типов в общие."""
+        sets = [cls.from_cubes(s) for s in sets]
+        colors = sorted({c for s in sets for c in s.colors})
+        types = sorted({t for s in sets for t in s.types})
+        parts = []
+        for s in sets:
+            part = s.data.copy()
+            part["color"] = np.array([colors.index(c) for c in s.colors] or [0], dtype=np.uint8)[s.data["color"]]
+            part["type"] = np.array([types.index(t) for t in s.types] or [0], dtype=np.uint8)[s.data["type"]]
+            parts.append(part)
+        data = np.concatenate(parts) if parts else np.zeros(0, dtype=BRICK_DTYPE)
+        return cls(data, colors, types)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __iter__(self) -> Iterator[Tuple]:
+        colors, types = self.colors, self.types
+        for x, y, z, w, h, d, c, t in self.data.tolist():
+            yield x, y, z, w, h, d, colors[c], types[t]
+
+    def __getitem__(self, index):
+        if isinstance(index, (int, np.integer)):
+            x, y, z, w, h, d, c, t = self.data[index].tolist()
+            return x, y, z, w, h, d, self.colors[c], self.types[t]
+        return BrickSet(self.data[index], self.colors, self.types)
+
+    def __repr__(self) -> str:
+        return f"BrickSet({len(self)} bricks, {len(self.colors)} colors, {len(self.types)} types)"
+
+    @property
+    def coords(self) -> np.ndarray:
+        """Массив (n, 6) int64: x, y, z, w, h, d — форма для векторных операций и Numba-ядер."""
+        out = np.empty((len(self.data), 6), dtype=np.int64)
+        for i, name in enumerate(("x", "y", "z", "w", "h", "d")):
+            out[:, i] = self.data[name]
+        return out
+
+    @property
+    def color_codes(self) -> np.ndarray:
+        return self.data["color"]
+
+    @property
+    def type_codes(self) -> np.ndarray:
+        return self.data["type"]
+
+    def shifted(self, dx: int = 0, dy: int = 0, dz: int = 0) -> "BrickSet":
+        """Копия набора со сдвигом координат (локальный блок -> глобальная сетка)."""
+        data = self.data.copy()
+        data["x"] += dx
+        data["y"] += dy
+        data["z"] += dz
+        return BrickSet(data, self.colors, self.types)
+
+    def recolored(self, color_codes: np.ndarray, colors: Sequence[str]) -> "BrickSet":
+        """Копия набора с новыми цветами; неиспользуемые записи таблицы отбрасываются."""
+        used, codes = np.unique(np.asarray(color_codes, dtype=np.int64), return_inverse=True)
+        data = self.data.copy()
+        data["color"] = codes
+        return BrickSet(data, [colors[i] for i in used], self.types)
@@ -0,0 +1,135 @@
+# src/strategies/catalog.py
+import time
+import numpy as np
+from numba import njit
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+from src.config.config import get_brick_height
+from src.strategies.utils import (FIT_OK, NO_COUNTERS, NUM_FIT_REASONS, KernelCounters, as_label_grid, counter_array,
+                                  fit_reason, place_brick)
+
+# Каталоги строятся один раз на набор размеров (в каждом процессе свой кэш)
+_CATALOG_CACHE: Dict[Tuple, "BrickCatalog"] = {}
+
+@njit(cache=True)
+def place_layer_kernel(z: int, voxel_array: np.ndarray, support_array: np.ndarray,
+                       dims: np.ndarray, allow_top_layer: bool, labels: np.ndarray,
+                       counters: np.ndarray = NO_COUNTERS) -> np.ndarray:
+    """
+    Жадно укладывает слой z по каталогу в порядке приоритета.
+
+    Непустая сетка labels задаёт цветовые области: кирпич не может пересекать их границу.
+    Непустой массив counters (KernelCounters.array) накапливает исходы проверок и укладки.
+
+    Возвращает массив (n, 6): x, y, w, h, d, номер записи каталога.
+    """
+    height, width = voxel_array.shape[1], voxel_array.shape[2]
+    placed = np.empty((height * width, 6), dtype=np.int64)
+    n = 0
+    for y in range(height):
+        for x in range(width):
+            if not voxel_array[z, y, x]:
+                continue
+            for k in range(dims.shape[0]):
+                w, h, d = dims[k, 0], dims[k, 1], dims[k, 2]
+                if fit_reason(x, y, z, w, h, d, voxel_array, support_array, allow_top_layer,
+                              labels, counters) == FIT_OK:
+                    place_brick(x, y, z, w, h, d, voxel_array, support_array)
+                    if counters.size > 0:
+                        counters[NUM_FIT_REASONS + k] += 1
+                    placed[n, 0] = x
+                    placed[n, 1] = y
+                    placed[n, 2] = w
+                    placed[n, 3] = h
+                    placed[n, 4] = d
+                    placed[n, 5] = k
+                    n += 1
+                    break
+    return placed[:n]
+
+class BrickCatalog:
+    """
+    Набор допустимых кирпичей, подготовленный один раз на запуск.
+
+    Содержит все разрешённые повороты (w, h) -> (h, w), порядок приоритета
+    (по убыванию объёма, затем площади), объёмы, высоты в вокселях и в мм,
+    маски оснований и непрерывные int-массивы для Numba-ядер.
+    """
+    def __init__(self, allowed_sizes: Iterable[Tuple[int, int, int, str]], rotations: bool = True):
+        self._key = (tuple((int(w), int(h), int(d), t) for w, h, d, t in allowed_sizes), rotations)
+        entries = []
+        for w, h, d, t in self._key[0]:
+            for entry in ((w, h, d, t), (h, w, d, t)) if rotations else ((w, h, d, t),):
+                if entry not in entries:
+                    entries.append(entry)
+        if not entries:
+            raise ValueError("Brick catalog requires at least one brick size")
+        # Стабильная сортировка: при равенстве сохраняется порядок из конфигурации
+        entries.sort(key=lambda s: (s[0] * s[1] * s[2], s[0] * s[1]), reverse=True)
+
+        self.sizes: List[Tuple[int, int, int, str]] = entries
+        self.types: List[str] = sorted({t for _, _, _, t in entries})
+        self.dims = np.ascontiguousarray([(w, h, d) for w, h, d, _ in entries], dtype=np.int64)
+        self.type_codes = np.array([self.types.index(t) for _, _, _, t in entries], dtype=np.int64)
+        self.volumes = np.prod(self.dims, axis=1)
+        self.areas = self.dims[:, 0] * self.dims[:, 1]
+        self.heights = self.dims[:, 2].copy()
+        self.heights_mm = np.array([get_brick_height(t) for _, _, _, t in entries], dtype=np.float64)
+        self.max_width = int(self.dims[:, 0].max())
+        self.max_length = int(self.dims[:, 1].max())
+        self.max_depth = int(self.heights.max())
+        self.max_area = int(self.areas.max())
+        self.max_volume = int(self.volumes.max())
+        self.max_footprint = max(self.max_width, self.max_length)
+        # Маски оснований, выровненные в левый верхний угол: footprints[k, :h, :w] = True
+        self.footprints = np.zeros((len(entries), self.max_length, self.max_width), dtype=np.bool_)
+        for k, (w, h, _, _) in enumerate(entries):
+            self.footprints[k, :h, :w] = True
+
+    @classmethod
+    def of(cls, allowed_sizes: Union["BrickCatalog", Iterable[Tuple[int, int, int, str]]],
+           rotations: bool = True) -> "BrickCatalog":
+        """Возвращает готовый каталог или берёт его из кэша по набору размеров."""
+        if isinstance(allowed_sizes, BrickCatalog):
+            return allowed_sizes
+        key = (tuple((int(w), int(h), int(d), t) for w, h, d, t in allowed_sizes), rotations)
+        catalog = _CATALOG_CACHE.get(key)
+        if catalog is None:
+            catalog = _CATALOG_CACHE[key] = cls(key[0], rotations)
+        return catalog
+
+    def __reduce__(self):
+        # В процессы-воркеры передаётся только ключ; каталог пересобирается там один раз через кэш
+        return BrickCatalog.of, self._key
+
+    def __len__(self) -> int:
+        return len(self.sizes)
+
+    def __iter__(self):
+        return iter(self.sizes)
+
+    def __getitem__(self, index: int) -> Tuple[int, int, int, str]:
+        return self.sizes[index]
+
+    def place_layer_array(self, z: int, voxel_array: np.ndarray, support_array: np.ndarray,
+                          allow_top_layer: bool = False, color_labels: np.ndarray = None,
+                          counters: Optional[KernelCounters] = None) -> np.ndarray:
+        """Жадная укладка слоя z; возвращает массив (n, 7): x, y, z, w, h, d, код типа в self.types."""
+        start = time.perf_counter()
+        # Массив передаётся всегда, чтобы у ядра была одна специализация
+        placed = place_layer_kernel(z, voxel_array, support_array, self.dims, allow_top_layer,
+                                    as_label_grid(color_labels), counter_array(counters))
+        if counters is not None:
+            counters.add_layer_time(z, time.perf_counter() - start)
+        out = np.empty((len(placed), 7), dtype=np.int64)
+        out[:, :2] = placed[:, :2]
+        out[:, 2] = z
+        out[:, 3:6] = placed[:, 2:5]
+        out[:, 6] = self.type_codes[placed[:, 5]]
+        return out
+
+    def place_layer(self, z: int, voxel_array: np.ndarray, support_array: np.ndarray,
+                    allow_top_layer: bool = False, color_labels: np.ndarray = None,
+                    counters: Optional[KernelCounters] = None) -> List[Tuple[int, int, int, int, int, int, str]]:
+        """Жадная укладка слоя z; возвращает кирпичи (x, y, z, w, h, d, t)."""
+        placed = self.place_layer_array(z, voxel_array, support_array, allow_top_layer, color_labels, counters)
+        return [(x, y, z, w, h, d, self.types[t]) for x, y, z, w, h, d, t in placed.tolist()]
@@ -1,168 +1,448 @@
 import numpy as np
 import logging
-import concurrent.futures
-from numba.typed import List as NumbaList
-from typing import List, Tuple
-from scipy.ndimage import label
-from src.config.config import LEGO_COLORS
-from src.strategies.base import PlacementStrategy
-from src.strategies.utils import place_bricks_on_layer_fast
+import multiprocessing
+from typing import Dict, List, Optional, Set, Tuple
+from src.strategies.base import PlacementStrategy, deadline_reached
+from src.strategies.brick_set import BrickSet
+from src.strategies.catalog import BrickCatalog
+from src.strategies.utils import KernelCounters, as_label_grid, can_place_brick_ids, counter_array
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+PROPOSALS_PER_ITERATION = 3
+FRAGMENTATION_PENALTY = 5  # Штраф за каждый кластер (коэффициент подстройки)
+SPLIT_SEARCH_BUDGET = 256  # Сколько кирпичей обходим при проверке разрыва кластера перед полным пересчётом
+SWAP_INTERVAL = 10  # Итераций между попытками обмена температурами цепочек
+
+class _AnnealingState:
+    """
+    Инкрементальное состояние отжига.
+
+    Хранит сетку идентификаторов кирпичей, покрытие, число кирпичей и кластеры
+    (union-find по смежности кирпичей), поэтому добавление и удаление кирпича
+    стоят O(размер кирпича), а не O(размер сетки).
+    """
+    def __init__(self, voxel_array: np.ndarray, allow_top_layer: bool, color_labels: np.ndarray = None,
+                 rng: Optional[np.random.Generator] = None, counters: Optional[KernelCounters] = None):
+        self.voxel_array = voxel_array
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.allow_top_layer = allow_top_layer
+        self.labels = as_label_grid(color_labels)
+        self.counters = counter_array(counters)
+        self.total_voxels = int(np.sum(voxel_array))
+        self.brick_ids = np.full(voxel_array.shape, -1, dtype=np.int32)
+        self.bricks: Dict[int, Tuple] = {}
+        self.neighbors: Dict[int, Set[int]] = {}
+        self.coverage = 0
+        self.clusters = 0
+        self._id_list: List[int] = []
+        self._id_pos: Dict[int, int] = {}
+        self._next_id = 0
+        self._parent: Dict[int, int] = {}
+        self._dirty = False
+
+    def _find(self, node: int) -> int:
+        root = node
+        while self._parent[root] != root:
+            root = self._parent[root]
+        while self._parent[node] != root:
+            self._parent[node], node = root, self._parent[node]
+        return root
+
+    def _union(self, a: int, b: int) -> bool:
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a == root_b:
+            return False
+        self._parent[root_b] = root_a
+        return True
+
+    def _touching(self, brick_id: int, x: int, y: int, z: int, w: int, h: int, d: int) -> Set[int]:
+        """Кирпичи, касающиеся гранью коробки кирпича (та же связность, что у scipy.ndimage.label)."""
+        depth, height, width = self.brick_ids.shape
+        shells = []
+        if x > 0:
+            shells.append(self.brick_ids[z:z+d, y:y+h, x-1])
+        if x + w < width:
+            shells.append(self.brick_ids[z:z+d, y:y+h, x+w])
+        if y > 0:
+            shells.append(self.brick_ids[z:z+d, y-1, x:x+w])
+        if y + h < height:
+            shells.append(self.brick_ids[z:z+d, y+h, x:x+w])
+        if z > 0:
+            shells.append(self.brick_ids[z-1, y:y+h, x:x+w])
+        if z + d < depth:
+            shells.append(self.brick_ids[z+d, y:y+h, x:x+w])
+        touching = set()
+        for shell in shells:
+            touching.update(int(i) for i in np.unique(shell) if i >= 0 and i != brick_id)
+        return touching
+
+    def can_add(self, x: int, y: int, z: int, w: int, h: int, d: int) -> bool:
+        return can_place_brick_ids(x, y, z, w, h, d, self.voxel_array, self.brick_ids, self.allow_top_layer,
+                                   self.labels, self.counters)
+
+    def can_remove(self, brick_id: int) -> bool:
+        """Кирпич, на котором что-то стоит, не снимаем — иначе верхний кирпич повиснет."""
+        x, y, z, w, h, d, _ = self.bricks[brick_id]
+        if z + d >= self.brick_ids.shape[0]:
+            return True
+        return not np.any(self.brick_ids[z+d, y:y+h, x:x+w] >= 0)
+
+    def add(self, brick: Tuple) -> int:
+        x, y, z, w, h, d, _ = brick
+        brick_id = self._next_id
+        self._next_id += 1
+        self.brick_ids[z:z+d, y:y+h, x:x+w] = brick_id
+        self.bricks[brick_id] = brick
+        self._id_pos[brick_id] = len(self._id_list)
+        self._id_list.append(brick_id)
+        self.coverage += w * h * d
+        touching = self._touching(brick_id, x, y, z, w, h, d)
+        self.neighbors[brick_id] = touching
+        self._parent[brick_id] = brick_id
+        self.clusters += 1
+        for other in touching:
+            self.neighbors[other].add(brick_id)
+            if not self._dirty and self._union(brick_id, other):
+                self.clusters -= 1
+        return brick_id
+
+    def remove(self, brick_id: int) -> Tuple:
+        brick = self.bricks.pop(brick_id)
+        x, y, z, w, h, d, _ = brick
+        self.brick_ids[z:z+d, y:y+h, x:x+w] = -1
+        last = self._id_list.pop()
+        if last != brick_id:
+            position = self._id_pos[brick_id]
+            self._id_list[position] = last
+            self._id_pos[last] = position
+        del self._id_pos[brick_id]
+        self.coverage -= w * h * d
+        touching = self.neighbors.pop(brick_id)
+        for other in touching:
+            self.neighbors[other].discard(brick_id)
+        if not self._dirty:
+            if not touching:
+                self.clusters -= 1
+            elif len(touching) > 1 and not self._still_connected(touching):
+                self._dirty = True
+        return brick
+
+    def _still_connected(self, touching: Set[int]) -> bool:
+        """Ограниченный обход: остались ли бывшие соседи снятого кирпича в одном кластере."""
+        targets = set(touching)
+        start = targets.pop()
+        visited, frontier = {start}, [start]
+        while frontier and targets:
+            if len(visited) > SPLIT_SEARCH_BUDGET:
+                return False
+            node = frontier.pop()
+            for other in self.neighbors[node]:
+                if other not in visited:
+                    visited.add(other)
+                    targets.discard(other)
+                    frontier.append(other)
+        return not targets
+
+    def cluster_count(self) -> int:
+        if self._dirty:
+            # Полный пересчёт union-find по списку смежности: O(кирпичи + контакты), без обхода сетки
+            self._parent = {brick_id: brick_id for brick_id in self.bricks}
+            self.clusters = len(self.bricks)
+            for brick_id, touching in self.neighbors.items():
+                for other in touching:
+                    if self._union(brick_id, other):
+                        self.clusters -= 1
+            self._dirty = False
+        return self.clusters
+
+    def cost(self) -> float:
+        base_cost = -len(self.bricks) - self.coverage / self.total_voxels
+        return base_cost + self.cluster_count() * FRAGMENTATION_PENALTY
+
+    def random_brick_id(self) -> Optional[int]:
+        if not self._id_list:
+            return None
+        return self._id_list[self.rng.integers(len(self._id_list))]
+
+    def cubes(self) -> List[Tuple]:
+        return [self.bricks[brick_id] for brick_id in sorted(self.bricks)]
+
+def _chain_worker(conn, voxel_array: np.ndarray, allowed_sizes: List[Tuple], allow_top_layer: bool,
+                  seed: np.random.SeedSequence, color_labels: Optional[np.ndarray] = None,
+                  deadline: Optional[float] = None, count: bool = False):
+    """
+    Процесс одной цепочки параллельного отжига.
+
+    Команды из канала: ("run", температура, итераций) -> (текущая, лучшая стоимость);
+    ("result",) -> лучшие кирпичи и счётчики цепочки (None, если count выключен); ("stop",) — завершение.
+    """
+    strategy = SimulatedAnnealingPlacementStrategy(seed=seed)
+    counters = KernelCounters(allowed_sizes.sizes) if count else None
+    state = strategy._initial_state(voxel_array, allowed_sizes, allow_top_layer, color_labels, counters)
+    voxel_coords = np.argwhere(voxel_array)
+    current_cost = state.cost()
+    best_cost, best_cubes = current_cost, state.cubes()
+    while True:
+        command = conn.recv()
+        if command[0] == "run":
+            _, temperature, iterations = command
+            for _ in range(iterations):
+                if deadline_reached(deadline):
+                    break
+                current_cost = strategy._anneal_step(state, voxel_coords, allowed_sizes, temperature, current_cost)
+                if current_cost < best_cost:
+                    best_cost, best_cubes = current_cost, state.cubes()
+            conn.send((current_cost, best_cost, state.coverage / state.total_voxels))
+        elif command[0] == "result":
+            conn.send((best_cost, best_cubes, counters))
+        else:
+            break
+    conn.close()
+
 class SimulatedAnnealingPlacementStrategy(PlacementStrategy):
+    def __init__(self, num_chains: int = 1, swap_interval: int = SWAP_INTERVAL, seed=None):
+        super().__init__(seed)
+        self.num_chains = num_chains
+        self.swap_interval = swap_interval
+
+    def params(self) -> dict:
+        return {"num_chains": self.num_chains, "swap_interval": self.swap_interval}
+
     def place_bricks(self, voxel_array, use_colors, allowed_sizes, allow_top_layer=False, progress_callback=None,
-                        initial_temp: float = 1000.0, min_temp: float = 1.0, max_iterations: int = 100, brick_type=None):
-            voxel_copy = voxel_array.copy()
-            support_array = np.zeros_like(voxel_array, dtype=bool)
-            total_voxels = np.sum(voxel_array)
-            temperature = initial_temp
-            cubes = []
-            layer_cache = {}
-
-            def cost_function(cubes_list: List[Tuple]) -> float:
-                # Текущее покрытие
-                coverage = sum(w * h * d for _, _, _, w, h, d, _ in cubes_list)
-                base_cost = -len(cubes_list) - coverage / total_voxels
-
-                # Построим воксельный массив текущих кирпичей
-                brick_array = np.zeros_like(voxel_array, dtype=bool)
-                for x, y, z, w, h, d, _ in cubes_list:
-                    brick_array[z:z+d, y:y+h, x:x+w] = True
-                
-                # Анализ связности
-                labeled_array, num_clusters = label(brick_array)
-                fragmentation_penalty = num_clusters * 5  # Штраф за каждый лишний кластер (коэффициент подстройки)
-                
-                return base_cost + fragmentation_penalty
-
-            best_cubes = self._initial_greedy_placement(voxel_copy, support_array, allowed_sizes, allow_top_layer, layer_cache)
-            best_cost = cost_function(best_cubes)
-            current_voxel = voxel_copy.copy()
-            current_support = support_array.copy()
-
-            iteration = 0
-            while temperature > min_temp and iteration < max_iterations:
-                if progress_callback and progress_callback(sum(w * h * d for _, _, _, w, h, d, _ in best_cubes) / total_voxels):  # Проверка остановки
-                    return [(x, y, z, w, h, d, np.random.choice(LEGO_COLORS) if use_colors else "#000000", brick_type) for x, y, z, w, h, d, _ in best_cubes]
-                iteration += 1
-                coverage = sum(w * h * d for _, _, _, w, h, d, _ in best_cubes) / total_voxels
-                action_probs = {"remove": min(0.5, coverage), "add": 0.3, "replace": 1 - min(0.5, coverage) - 0.3}
-
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    futures = [executor.submit(self._perturb_solution, best_cubes, current_voxel.copy(), 
-                                            current_support.copy(), allowed_sizes, allow_top_layer, layer_cache, 
-                                            np.random.choice(list(action_probs.keys()), p=list(action_probs.values())))
-                            for _ in range(3)]
-                    new_cubes_list = [f.result() for f in concurrent.futures.as_completed(futures)]
-
-                new_cubes = min(new_cubes_list, key=cost_function)
-                new_cost = cost_function(new_cubes)
-
-                delta_cost = new_cost - best_cost
-                if delta_cost < 0 or np.random.random() < np.exp(-delta_cost / temperature):
-                    best_cubes = new_cubes
-                    best_cost = new_cost
-                    voxel_copy[:] = current_voxel
-                    support_array[:] = current_support
-
-                best_cubes = self._local_optimization(best_cubes, voxel_copy, support_array, allowed_sizes, allow_top_layer, layer_cache)
-
-                temperature = initial_temp / (1 + iteration * 0.1)
-                processed_voxels = sum(w * h * d for _, _, _, w, h, d, _ in best_cubes)
-                logging.info("SA: Iter %d, Temp %.2f, Cost %.2f, Clusters %d, Progress %.2f%%" % 
-                            (iteration, temperature, best_cost, label(np.zeros_like(voxel_array, dtype=bool))[1], 
-                            processed_voxels / total_voxels * 100))
-                if progress_callback:
-                    progress_callback(processed_voxels / total_voxels)
-
-            for cube in best_cubes:
-                x, y, z, w, h, d, _ = cube
-                color = np.random.choice(LEGO_COLORS) if use_colors else "#000000"
-                cubes.append((x, y, z, w, h, d, color, brick_type))
-            return cubes
-
-    def _initial_greedy_placement(self, voxel_array: np.ndarray, support_array: np.ndarray, 
-                                  allowed_sizes: NumbaList, allow_top_layer: bool, layer_cache: dict) -> List[Tuple]:
+                        initial_temp: float = 1000.0, min_temp: float = 1.0, max_iterations: int = 100, brick_type=None,
+                        color_labels=None, deadline=None, counters=None):
+            voxel_array = np.ascontiguousarray(voxel_array, dtype=np.bool_)
+            if not np.any(voxel_array):
+                return BrickSet.empty()
+            allowed_sizes = BrickCatalog.of(allowed_sizes)
+            if self.num_chains > 1:
+                best_cubes = self._parallel_tempering(voxel_array, allowed_sizes, allow_top_layer, progress_callback,
+                                                      initial_temp, min_temp, max_iterations, color_labels, deadline,
+                                                      counters)
+            else:
+                best_cubes = self._single_chain(voxel_array, allowed_sizes, allow_top_layer, progress_callback,
+                                                initial_temp, min_temp, max_iterations, color_labels, deadline,
+                                                counters)
+            return self.finalize_bricks(best_cubes, use_colors, brick_type)
+
+    def _initial_state(self, voxel_array: np.ndarray, catalog: BrickCatalog, allow_top_layer: bool,
+                       color_labels: Optional[np.ndarray] = None,
+                       counters: Optional[KernelCounters] = None) -> _AnnealingState:
+        state = _AnnealingState(voxel_array, allow_top_layer, color_labels, self.rng, counters)
+        for cube in self._initial_greedy_placement(voxel_array, catalog, allow_top_layer, color_labels, counters):
+            state.add(cube)
+        return state
+
+    def _anneal_step(self, state: _AnnealingState, voxel_coords: np.ndarray, allowed_sizes: List[Tuple],
+                     temperature: float, current_cost: float) -> float:
+        """Одна итерация Метрополиса: несколько пробных ходов, лучший принимается по правилу отжига."""
+        coverage = state.coverage / state.total_voxels
+        action_probs = {"remove": min(0.5, coverage), "add": 0.3, "replace": 1 - min(0.5, coverage) - 0.3}
+
+        # Несколько пробных ходов: каждый применяется, оценивается и откатывается
+        best_move, best_move_cost = None, None
+        for _ in range(PROPOSALS_PER_ITERATION):
+            action = self.rng.choice(list(action_probs.keys()), p=list(action_probs.values()))
+            journal = self._perturb_solution(state, voxel_coords, allowed_sizes, action)
+            if not journal:
+                continue
+            move_cost = state.cost()
+            self._undo(state, journal)
+            if best_move_cost is None or move_cost < best_move_cost:
+                best_move, best_move_cost = journal, move_cost
+
+        if best_move is not None:
+            delta_cost = best_move_cost - current_cost
+            if delta_cost < 0 or self.rng.random() < np.exp(-delta_cost / temperature):
+                self._redo(state, best_move)
+                self._local_optimization(state, best_move, allowed_sizes)
+                current_cost = state.cost()
+        return current_cost
+
+    def _single_chain(self, voxel_array: np.ndarray, allowed_sizes: List[Tuple], allow_top_layer: bool,
+                      progress_callback, initial_temp: float, min_temp: float, max_iterations: int,
+                      color_labels: Optional[np.ndarray] = None, deadline: Optional[float] = None,
+                      counters: Optional[KernelCounters] = None) -> List[Tuple]:
+        state = self._initial_state(voxel_array, allowed_sizes, allow_top_layer, color_labels, counters)
+        voxel_coords = np.argwhere(voxel_array)
+        current_cost = state.cost()
+        best_cost, best_cubes = current_cost, state.cubes()
+        temperature = initial_temp
+
+        iteration = 0
+        while temperature > min_temp and iteration < max_iterations:
+            if progress_callback and progress_callback(state.coverage / state.total_voxels):  # Проверка остановки
+                break
+            if deadline_reached(deadline):
+                logging.info("SA: deadline reached, returning best solution so far")
+                break
+            iteration += 1
+            current_cost = self._anneal_step(state, voxel_coords, allowed_sizes, temperature, current_cost)
+            if current_cost < best_cost:
+                best_cost, best_cubes = current_cost, state.cubes()
+
+            temperature = initial_temp / (1 + iteration * 0.1)
+            logging.info("SA: Iter %d, Temp %.2f, Cost %.2f, Clusters %d, Progress %.2f%%" %
+                        (iteration, temperature, current_cost, state.cluster_count(),
+                        state.coverage / state.total_voxels * 100))
+        return best_cubes
+
+    def _parallel_tempering(self, voxel_array: np.ndarray, allowed_sizes: List[Tuple], allow_top_layer: bool,
+                            progress_callback, initial_temp: float, min_temp: float, max_iterations: int,
+                            color_labels: Optional[np.ndarray] = None, deadline: Optional[float] = None,
+                            counters: Optional[KernelCounters] = None) -> List[Tuple]:
+        """
+        Параллельный отжиг: цепочки с разными температурами работают в отдельных процессах.
+
+        Каждые swap_interval итераций соседние по температуре цепочки обмениваются
+        температурами с вероятностью min(1, exp((E_i - E_j) * (1/T_i - 1/T_j))) —
+        это эквивалентно обмену состояниями, но без пересылки сеток между процессами.
+        """
+        temperatures = list(np.geomspace(min_temp, initial_temp, self.num_chains))
+        # Каждая цепочка получает свой дочерний поток: результат не зависит от планировщика процессов
+        seeds = self.spawn_seeds(self.num_chains)
+        pipes, processes = [], []
+        for seed in seeds:
+            parent_conn, child_conn = multiprocessing.Pipe()
+            process = multiprocessing.Process(target=_chain_worker, daemon=True,
+                                              args=(child_conn, voxel_array, allowed_sizes, allow_top_layer, seed,
+                                                    color_labels, deadline, counters is not None))
+            process.start()
+            child_conn.close()
+            pipes.append(parent_conn)
+            processes.append(process)
+        # ladder[k] — номер цепочки, работающей на k-й температуре
+        ladder = list(range(self.num_chains))
+        try:
+            rounds = max(1, -(-max_iterations // self.swap_interval))
+            swaps = 0
+            for round_index in range(rounds):
+                for rung, chain in enumerate(ladder):
+                    pipes[chain].send(("run", temperatures[rung], self.swap_interval))
+                energies = [None] * self.num_chains
+                coverage = 0.0
+                for chain, conn in enumerate(pipes):
+                    energies[chain], _, chain_coverage = conn.recv()
+                    coverage = max(coverage, chain_coverage)
+                # Чередуем чётные и нечётные пары, как в классической схеме обменов
+                for rung in range(round_index % 2, self.num_chains - 1, 2):
+                    cold, hot = ladder[rung], ladder[rung + 1]
+                    exponent = (energies[cold] - energies[hot]) * (1 / temperatures[rung] - 1 / temperatures[rung + 1])
+                    if exponent >= 0 or self.rng.random() < np.exp(exponent):
+                        ladder[rung], ladder[rung + 1] = hot, cold
+                        swaps += 1
+                logging.info("SA: round %d/%d, chains %d, best energy %.2f, swaps %d" %
+                            (round_index + 1, rounds, self.num_chains, min(energies), swaps))
+                if progress_callback and progress_callback(coverage):
+                    break
+                if deadline_reached(deadline):
+                    logging.info("SA: deadline reached, collecting best chain results")
+                    break
+
+            results = []
+            for conn in pipes:
+                conn.send(("result",))
+                results.append(conn.recv())
+        finally:
+            for conn in pipes:
+                try:
+                    conn.send(("stop",))
+                except (BrokenPipeError, OSError):
+                    pass
+                conn.close()
+            for process in processes:
+                process.join(timeout=5)
+        for _, _, chain_counters in results:
+            if counters is not None and chain_counters is not None:
+                counters.add(chain_counters)
+        best_cost, best_cubes, _ = min(results, key=lambda result: result[0])
+        return best_cubes
+
+    def _initial_greedy_placement(self, voxel_array: np.ndarray, catalog: BrickCatalog,
+                                  allow_top_layer: bool, color_labels: Optional[np.ndarray] = None,
+                                  counters: Optional[KernelCounters] = None) -> List[Tuple]:
+        voxel_copy = voxel_array.copy()
+        support_array = np.zeros_like(voxel_array, dtype=bool)
         cubes = []
         for z in range(voxel_array.shape[0]):
-            if z not in layer_cache:
-                layer_cubes = place_bricks_on_layer_fast(z, voxel_array, support_array, allowed_sizes, allow_top_layer)
-                layer_cache[z] = [(x, y, z, w, h, d) for x, y, z, w, h, d in layer_cubes]
-            cubes.extend((x, y, z, w, h, d, "#000000") for x, y, z, w, h, d in layer_cache[z])
+            cubes.extend(catalog.place_layer(z, voxel_copy, support_array, allow_top_layer, color_labels, counters))
         return cubes
 
-    def _perturb_solution(self, cubes: List[Tuple], voxel_array: np.ndarray, support_array: np.ndarray, 
-                          allowed_sizes: NumbaList, allow_top_layer: bool, layer_cache: dict, action: str) -> List[Tuple]:
-        new_cubes = cubes.copy()
-        total_coverage = sum(w * h * d for _, _, _, w, h, d, _ in new_cubes)
+    def _perturb_solution(self, state: _AnnealingState, voxel_coords: np.ndarray,
+                          allowed_sizes: List[Tuple], action: str) -> List[Tuple]:
+        """Применяет случайный ход к состоянию и возвращает журнал операций для отката ([] — ход невозможен)."""
+        journal = []
+        if action == "remove":
+            brick_id = state.random_brick_id()
+            if brick_id is not None and state.can_remove(brick_id):
+                journal.append(("remove", state.remove(brick_id)))
+        elif action == "add":
+            if state.coverage >= state.total_voxels:
+                return journal
+            z, y, x = voxel_coords[self.rng.integers(len(voxel_coords))]
+            if state.brick_ids[z, y, x] >= 0:
+                return journal
+            for index in self.rng.permutation(len(allowed_sizes)):
+                w, h, d, t = allowed_sizes[index]
+                if state.can_add(x, y, z, w, h, d):
+                    brick = (int(x), int(y), int(z), w, h, d, t)
+                    state.add(brick)
+                    journal.append(("add", brick))
+                    break
+        elif action == "replace":
+            brick_id = state.random_brick_id()
+            if brick_id is None or not state.can_remove(brick_id):
+                return journal
+            old_brick = state.remove(brick_id)
+            x, y, z, old_w, old_h, old_d, _ = old_brick
+            journal.append(("remove", old_brick))
+            for w, h, d, t in allowed_sizes:
+                if w * h * d > old_w * old_h * old_d and state.can_add(x, y, z, w, h, d):
+                    brick = (x, y, z, w, h, d, t)
+                    state.add(brick)
+                    journal.append(("add", brick))
+                    break
+            else:
+                # Больший кирпич не встал — ход бесполезен, возвращаем как было
+                self._undo(state, journal)
+                return []
+        return journal
 
-        # Идея 3: Ограничение пертурбаций
-        if total_coverage >= np.sum(voxel_array) and action != "remove":
-            return new_cubes
+    def _brick_id_at(self, state: _AnnealingState, brick: Tuple) -> int:
+        x, y, z = brick[:3]
+        return int(state.brick_ids[z, y, x])
 
-        if action == "remove" and new_cubes:
-            new_cubes.pop(np.random.randint(len(new_cubes)))
-        elif action == "add":
-            z = np.random.randint(voxel_array.shape[0])
-            if z not in layer_cache:
-                layer_cache[z] = place_bricks_on_layer_fast(z, voxel_array, support_array, allowed_sizes, allow_top_layer)
-            if layer_cache[z]:
-                x, y, z, w, h, d = layer_cache[z][0]
-                new_cubes.append((x, y, z, w, h, d, "#000000"))
-        elif action == "replace" and new_cubes:
-            idx = np.random.randint(len(new_cubes))
-            old_cube = new_cubes.pop(idx)
-            z = old_cube[2]
-            if z not in layer_cache:
-                layer_cache[z] = place_bricks_on_layer_fast(z, voxel_array, support_array, allowed_sizes, allow_top_layer)
-            if layer_cache[z]:
-                x, y, z, w, h, d = layer_cache[z][0]
-                new_cubes.append((x, y, z, w, h, d, "#000000"))
-
-        return new_cubes
-
-    def _local_optimization(self, cubes: List[Tuple], voxel_array: np.ndarray, support_array: np.ndarray, 
-                            allowed_sizes: NumbaList, allow_top_layer: bool, layer_cache: dict) -> List[Tuple]:
-        """
-        Локальная жадная доработка размещения кирпичей.
-        
-        Args:
-            cubes: Текущий список размещённых кубов (x, y, z, w, h, d, color, brick_type).
-            voxel_array: Воксельный массив модели.
-            support_array: Массив поддержки (True - поддерживаемый воксель).
-            allowed_sizes: Список разрешённых размеров кирпичей (w, h, d, brick_type).
-            allow_top_layer: Разрешить размещение на верхнем слое с боковой поддержкой.
-            layer_cache: Кэш слоёв для ускорения.
-        
-        Returns:
-            Обновлённый список кубов с локальными улучшениями.
+    def _undo(self, state: _AnnealingState, journal: List[Tuple]):
+        for op, brick in reversed(journal):
+            if op == "add":
+                state.remove(self._brick_id_at(state, brick))
+            else:
+                state.add(brick)
+
+    def _redo(self, state: _AnnealingState, journal: List[Tuple]):
+        for op, brick in journal:
+            if op == "add":
+                state.add(brick)
+            else:
+                state.remove(self._brick_id_at(state, brick))
+
+    def _local_optimization(self, state: _AnnealingState, journal: List[Tuple], allowed_sizes: List[Tuple]):
         """
-        optimized_cubes = cubes.copy()
-        total_voxels = np.sum(voxel_array)
-        current_coverage = sum(w * h * d for _, _, _, w, h, d, _, _ in optimized_cubes)
+        Локальная жадная доработка: пытается заново заполнить ячейки, освобождённые ходом.
 
-        for z in range(voxel_array.shape[0]):
-            if z not in layer_cache:
-                # Используем place_bricks_on_layer_fast для получения новых кубов
-                layer_cubes = place_bricks_on_layer_fast(z, voxel_array, support_array, allowed_sizes, allow_top_layer)
-                layer_cache[z] = [(x, y, z, w, h, d, t) for x, y, z, w, h, d, t in layer_cubes]
-            
-            # Добавляем только те кубы, которые увеличивают покрытие и не перекрываются
-            for x, y, z, w, h, d, brick_type in layer_cache[z]:
-                if current_coverage < total_voxels:
-                    # Проверяем, не перекрывается ли новый куб с существующими
-                    overlap = False
-                    for existing_cube in optimized_cubes:
-                        ex, ey, ez, ew, eh, ed, _, _ = existing_cube
-                        if (x < ex + ew and x + w > ex and
-                            y < ey + eh and y + h > ey and
-                            z < ez + ed and z + d > ez):
-                            overlap = True
-                            break
-                    
-                    if not overlap:
-                        optimized_cubes.append((x, y, z, w, h, d, "#000000", brick_type))
-                        current_coverage += w * h * d
-        
-        return optimized_cubes
\ No newline at end of file
+        Проверяются только ячейки снятых кирпичей, поэтому доработка стоит O(размер кирпича).
+        """
+        for op, brick in journal:
+            if op != "remove":
+                continue
+            bx, by, bz, bw, bh, bd, _ = brick
+            for z in range(bz, bz + bd):
+                for y in range(by, by + bh):
+                    for x in range(bx, bx + bw):
+                        if state.brick_ids[z, y, x] >= 0:
+                            continue
+                        for w, h, d, t in allowed_sizes:
+                            if state.can_add(x, y, z, w, h, d):
+                                state.add((x, y, z, w, h, d, t))
+                                break
@@ -1,30 +1,82 @@
-from numba import njit
-import numpy as np
-from numba.typed import List as NumbaList
-from typing import List, Tuple
-
+import logging
 import numpy as np
 from numba import njit
+from typing import Dict, Sequence, Tuple
 from src.config.config import MIN_OVERLAP, STUD_SIZE, BRICK_HEIGHTS
+from src.strategies.brick_set import BrickSet
+
+# Исходы проверки кирпича: индекс в массиве счётчиков ядер
+FIT_OK, FIT_BOUNDS, FIT_OCCUPIED, FIT_SUPPORT, FIT_TOP_LAYER, FIT_LABEL = range(6)
+FIT_REASONS = ("fit", "bounds", "occupied", "no_support", "top_layer", "label")
+NUM_FIT_REASONS = len(FIT_REASONS)
+# Пустой массив счётчиков: ядра ничего не считают
+NO_COUNTERS = np.zeros(0, dtype=np.int64)
+# Пустая сетка меток: проверка цветовых границ отключена
+NO_LABELS = np.zeros((0, 0, 0), dtype=np.int32)
+
+def as_label_grid(color_labels) -> np.ndarray:
+    """Приводит сетку цветовых меток к виду для Numba-ядер (None -> NO_LABELS)."""
+    if color_labels is None:
+        return NO_LABELS
+    return np.ascontiguousarray(color_labels, dtype=np.int32)
+
+def counter_array(counters) -> np.ndarray:
+    """Массив счётчиков для ядер (None -> NO_COUNTERS)."""
+    return NO_COUNTERS if counters is None else counters.array
 
 @njit(cache=True)
-def can_place_brick(x: int, y: int, z: int, w: int, h: int, d: int, voxel_array: np.ndarray, 
-                    support_array: np.ndarray, allow_top_layer: bool) -> bool:
+def has_uniform_label(x: int, y: int, z: int, w: int, h: int, d: int, labels: np.ndarray) -> bool:
+    """Кирпич не пересекает границу цветовых областей (все ячейки с одной меткой)."""
+    if labels.size == 0:
+        return True
+    label = labels[z, y, x]
+    for dz in range(z, z + d):
+        for dy in range(y, y + h):
+            for dx in range(x, x + w):
+                if labels[dz, dy, dx] != label:
+                    return False
+    return True
+
+@njit(cache=True)
+def count_fit(reason: int, counters: np.ndarray) -> int:
+    """Учитывает исход проверки в счётчиках (пустой массив — без учёта) и возвращает его."""
+    if counters.size > 0:
+        counters[reason] += 1
+    return reason
+
+@njit(cache=True)
+def fit_reason(x: int, y: int, z: int, w: int, h: int, d: int, voxel_array: np.ndarray,
+               support_array: np.ndarray, allow_top_layer: bool, labels: np.ndarray = NO_LABELS,
+               counters: np.ndarray = NO_COUNTERS) -> int:
+    """
+    Проверка кирпича с причиной отказа: FIT_OK или код первого нарушенного условия.
+
+    Непустая сетка labels добавляет проверку цветовых границ (FIT_LABEL), непустой
+    массив counters (KernelCounters.array) учитывает исход.
+    """
+    reason = _geometry_reason(x, y, z, w, h, d, voxel_array, support_array, allow_top_layer)
+    if reason == FIT_OK and not has_uniform_label(x, y, z, w, h, d, labels):
+        reason = FIT_LABEL
+    return count_fit(reason, counters)
+
+@njit(cache=True)
+def _geometry_reason(x: int, y: int, z: int, w: int, h: int, d: int, voxel_array: np.ndarray,
+                     support_array: np.ndarray, allow_top_layer: bool) -> int:
     depth, height, width = voxel_array.shape
     
     # Проверка границ
     if (x < 0 or y < 0 or z < 0 or 
         x + w > width or y + h > height or z + d > depth):
-        return False
+        return FIT_BOUNDS
     
     # Проверка пересечения с уже занятыми вокселями
     brick_region = voxel_array[z:z+d, y:y+h, x:x+w]
     if not np.all(brick_region):  # Убедиться, что кирпич полностью заполняет область
-        return False
+        return FIT_OCCUPIED
     
     # Проверка поддержки снизу (классическая)
     if z == 0:
-        return True
+        return FIT_OK
     below = support_array[z-1, y:y+h, x:x+w]
     if below.shape != (h, w) or np.all(~below):
         # Нет полной поддержки снизу, проверяем асимметричные соединения
@@ -58,13 +110,118 @@ def can_place_brick(x: int, y: int, z: int, w: int, h: int, d: int, voxel_array:
                     break
         
         if not overlap_support and not allow_top_layer:
-            return False
+            return FIT_SUPPORT
     
     # Проверка верхнего слоя (если разрешено)
     if z + d == depth and not allow_top_layer:
-        return False
+        return FIT_TOP_LAYER
     
-    return True
+    return FIT_OK
+
+@njit(cache=True)
+def can_place_brick(x: int, y: int, z: int, w: int, h: int, d: int, voxel_array: np.ndarray, 
+                    support_array: np.ndarray, allow_top_layer: bool, labels: np.ndarray = NO_LABELS,
+                    counters: np.ndarray = NO_COUNTERS) -> bool:
+    return fit_reason(x, y, z, w, h, d, voxel_array, support_array, allow_top_layer, labels, counters) == FIT_OK
+
+class KernelCounters:
+    """
+    Счётчики горячего пути ядер укладки в одном заранее выделенном массиве:
+    исходы проверок по FIT_REASONS, затем успешные укладки по записям каталога.
+
+    Ядро получает array или NO_COUNTERS, поэтому выключенные счётчики стоят одну
+    проверку размера. Объект создаётся на запуск и передаётся стратегиям явно;
+    воркеры пулов считают в свои счётчики и возвращают их вместе с кирпичами,
+    родитель складывает их через add. Исход FIT_OK у поисковых стратегий — кирпич
+    подошёл, у жадного ядра — кирпич уложен; укладки по размерам считает ядро каталога.
+    """
+    def __init__(self, sizes: Sequence[Tuple[int, int, int, str]]):
+        self.sizes = list(sizes)
+        self.array = np.zeros(NUM_FIT_REASONS + len(self.sizes), dtype=np.int64)
+        self.layer_times: Dict[int, float] = {}
+
+    def add_layer_time(self, z: int, seconds: float):
+        self.layer_times[z] = self.layer_times.get(z, 0.0) + seconds
+
+    def add(self, other: "KernelCounters"):
+        """Прибавляет счётчики другого процесса или задачи (тот же набор размеров)."""
+        self.array += other.array
+        for z, seconds in other.layer_times.items():
+            self.add_layer_time(z, seconds)
+
+    def report(self) -> Dict:
+        outcomes = self.array[:NUM_FIT_REASONS]
+        placed = self.array[NUM_FIT_REASONS:]
+        return {
+            "fit_tests": int(outcomes.sum()),
+            "outcomes": {reason: int(count) for reason, count in zip(FIT_REASONS, outcomes)},
+            "placed_by_size": {f"{w}x{h}x{d} {t}": int(count)
+                               for (w, h, d, t), count in zip(self.sizes, placed) if count},
+            "layer_times": {int(z): seconds for z, seconds in sorted(self.layer_times.items())},
+        }
+
+    def log(self):
+        report = self.report()
+        slowest = sorted(report["layer_times"].items(), key=lambda item: -item[1])[:3]
+        logging.info(f"Kernel counters: {report['fit_tests']} fit tests, outcomes={report['outcomes']}, "
+                     f"placed={report['placed_by_size']}, "
+                     f"layer time={sum(report['layer_times'].values()):.3f}s, slowest layers={slowest}")
+
+@njit(cache=True)
+def fit_reason_ids(x: int, y: int, z: int, w: int, h: int, d: int, voxel_array: np.ndarray,
+                   brick_ids: np.ndarray, allow_top_layer: bool, labels: np.ndarray = NO_LABELS,
+                   counters: np.ndarray = NO_COUNTERS) -> int:
+    """То же правило, что и fit_reason, но по сетке идентификаторов кирпичей (-1 — свободно)."""
+    reason = _geometry_reason_ids(x, y, z, w, h, d, voxel_array, brick_ids, allow_top_layer)
+    if reason == FIT_OK and not has_uniform_label(x, y, z, w, h, d, labels):
+        reason = FIT_LABEL
+    return count_fit(reason, counters)
+
+@njit(cache=True)
+def can_place_brick_ids(x: int, y: int, z: int, w: int, h: int, d: int, voxel_array: np.ndarray,
+                        brick_ids: np.ndarray, allow_top_layer: bool, labels: np.ndarray = NO_LABELS,
+                        counters: np.ndarray = NO_COUNTERS) -> bool:
+    return fit_reason_ids(x, y, z, w, h, d, voxel_array, brick_ids, allow_top_layer, labels, counters) == FIT_OK
+
+@njit(cache=True)
+def _geometry_reason_ids(x: int, y: int, z: int, w: int, h: int, d: int, voxel_array: np.ndarray,
+                         brick_ids: np.ndarray, allow_top_layer: bool) -> int:
+    depth, height, width = voxel_array.shape
+    if (x < 0 or y < 0 or z < 0 or
+        x + w > width or y + h > height or z + d > depth):
+        return FIT_BOUNDS
+    for dz in range(z, z + d):
+        for dy in range(y, y + h):
+            for dx in range(x, x + w):
+                if not voxel_array[dz, dy, dx] or brick_ids[dz, dy, dx] >= 0:
+                    return FIT_OCCUPIED
+    if z > 0:
+        supported = False
+        for dy in range(y, y + h):
+            for dx in range(x, x + w):
+                if brick_ids[z - 1, dy, dx] >= 0:
+                    supported = True
+        if not supported:
+            for dz in range(max(0, z - 1), min(depth, z + d)):
+                left = right = front = back = 0
+                for dy in range(y, y + h):
+                    if x > 0 and brick_ids[dz, dy, x - 1] >= 0:
+                        left += 1
+                    if x + w < width and brick_ids[dz, dy, x + w] >= 0:
+                        right += 1
+                for dx in range(x, x + w):
+                    if y > 0 and brick_ids[dz, y - 1, dx] >= 0:
+                        front += 1
+                    if y + h < height and brick_ids[dz, y + h, dx] >= 0:
+                        back += 1
+                if max(max(left, right), max(front, back)) * STUD_SIZE >= MIN_OVERLAP:
+                    supported = True
+                    break
+            if not supported and not allow_top_layer:
+                return FIT_SUPPORT
+    if z + d == depth and not allow_top_layer:
+        return FIT_TOP_LAYER
+    return FIT_OK
 
 @njit(cache=True)
 def place_brick(x: int, y: int, z: int, w: int, h: int, d: int, voxel_array: np.ndarray, support_array: np.ndarray):
@@ -81,19 +238,35 @@ def find_next_voxel(voxel_array: np.ndarray) -> Tuple[int, int, int, bool]:
                     return x, y, z, True
     return 0, 0, 0, False
 
-@njit
-def place_bricks_on_layer_fast(z: int, voxel_array: np.ndarray, support_array: np.ndarray, 
-                               allowed_sizes: NumbaList, allow_top_layer: bool = False) -> List[Tuple[int, int, int, int, int, int, str]]:
-    cubes = []
-    for y in range(voxel_array.shape[1]):
-        for x in range(voxel_array.shape[2]):
-            if voxel_array[z, y, x]:
-                for w, h, d, t in allowed_sizes:
-                    if can_place_brick(x, y, z, w, h, d, voxel_array, support_array, allow_top_layer):
-                        place_brick(x, y, z, w, h, d, voxel_array, support_array)
-                        cubes.append((x, y, z, w, h, d, t))
-                        break
-                    else:
-                        # Добавьте отладочный вывод через logging (вне njit для простоты)
-                        print(f"Cannot place brick at ({x}, {y}, {z}) with size ({w}, {h}, {d})")
-    return cubes
\ No newline at end of file
+def cubes_to_array(cubes) -> np.ndarray:
+    """Переводит список кубов в массив (n, 6) с колонками x, y, z, w, h, d."""
+    if len(cubes) == 0:
+        return np.zeros((0, 6), dtype=np.int64)
+    if isinstance(cubes, BrickSet):
+        return cubes.coords
+    if isinstance(cubes, np.ndarray):
+        return cubes[:, :6].astype(np.int64, copy=False)
+    return np.array([cube[:6] for cube in cubes], dtype=np.int64)
+
+def brick_cells(brick_array: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Векторно разворачивает кирпичи в ячейки: (индекс кирпича, z, y, x) для каждой занятой ячейки."""
+    x, y, z, w, h, d = (brick_array[:, i] for i in range(6))
+    sizes = w * h * d
+    brick_idx = np.repeat(np.arange(len(brick_array)), sizes)
+    offsets = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    ww, hh = w[brick_idx], h[brick_idx]
+    cx = x[brick_idx] + offsets % ww
+    cy = y[brick_idx] + (offsets // ww) % hh
+    cz = z[brick_idx] + offsets // (ww * hh)
+    return brick_idx, cz, cy, cx
+
+def rasterize_bricks(cubes, shape: Tuple[int, int, int]) -> np.ndarray:
+    """Строит сетку идентификаторов кирпичей (-1 — пусто) за один векторный проход."""
+    ids = np.full(shape, -1, dtype=np.int32)
+    brick_array = cubes_to_array(cubes)
+    if len(brick_array) == 0:
+        return ids
+    brick_idx, cz, cy, cx = brick_cells(brick_array)
+    inside = (cz < shape[0]) & (cy < shape[1]) & (cx < shape[2])
+    ids[cz[inside], cy[inside], cx[inside]] = brick_idx[inside]
+    return ids
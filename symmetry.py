@@ -0,0 +1,70 @@
+# symmetry.py
+import logging
+import numpy as np
+from typing import Optional, Tuple
+from src.strategies.brick_set import BrickSet
+from src.strategies.utils import brick_cells
+
+SYMMETRY_TOLERANCE = 0.01  # Допустимая доля несовпадающих вокселей для «почти точной» симметрии
+MIRROR_AXES = (2, 1)  # Оси сетки (z, y, x): зеркало по x, затем по y
+
+def detect_mirror_symmetry(voxel_array: np.ndarray, color_labels: Optional[np.ndarray] = None,
+                           tolerance: float = SYMMETRY_TOLERANCE) -> Optional[Tuple[int, int, int]]:
+    """
+    Ищет зеркальную симметрию по x или y относительно середины занятой области.
+
+    Сравнение векторное: область сравнивается со своим отражением одной операцией XOR.
+    Если заданы цветовые метки, различие меток тоже считается несовпадением.
+    Возвращает (ось, начало, конец) области вдоль оси для лучшей симметрии или None.
+    """
+    total = int(np.count_nonzero(voxel_array))
+    if total == 0:
+        return None
+    best = None
+    for axis in MIRROR_AXES:
+        other = tuple(a for a in range(3) if a != axis)
+        occupied = np.flatnonzero(voxel_array.any(axis=other))
+        lo, hi = int(occupied[0]), int(occupied[-1]) + 1
+        if hi - lo < 2:
+            continue
+        index = [slice(None)] * 3
+        index[axis] = slice(lo, hi)
+        part = voxel_array[tuple(index)]
+        flipped = np.flip(part, axis)
+        diff = part ^ flipped
+        if color_labels is not None:
+            labels = color_labels[tuple(index)]
+            diff |= part & flipped & (labels != np.flip(labels, axis))
+        mismatch = np.count_nonzero(diff) / total
+        logging.debug(f"Mirror symmetry: axis={axis}, mismatch={mismatch:.4f}")
+        if mismatch <= tolerance and (best is None or mismatch < best[3]):
+            best = (axis, lo, hi, mismatch)
+    if best is None:
+        return None
+    axis, lo, hi, mismatch = best
+    logging.info(f"Mirror symmetry found: axis={'xy'[2 - axis]}, range=[{lo}, {hi}), mismatch={mismatch:.4f}")
+    return axis, lo, hi
+
+def mirror_bricks(cubes: BrickSet, axis: int, lo: int, hi: int) -> BrickSet:
+    """Отражает кирпичи относительно середины диапазона [lo, hi) вдоль оси сетки (2 — x, 1 — y)."""
+    cubes = BrickSet.from_cubes(cubes)
+    data = cubes.data.copy()
+    position, size = ("x", "w") if axis == 2 else ("y", "h")
+    data[position] = lo + hi - data[position] - data[size]
+    return BrickSet(data, cubes.colors, cubes.types)
+
+def bricks_inside(cubes: BrickSet, voxel_array: np.ndarray, color_labels: Optional[np.ndarray] = None) -> np.ndarray:
+    """Маска кирпичей, целиком лежащих в модели (и в одной цветовой области, если заданы метки)."""
+    brick_array = BrickSet.from_cubes(cubes).coords
+    if len(brick_array) == 0:
+        return np.zeros(0, dtype=bool)
+    brick_idx, cz, cy, cx = brick_cells(brick_array)
+    shape = np.array(voxel_array.shape)
+    inside = (cz >= 0) & (cy >= 0) & (cx >= 0) & (cz < shape[0]) & (cy < shape[1]) & (cx < shape[2])
+    bad = ~inside
+    cz, cy, cx = np.where(inside, cz, 0), np.where(inside, cy, 0), np.where(inside, cx, 0)
+    bad |= ~voxel_array[cz, cy, cx]
+    if color_labels is not None:
+        origin = color_labels[brick_array[:, 2], brick_array[:, 1], brick_array[:, 0]]
+        bad |= color_labels[cz, cy, cx] != origin[brick_idx]
+    return np.bincount(brick_idx[bad], minlength=len(brick_array)) == 0
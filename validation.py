@@ -0,0 +1,82 @@
+# validation.py
+import json
+import logging
+import numpy as np
+from typing import Dict
+from src.strategies.brick_set import BrickSet
+from src.strategies.utils import brick_cells
+
+# Горизонтальные соседи (dy, dx) для боковой опоры при allow_top_layer
+_SIDE_OFFSETS = ((0, -1), (0, 1), (-1, 0), (1, 0))
+
+def validate_placement(cubes: BrickSet, voxel_array: np.ndarray, allow_top_layer: bool = False) -> Dict:
+    """
+    Проверка укладки за один векторный проход: кирпичи разворачиваются в ячейки,
+    занятость считается одним bincount.
+
+    Отчёт содержит перекрытия, непокрытые воксели модели, ячейки вне маски и вне
+    сетки, кирпичи без опоры (z > 0 и ни одной занятой ячейки под ними; при
+    allow_top_layer опорой считается и сосед сбоку), а также покрытие и число
+    кирпичей по размерам. Индексы кирпичей — позиции в cubes.
+    """
+    cubes = BrickSet.from_cubes(cubes)
+    voxel_array = np.asarray(voxel_array, dtype=bool)
+    shape = voxel_array.shape
+    brick_array = cubes.coords
+    brick_idx, cz, cy, cx = brick_cells(brick_array)
+    in_bounds = ((cz >= 0) & (cy >= 0) & (cx >= 0) &
+                 (cz < shape[0]) & (cy < shape[1]) & (cx < shape[2]))
+    flat = np.ravel_multi_index((cz[in_bounds], cy[in_bounds], cx[in_bounds]), shape)
+    counts = np.bincount(flat, minlength=voxel_array.size).reshape(shape)
+    covered = counts > 0
+    out_of_bounds = np.unique(brick_idx[~in_bounds])
+    brick_idx, cz, cy, cx = brick_idx[in_bounds], cz[in_bounds], cy[in_bounds], cx[in_bounds]
+    overlapping = np.unique(brick_idx[counts.ravel()[flat] > 1])
+    outside = np.unique(brick_idx[~voxel_array.ravel()[flat]])
+
+    # Опора: хотя бы одна занятая ячейка под нижним слоем кирпича
+    bottom = (cz == brick_array[brick_idx, 2]) & (cz > 0)
+    supported = np.zeros(len(brick_array), dtype=bool)
+    supported[brick_array[:, 2] <= 0] = True
+    supported[brick_idx[bottom][covered[cz[bottom] - 1, cy[bottom], cx[bottom]]]] = True
+    if allow_top_layer:
+        ids = np.full(shape, -1, dtype=np.int64)
+        ids.ravel()[flat] = brick_idx
+        for dy, dx in _SIDE_OFFSETS:
+            ny, nx = cy + dy, cx + dx
+            valid = (ny >= 0) & (nx >= 0) & (ny < shape[1]) & (nx < shape[2])
+            neighbour = np.full(len(cz), -1, dtype=np.int64)
+            neighbour[valid] = ids[cz[valid], ny[valid], nx[valid]]
+            supported[brick_idx[(neighbour >= 0) & (neighbour != brick_idx)]] = True
+    unsupported = np.flatnonzero(~supported)
+
+    sizes, size_counts = np.unique(cubes.data[["w", "h", "d", "type"]], return_counts=True)
+    total_voxels = int(voxel_array.sum())
+    covered_voxels = int(np.sum(covered & voxel_array))
+    report = {
+        "bricks": len(cubes),
+        "voxels": total_voxels,
+        "covered_voxels": covered_voxels,
+        "coverage": covered_voxels / total_voxels if total_voxels else 1.0,
+        "overlap_voxels": int(np.sum(counts > 1)),
+        "uncovered_voxels": total_voxels - covered_voxels,
+        "outside_voxels": int(np.sum(covered & ~voxel_array)) + int(np.sum(~in_bounds)),
+        "overlapping_bricks": overlapping.tolist(),
+        "outside_bricks": np.union1d(outside, out_of_bounds).tolist(),
+        "unsupported_bricks": unsupported.tolist(),
+        "bricks_by_size": {f"{w}x{h}x{d} {cubes.types[t]}": int(c) for (w, h, d, t), c in zip(sizes.tolist(), size_counts)},
+    }
+    report["valid"] = not (report["overlapping_bricks"] or report["outside_bricks"] or report["unsupported_bricks"])
+    message = (f"Validation: {report['bricks']} bricks, coverage {report['coverage']:.1%}, "
+               f"{report['overlap_voxels']} overlapping voxels, {report['uncovered_voxels']} uncovered, "
+               f"{report['outside_voxels']} outside, {len(report['unsupported_bricks'])} unsupported bricks")
+    if report["valid"]:
+        logging.info(message)
+    else:
+        logging.warning(message)
+    return report
+
+def export_validation_report(report: Dict, path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    logging.info(f"Validation report exported to {path}")